@@ -0,0 +1,109 @@
+from unittest import TestCase
+import json
+import responses
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+from viewser.commands.queryset import definition_index
+from viewser.commands.queryset.models import Queryset, Column
+from viewser.commands.queryset.operations import QuerysetOperations
+
+def definition(queryset):
+    return json.loads(json.dumps(queryset.dict()))
+
+class StubOperations():
+    def __init__(self, definitions):
+        self.stored = definitions
+
+    def list(self):
+        return list(self.stored.keys())
+
+    def definitions_with_errors(self, names, max_workers = 8):
+        return {name: self.stored[name] for name in names}, {}
+
+class TestDefinitionIndex(TestCase):
+    def setUp(self):
+        engine = sa.create_engine("sqlite://")
+        definition_index.metadata.create_all(engine)
+        self.index = definition_index.DefinitionIndex(sessionmaker(engine))
+
+        self.conflict = (Queryset("conflict", "country_month")
+            .with_theme("conflict")
+            .with_column(Column("ged_sb", "country_month", "ged_sb_best_sum_nokgi")
+                .transform.temporal.tlag(12))
+            .with_column(Column("gedXsb", "country_month", "gedXsb")))
+
+        self.economy = (Queryset("economy", "priogrid_month")
+            .with_theme("economy")
+            .with_column(Column("gdp", "priogrid_month", "gdp")
+                .transform.ops.ln()))
+
+        self.index.sync(StubOperations({"conflict": definition(self.conflict), "economy": definition(self.economy)}))
+
+    def test_sync(self):
+        changed = self.economy.describe("a new description")
+        added = Queryset("added", "country_year").with_column(Column("pop", "country_year", "pop"))
+
+        result = self.index.sync(StubOperations({
+            "economy": definition(changed),
+            "added": definition(added),
+            "failed": None}))
+
+        self.assertEqual(result.added, ["added"])
+        self.assertEqual(result.updated, ["economy"])
+        self.assertEqual(result.removed, ["conflict"])
+        self.assertEqual(result.failed, ["failed"])
+        self.assertEqual(result.unchanged, 0)
+
+        self.assertEqual(self.index.definition("economy")["description"], "a new description")
+        self.assertIsNone(self.index.definition("conflict"))
+        self.assertEqual(self.index.search(base = "ged_sb_best_sum_nokgi"), [])
+
+        result = self.index.sync(StubOperations({"economy": definition(changed), "added": definition(added)}))
+        self.assertEqual((result.added, result.updated, result.removed, result.failed, result.unchanged),
+                ([], [], [], [], 2))
+
+    def test_failed_keeps_definition(self):
+        result = self.index.sync(StubOperations({"conflict": None, "economy": definition(self.economy)}))
+
+        self.assertEqual(result.failed, ["conflict"])
+        self.assertEqual(result.removed, [])
+        self.assertEqual(self.index.definition("conflict")["name"], "conflict")
+
+    @responses.activate
+    def test_store_error_keeps_definition(self):
+        changed = self.conflict.describe("a new description")
+        added = Queryset("added", "country_year").with_column(Column("pop", "country_year", "pop"))
+
+        responses.add(method = "GET", url = "http://www.foo.com/querysets",
+                json = {"querysets": ["conflict", "economy", "added"]})
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/conflict", json = definition(changed))
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/economy", status = 500)
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/added", json = definition(added))
+
+        result = self.index.sync(QuerysetOperations("http://www.foo.com"))
+
+        self.assertEqual((result.added, result.updated, result.removed, result.failed),
+                (["added"], ["conflict"], [], ["economy"]))
+        self.assertEqual(self.index.definition("economy"), definition(self.economy))
+        self.assertEqual(self.index.definition("conflict")["description"], "a new description")
+
+    def test_search_by_base(self):
+        self.assertEqual([(r.queryset, r.column) for r in self.index.search(base = "country_month.ged_sb_best_sum_nokgi")],
+                [("conflict", "ged_sb")])
+        self.assertEqual([(r.queryset, r.column) for r in self.index.search(base = "ged_sb_best_sum_nokgi")],
+                [("conflict", "ged_sb")])
+        self.assertEqual([r.column for r in self.index.search(base = "gedXsb")], ["gedXsb"])
+        self.assertEqual(self.index.search(base = "ged_sb"), [])
+        self.assertEqual(self.index.search(base = "ged%"), [])
+
+    def test_search_by_transform(self):
+        results = self.index.search(transform = "temporal.tlag")
+        self.assertEqual([(r.queryset, r.column, r.base) for r in results],
+                [("conflict", "ged_sb", "country_month.ged_sb_best_sum_nokgi")])
+        self.assertEqual([r.queryset for r in self.index.search(transform = "ops.ln")], ["economy"])
+
+    def test_search_by_theme_and_loa(self):
+        self.assertEqual([r.queryset for r in self.index.search(theme = "conflict")], ["conflict"])
+        self.assertEqual([r.queryset for r in self.index.search(loa = "priogrid_month")], ["economy"])
+        self.assertEqual(self.index.search(theme = "conflict", loa = "priogrid_month"), [])
+        self.assertEqual([r.queryset for r in self.index.search()], ["conflict", "economy"])
@@ -0,0 +1,31 @@
+
+import os
+from unittest import TestCase
+import numpy as np
+from viewser.commands.queryset import drift_detection
+from viewser.commands.queryset.drift_chunks import ChunkedTensor
+from .test_drift_detection import make_df, alert_messages
+
+class TestChunkedInputGate(TestCase):
+    def setUp(self):
+        self.df = make_df(nfeature = 7)
+        self.df.iloc[-30:, 5] *= 10.
+
+    def test_alerts_match_input_gate(self):
+        expected = alert_messages(drift_detection.InputGate(self.df).assemble_alerts())
+
+        for chunk_size in (1, 3, 7):
+            gate = drift_detection.ChunkedInputGate(self.df, chunk_size = chunk_size)
+            self.assertEqual(alert_messages(gate.assemble_alerts()), expected)
+            gate.close()
+
+    def test_blocks(self):
+        tensor = ChunkedTensor.from_dataframe(self.df.assign(name = "a"), chunk_size = 3)
+        full = drift_detection.InputGate(self.df).tensor
+
+        self.assertEqual([len(columns) for columns in tensor.columns], [3, 3, 1])
+        self.assertEqual(tensor.shape, full.shape)
+        np.testing.assert_array_equal(np.concatenate(tensor.blocks, axis = 2), full)
+
+        tensor.close()
+        self.assertFalse(os.path.exists(tensor.directory))
@@ -0,0 +1,48 @@
+
+import json
+import os
+import tempfile
+from unittest import TestCase
+from click.testing import CliRunner
+from viewser.commands import drift
+from tests.test_drift_detection import make_df
+
+class TestDriftCheck(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = lambda name: os.path.join(self.directory.name, name)
+
+        make_df().to_parquet(self.path("indexed.parquet"))
+        make_df(seed = 1).reset_index().to_parquet(self.path("flat.parquet"))
+
+        with open(self.path("config.json"), "w") as f:
+            json.dump({"test_partition_length": 1, "standard_partition_length": 10,
+                "feature_missingness": {"threshold": 0.05}, "delta_completeness": {"threshold": 1e-6}}, f)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def check(self, *args):
+        result = CliRunner().invoke(drift.cli, ["check", *args, "--output", self.path("report.json")])
+
+        with open(self.path("report.json")) as f:
+            return result.exit_code, json.load(f)
+
+    def test_consolidated_report(self):
+        exit_code, report = self.check(self.path("indexed.parquet"), self.path("flat.parquet"),
+                "--config", self.path("config.json"), "--index-columns", "month_id,country_id", "--workers", "2")
+
+        self.assertEqual(exit_code, 1)
+        self.assertEqual([file["file"] for file in report["files"]],
+                [self.path("indexed.parquet"), self.path("flat.parquet")])
+        self.assertEqual(report["summary"], {"files": 2, "failed": 2, "errors": 0})
+
+        checks = report["files"][0]["report"]["checks"]
+        self.assertEqual([check["test_function"] for check in checks], ["feature_nan_fracs", "delta_completeness"])
+        self.assertEqual(checks[1]["status"], "failed")
+
+    def test_unreadable_file(self):
+        exit_code, report = self.check(self.path("flat.parquet"), "--config", self.path("config.json"))
+
+        self.assertEqual(exit_code, 2)
+        self.assertEqual(report["files"][0]["status"], "error")
@@ -0,0 +1,195 @@
+
+from unittest import TestCase, mock
+import numpy as np
+import pandas as pd
+from views_tensor_utilities import objects, mappings
+from viewser.commands.queryset import drift_detection, drift_ks
+from viewser.commands.queryset.drift_statistics import time_space_tensor
+
+def make_df(ntime = 24, nspace = 30, nfeature = 4, seed = 0):
+    rng = np.random.default_rng(seed)
+    index = pd.MultiIndex.from_product([np.arange(100, 100 + ntime), np.arange(1, nspace + 1)],
+            names = ["month_id", "country_id"])
+    data = rng.gamma(0.5, 2.0, size = (len(index), nfeature))
+    data[rng.random(data.shape) < 0.3] = 0.0
+    data[rng.random(data.shape) < 0.02] = np.nan
+    df = pd.DataFrame(data, index = index, columns = [f"feature_{i}" for i in range(nfeature)])
+    return df.drop(index = [(100 + t, 3) for t in range(8)])
+
+def alert_messages(alerts):
+    return [alert if isinstance(alert, str) else [alarm.message for alarm in alert] for alert in alerts]
+
+class TestExecutors(TestCase):
+    def setUp(self):
+        self.df = make_df()
+
+    def test_executors_agree(self):
+        serial = alert_messages(drift_detection.InputGate(self.df).assemble_alerts())
+        self.assertEqual(len(serial), 13)
+
+        for executor in ("threads", "processes"):
+            gate = drift_detection.InputGate(self.df, executor = executor, max_workers = 2)
+            self.assertEqual(alert_messages(gate.assemble_alerts()), serial)
+
+    def test_unknown_executor(self):
+        with self.assertRaises(RuntimeError):
+            drift_detection.InputGate(self.df, executor = "cluster")
+
+class TestCheckParameters(TestCase):
+    def test_parameters_reach_check(self):
+        df = make_df()
+        drift_config = {"ks_drift": {"threshold": 1e-20, "parameters": {"max_samples": 20}},
+                "test_partition_length": 1, "standard_partition_length": 10}
+
+        gate = drift_detection.InputGate(df, drift_config_dict = drift_config)
+        alerts = gate.assemble_alerts()
+
+        standard, test = gate.statistics.partitions(1, 10)
+        pvalues = drift_ks.ks_pvalues(standard.reshape(-1, 4), test.reshape(-1, 4), max_samples = 20)
+
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual([alarm.severity for alarm in alerts[0]], [int(1 + (1. / p) / 1e-20) for p in pvalues])
+
+    def test_defaults_unchanged(self):
+        drift_config = {"ks_drift": {"threshold": 1e-20, "parameters": {"max_samples": 20}},
+                "test_partition_length": 1, "standard_partition_length": 10}
+
+        drift_detection.InputGate(make_df(), drift_config_dict = drift_config).assemble_alerts()
+
+        self.assertEqual(drift_detection.config.default_config_dict["ks_drift"]["threshold"], 100.)
+        self.assertEqual(drift_detection.config.default_config_dict["ks_drift"]["parameters"], {"max_samples": None})
+
+class TestPrecision(TestCase):
+    def test_float32_alerts_match_float64(self):
+        df = make_df()
+        expected = alert_messages(drift_detection.InputGate(df).assemble_alerts())
+
+        gate = drift_detection.InputGate(df, precision = "float32")
+        self.assertEqual(gate.tensor.dtype, np.float32)
+        self.assertEqual(alert_messages(gate.assemble_alerts()), expected)
+
+        gate = drift_detection.ChunkedInputGate(df, chunk_size = 3, precision = "float32")
+        self.assertEqual(gate.tensor.blocks[0].dtype, np.float32)
+        self.assertEqual(alert_messages(gate.assemble_alerts()), expected)
+        gate.close()
+
+    def test_unknown_precision(self):
+        with self.assertRaises(RuntimeError):
+            drift_detection.InputGate(make_df(), precision = "float16")
+
+class TestTimeSpaceTensor(TestCase):
+    def assert_matches_views_dataframe(self, df):
+        numeric_part = (objects.ViewsDataframe(df, split_strategy = "float_string", cast_strategy = "to_64").
+                to_numpy_time_space().get_numeric_views_tensors()[0])
+
+        tensor, columns, times, spaces = time_space_tensor(df)
+
+        np.testing.assert_array_equal(tensor, numeric_part.tensor)
+        self.assertEqual(columns, list(numeric_part.columns))
+        self.assertEqual(times.time_to_index, mappings.TimeUnits.from_pandas(df).time_to_index)
+        self.assertEqual(spaces.index_to_space, mappings.SpaceUnits.from_pandas(df).index_to_space)
+
+    def test_matches_views_dataframe(self):
+        self.assert_matches_views_dataframe(make_df().assign(name = "a"))
+        self.assert_matches_views_dataframe(make_df().iloc[::-1])
+
+    def test_dne_in_input(self):
+        df = make_df()
+        df.iloc[0, 0] = drift_detection.config.default_dne
+
+        with self.assertRaises(RuntimeError):
+            time_space_tensor(df)
+
+    def test_bool_columns(self):
+        df = make_df().assign(flag = True)
+
+        with self.assertRaises(RuntimeError):
+            objects.ViewsDataframe(df, split_strategy = "float_string", cast_strategy = "to_64")
+        with self.assertRaisesRegex(RuntimeError, "flag"):
+            time_space_tensor(df)
+        with self.assertRaisesRegex(RuntimeError, "flag"):
+            drift_detection.ChunkedInputGate(df, chunk_size = 2)
+
+class TestSelfTest(TestCase):
+    def setUp(self):
+        drift_detection._self_test_outcomes.clear()
+        self.df = make_df(ntime = 36, nspace = 60)
+
+    def self_test_failures(self, **kwargs):
+        with self.assertRaises(RuntimeError) as context:
+            drift_detection.InputGate(self.df, drift_config_dict = dict(drift_detection.config.default_config_dict),
+                    self_test = True, self_test_data = self.df, **kwargs)
+        return str(context.exception)
+
+    def test_threads_match_serial(self):
+        serial = self.self_test_failures()
+        drift_detection._self_test_outcomes.clear()
+        self.assertEqual(self.self_test_failures(executor = "threads", max_workers = 3), serial)
+
+    def test_outcome_cached(self):
+        failures = self.self_test_failures()
+
+        with mock.patch.object(drift_detection.InputGate, "_run_self_tests", autospec = True,
+                side_effect = drift_detection.InputGate._run_self_tests) as run_self_tests:
+            self.assertEqual(self.self_test_failures(), failures)
+            run_self_tests.assert_not_called()
+
+            self.self_test_failures(precision = "float32")
+            run_self_tests.assert_called_once()
+
+    def test_outcomes_bounded(self):
+        with mock.patch.object(drift_detection, "SELF_TEST_OUTCOMES_SIZE", 1):
+            self.self_test_failures()
+            self.self_test_failures(precision = "float32")
+            self.assertEqual(len(drift_detection._self_test_outcomes), 1)
+
+            with mock.patch.object(drift_detection.InputGate, "_run_self_tests", autospec = True,
+                    side_effect = drift_detection.InputGate._run_self_tests) as run_self_tests:
+                self.self_test_failures(precision = "float32")
+                run_self_tests.assert_not_called()
+
+                self.self_test_failures()
+                run_self_tests.assert_called_once()
+
+def drift_config(test_partition_length = 1, standard_partition_length = 10, thresholds = None):
+    thresholds = thresholds if thresholds is not None else {}
+    return {"test_partition_length": test_partition_length, "standard_partition_length": standard_partition_length,
+            **{key: {"threshold": thresholds.get(check["test_function"], check["threshold"])}
+                for key, check in drift_detection.config.default_config_dict.items()
+                if isinstance(check, dict) and "threshold" in check}}
+
+class TestSweep(TestCase):
+    def setUp(self):
+        self.df = make_df(ntime = 36, nspace = 40)
+        self.grid = {"ks_drift": [1., 10., 1e4], "delta_completeness": [0.5, 2.]}
+
+    def test_matches_assemble_alerts(self):
+        sweep = drift_detection.InputGate(self.df, drift_config()).sweep(self.grid, [1, 3], [6, 12])
+        self.assertEqual(len(sweep), 2*2*(13 + 2 + 1))
+
+        for test_partition_length, standard_partition_length, ithreshold in ((1, 6, 0), (3, 12, 1), (3, 6, 2)):
+            thresholds = {key: grid[min(ithreshold, len(grid) - 1)] for key, grid in self.grid.items()}
+            summary = drift_detection.InputGate(self.df, drift_config(test_partition_length, standard_partition_length,
+                    thresholds)).assemble_alerts().summary()
+
+            rows = sweep[(sweep["test_partition_length"] == test_partition_length) &
+                    (sweep["standard_partition_length"] == standard_partition_length)]
+            rows = summary[["test_function", "threshold"]].merge(rows, on = ["test_function", "threshold"])
+
+            self.assertEqual(rows["status"].tolist(), summary["status"].tolist())
+            self.assertEqual(rows["alarms"].tolist(), summary["alarms"].tolist())
+            np.testing.assert_allclose(rows["max_severity"], summary["max_severity"])
+
+    def test_partitions_longer_than_data(self):
+        sweep = drift_detection.InputGate(self.df, drift_config()).sweep(standard_partition_lengths = [40])
+        self.assertEqual(set(sweep["status"][sweep["test_function"] == "ks_drift"]), {"error"})
+        self.assertEqual(set(sweep["status"][sweep["test_function"] == "global_nan_fracs"]), {"passed"})
+
+    def test_chunked_gate_matches(self):
+        expected = drift_detection.InputGate(self.df, drift_config()).sweep(self.grid, [1], [6, 12])
+
+        gate = drift_detection.ChunkedInputGate(self.df, drift_config(), chunk_size = 3)
+        try:
+            pd.testing.assert_frame_equal(gate.sweep(self.grid, [1], [6, 12]), expected)
+        finally:
+            gate.close()
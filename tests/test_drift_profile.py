@@ -0,0 +1,57 @@
+
+import json
+import tracemalloc
+from unittest import TestCase
+import numpy as np
+from viewser.commands.queryset import drift_detection, drift_profile
+from tests.test_drift_detection import make_df
+
+class TestProfile(TestCase):
+    def test_measurements(self):
+        with drift_profile.Profile() as profile:
+            array = np.ones(1_000_000)
+            del array
+
+        self.assertGreaterEqual(profile.peak_memory, 8_000_000)
+        self.assertGreater(profile.wall_time, 0)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_disabled(self):
+        with drift_profile.Profile(False) as profile:
+            pass
+
+        self.assertIsNone(profile.measurements())
+
+    def test_combine(self):
+        combined = drift_profile.combine([{"wall_time": 1., "cpu_time": 0.5, "peak_memory": 10},
+                None, {"wall_time": 2., "cpu_time": 1., "peak_memory": 30}])
+        self.assertEqual(combined, {"wall_time": 3., "cpu_time": 1.5, "peak_memory": 30})
+
+class TestGateProfile(TestCase):
+    def setUp(self):
+        self.df = make_df()
+
+    def assert_profiled(self, report, stages):
+        profile = report.profile
+        self.assertEqual(profile["stage"].tolist(), stages + ["check"]*len(report))
+        self.assertEqual(profile["test_function"].tolist()[len(stages):], report.checks["test_function"].tolist())
+        self.assertFalse(profile[["wall_time", "cpu_time", "peak_memory"]].isna().any().any())
+
+    def test_input_gate(self):
+        for executor in ("serial", "threads", "processes"):
+            report = drift_detection.InputGate(self.df, executor = executor, max_workers = 2,
+                    profile = True).assemble_alerts()
+            stages = ["conversion"] if executor == "processes" else ["conversion", "shared_inputs"]
+            self.assert_profiled(report, stages)
+
+        self.assertEqual(len(json.loads(report.to_json())["profile"]), len(report) + 1)
+
+    def test_chunked_gate(self):
+        gate = drift_detection.ChunkedInputGate(self.df, chunk_size = 3, profile = True)
+        try:
+            self.assert_profiled(gate.assemble_alerts(), ["conversion"])
+        finally:
+            gate.close()
+
+    def test_not_profiled(self):
+        self.assertIsNone(drift_detection.InputGate(self.df).assemble_alerts().profile)
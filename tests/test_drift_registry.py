@@ -0,0 +1,72 @@
+
+from unittest import TestCase
+import numpy as np
+from viewser.commands.queryset import config_drift, drift_detection, drift_registry
+from viewser.commands.queryset.drift_statistics import TensorStatistics, time_space_tensor
+from tests.test_drift_detection import make_df
+
+class TestCheckRegistry(TestCase):
+    def setUp(self):
+        self.calls = 0
+
+        def count_sorted(statistics, test_partition_length, standard_partition_length):
+            self.calls += 1
+            return drift_registry._sorted_partitions(statistics, test_partition_length, standard_partition_length)
+
+        drift_registry.checks.register_input("counted_sorted_partitions", count_sorted)
+
+        def test_max_ratio(inputs, **kwargs):
+            standard, test = inputs["counted_sorted_partitions"]
+            return np.nanmax(test, axis = 0)/np.nanmax(standard, axis = 0), inputs["index_to_feature"]
+
+        for name in ("test_max_ratio", "test_max_ratio_copy"):
+            drift_registry.checks.register(test_max_ratio, name = name,
+                    inputs = ("counted_sorted_partitions", "index_to_feature"), config_key = name,
+                    threshold = 1e-6, message = name.replace("_", " "))
+
+    def tearDown(self):
+        for name in ("test_max_ratio", "test_max_ratio_copy"):
+            drift_registry.checks._checks.pop(name)
+            config_drift.default_config_dict.pop(name)
+
+        drift_registry.checks._inputs.pop("counted_sorted_partitions")
+
+    def test_registered_check_runs_in_gate(self):
+        for executor in ("serial", "threads"):
+            self.calls = 0
+            drift_config = {"test_max_ratio": {"threshold": 1e-6}, "test_max_ratio_copy": {"threshold": 1e-6},
+                    "feature_missingness": {"threshold": 0.5}, "test_partition_length": 1,
+                    "standard_partition_length": 10}
+            report = drift_detection.InputGate(make_df(), drift_config_dict = drift_config,
+                    executor = executor).assemble_alerts()
+
+            self.assertEqual(report.checks["test_function"].tolist(),
+                    ["test_max_ratio", "test_max_ratio_copy", "feature_nan_fracs"])
+            self.assertEqual(report.checks["status"].tolist()[:2], ["failed", "failed"])
+            self.assertEqual(len(report[0]), 4)
+            self.assertEqual(self.calls, 1)
+
+    def test_inputs_are_shared(self):
+        tensor, columns, times, spaces = time_space_tensor(make_df())
+        resolver = drift_registry.InputResolver(TensorStatistics(tensor, None, columns, times, spaces))
+
+        first = resolver.resolve(drift_registry.checks.get("test_max_ratio"), 1, 10)
+        second = resolver.resolve(drift_registry.checks.get("test_max_ratio_copy"), 1, 10)
+
+        self.assertIs(first["counted_sorted_partitions"], second["counted_sorted_partitions"])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(first), ["counted_sorted_partitions", "index_to_feature"])
+
+        with self.assertRaises(KeyError):
+            first["valid_mask"]
+
+    def test_unknown_input(self):
+        with self.assertRaises(RuntimeError):
+            drift_registry.checks.register(lambda **kwargs: None, name = "broken", inputs = ("medians",))
+
+        self.assertNotIn("broken", drift_registry.checks)
+
+    def test_builtin_checks_registered(self):
+        for entry in config_drift.default_config_dict.values():
+            if isinstance(entry, dict) and "test_function" in entry:
+                self.assertIn(entry["test_function"], drift_registry.checks)
@@ -0,0 +1,60 @@
+
+import json
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from viewser.commands.queryset.drift_report import AlertReport
+
+def check_kwargs(test_function, threshold = 1.):
+    return {"test_function": test_function, "message": test_function.replace("_", " "), "threshold": threshold}
+
+class TestAlertReport(TestCase):
+    def setUp(self):
+        testers = [check_kwargs("space_nan_fracs", 0.5), check_kwargs("feature_zero_fracs"), check_kwargs("ks_drift"),
+                check_kwargs("ecod_drift")]
+        outcomes = [(np.array([3, 7, 11], dtype = object), np.array([1.5, 4.2, 2.])),
+                (np.array([], dtype = object), np.array([])),
+                None,
+                "ecod drift not available from drift state"]
+        self.report = AlertReport.from_outcomes(testers, outcomes)
+
+    def test_sequence_view(self):
+        self.assertEqual(len(self.report), 4)
+        self.assertEqual([alarm.message for alarm in self.report[0]],
+                [f"space nan fracs; offender: {space}, threshold: 0.5" for space in (3, 7, 11)])
+        self.assertEqual([alarm.severity for alarm in self.report[0]], [1, 4, 2])
+        self.assertIs(self.report[0], self.report[0])
+        self.assertEqual(self.report[1], "feature zero fracs passed")
+        self.assertIsNone(self.report[2])
+        self.assertEqual(self.report[-1], "ecod drift not available from drift state")
+        self.assertTrue(self.report.failed)
+
+    def test_summary(self):
+        summary = self.report.summary()
+        self.assertEqual(summary["status"].tolist(), ["failed", "passed", "error", "unavailable"])
+        self.assertEqual(summary["alarms"].tolist(), [3, 0, 0, 0])
+        self.assertEqual(summary["max_severity"].tolist(), [4.2, 0., 0., 0.])
+
+    def test_filter(self):
+        severe = self.report.filter(min_severity = 2)
+        self.assertEqual(severe.to_frame()["offender"].tolist(), [7, 11])
+
+        spaces = self.report.filter(test_functions = ["feature_zero_fracs", "space_nan_fracs"], offenders = [3])
+        self.assertEqual(spaces.checks["test_function"].tolist(), ["space_nan_fracs", "feature_zero_fracs"])
+        self.assertEqual(len(spaces[0]), 1)
+        self.assertEqual(spaces[1], "feature zero fracs passed")
+
+    def test_export(self):
+        document = json.loads(self.report.to_json())
+        self.assertEqual(len(document["checks"]), 4)
+        self.assertEqual([alarm["offender"] for alarm in document["alarms"]], [3, 7, 11])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "alerts.parquet")
+            self.report.to_parquet(path)
+            frame = pd.read_parquet(path)
+
+        self.assertEqual(frame["offender"].tolist(), ["3", "7", "11"])
+        self.assertEqual(frame["severity"].tolist(), [1.5, 4.2, 2.])
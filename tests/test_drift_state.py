@@ -0,0 +1,143 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+import numpy as np
+from viewser.commands.queryset import drift_detection
+from viewser.commands.queryset import integrity_checks as ic
+from viewser.commands.queryset import config_drift as config
+from viewser.commands.queryset.drift_state import DriftState
+from viewser.commands.queryset.operations import QuerysetOperations
+from .test_drift_detection import make_df
+
+class TestDriftState(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.df = make_df(nfeature = 5)
+        self.months = self.df.index.get_level_values(0)
+
+    def test_incremental_update(self):
+        drift_detection.IncrementalInputGate(self.df[self.months < 120], "fp", state_directory = self.directory)
+
+        state = DriftState.load("fp", self.directory)
+        self.assertEqual(state.months.tolist(), list(range(100, 120)))
+        self.assertEqual(state.missing_months(self.months).tolist(), [120, 121, 122, 123])
+
+        gate = drift_detection.IncrementalInputGate(self.df, "fp", state_directory = self.directory)
+        self.assertEqual(DriftState.load("fp", self.directory).months.tolist(), list(range(100, 124)))
+
+        alerts = gate.assemble_alerts()
+        self.assertEqual(alerts[-1], "dataset ECOD drift not available from drift state")
+
+    def test_checks_match_full_data(self):
+        gate = drift_detection.IncrementalInputGate(self.df, "fp", state_directory = self.directory)
+        full = drift_detection.InputGate(self.df)
+
+        kwargs = {"features": full.columns, "test_partition_length": 1, "standard_partition_length": 10}
+
+        for key, check in config.default_config_dict.items():
+            if not isinstance(check, dict) or key in ("ks_drift", "ecod_drift"):
+                continue
+
+            expected, expected_translation = getattr(ic, check["test_function"])(
+                    tensor = full.tensor, index = full.index, statistics = full.statistics, **kwargs)
+            results, translation = getattr(ic, check["test_function"])(
+                    tensor = None, index = None, statistics = gate.statistics, **kwargs)
+
+            np.testing.assert_allclose(results, expected, rtol = 1e-9, err_msg = key)
+            self.assertEqual(translation, expected_translation)
+
+    def test_changed_features_rebuild_state(self):
+        drift_detection.IncrementalInputGate(self.df, "fp", state_directory = self.directory)
+        drift_detection.IncrementalInputGate(self.df.drop(columns = "feature_0"), "fp", state_directory = self.directory)
+
+        state = DriftState.load("fp", self.directory)
+        self.assertEqual(state.features, ["feature_1", "feature_2", "feature_3", "feature_4"])
+        self.assertEqual(len(state.months), 24)
+
+    def test_save_replaces_state(self):
+        state = DriftState()
+        state.update(self.df[self.months < 110])
+        state.save("fp", self.directory)
+
+        state.update(self.df)
+        with mock.patch("numpy.savez_compressed", side_effect = KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                state.save("fp", self.directory)
+
+        self.assertEqual(os.listdir(self.directory), ["fp.npz"])
+        self.assertEqual(DriftState.load("fp", self.directory).months.tolist(), list(range(100, 110)))
+
+        state.save("fp", self.directory)
+        self.assertEqual(os.listdir(self.directory), ["fp.npz"])
+        self.assertEqual(DriftState.load("fp", self.directory).months.tolist(), list(range(100, 124)))
+
+    def test_ignored_settings_raise(self):
+        operations = QuerysetOperations("http://www.foo.com")
+
+        with mock.patch.object(operations, "fetch", autospec = True) as fetch:
+            for kwargs in ({"incremental": True, "executor": "threads"}, {"incremental": True, "max_workers": 2},
+                           {"incremental": True, "precision": "float32"}, {"chunk_size": 2, "executor": "processes"}):
+                with self.assertRaises(RuntimeError, msg = kwargs):
+                    operations.fetch_with_drift_detection("my-queryset", None, None, **kwargs)
+
+            fetch.assert_not_called()
+
+class TestBacktest(TestCase):
+    def setUp(self):
+        self.df = make_df(ntime = 30, nfeature = 3)
+        self.drift_config = lambda: {"test_partition_length": 2, "standard_partition_length": 6,
+                **{key: {"threshold": check["threshold"]} for key, check in config.default_config_dict.items()
+                    if isinstance(check, dict) and "threshold" in check}}
+
+    def test_scores_match_sliced_data(self):
+        scores = drift_detection.BacktestInputGate(self.df, self.drift_config()).backtest(start = 110)
+        self.assertEqual(scores.index.tolist(), list(range(110, 130)))
+        self.assertTrue(scores["ecod_drift"].isna().all())
+
+        for month in (110, 117, 129):
+            data = self.df[self.df.index.get_level_values(0) <= month]
+            full = drift_detection.InputGate(data)
+            state = DriftState()
+            state.update(data)
+
+            for test_function in scores.columns.drop("ecod_drift"):
+                statistics = full.statistics if test_function != "ks_drift" else state.statistics(state.months)
+                results, _ = getattr(ic, test_function)(tensor = full.tensor, index = full.index,
+                        features = full.columns, statistics = statistics, test_partition_length = 2,
+                        standard_partition_length = 6)
+
+                results = np.atleast_1d(results)[~np.isnan(results)]
+                expected = results.max() if len(results) > 0 else np.nan
+                np.testing.assert_allclose(scores.loc[month, test_function], expected, rtol = 1e-9,
+                        err_msg = f"{test_function} at {month}")
+
+    def test_short_history(self):
+        scores = drift_detection.BacktestInputGate(self.df, self.drift_config()).backtest(end = 105)
+        self.assertTrue(scores["delta_completeness"].isna().all())
+        self.assertFalse(scores["global_nan_fracs"].isna().any())
+
+    def test_alarms_match_scores(self):
+        gate = drift_detection.BacktestInputGate(self.df, self.drift_config())
+        scores = gate.backtest()
+        report = gate.assemble_alerts()
+
+        failed = report.checks.set_index("test_function")["status"] == "failed"
+        thresholds = report.checks.set_index("test_function")["threshold"]
+        exceeded = scores.iloc[-1][failed.index] > thresholds
+
+        self.assertEqual(exceeded.drop("ecod_drift").tolist(), failed.drop("ecod_drift").tolist())
+
+    def test_extreme_values_of_large_values(self):
+        rng = np.random.default_rng(0)
+        df = make_df(ntime = 120, nspace = 200, nfeature = 1)
+        df["feature_0"] = 1e7 + rng.normal(size = len(df))
+        drift_config = {"test_partition_length": 1, "standard_partition_length": 24,
+                "extreme_values": {"threshold": 3.}}
+
+        scores = drift_detection.BacktestInputGate(df, drift_config).backtest()
+        full = drift_detection.InputGate(df)
+
+        results, _ = ic.extreme_values(tensor = full.tensor, index = full.index, features = full.columns,
+                statistics = full.statistics, test_partition_length = 1, standard_partition_length = 24)
+
+        np.testing.assert_allclose(scores["extreme_values"].iloc[-1], results.max(), rtol = 1e-6)
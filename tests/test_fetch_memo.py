@@ -0,0 +1,83 @@
+from unittest import TestCase, mock
+import numpy as np
+import pandas as pd
+from viewser.commands.queryset import fetch_memo
+from viewser.commands.queryset.models import Queryset, Column
+from viewser.commands.queryset.models import queryset as queryset_module
+
+def frame(value, rows = 100):
+    return pd.DataFrame({"a": np.full(rows, value, dtype = np.float64)}, index = pd.RangeIndex(rows))
+
+SIZE = int(frame(0).memory_usage(index = True, deep = True).sum())
+
+class TestFetchMemo(TestCase):
+    def test_lru_eviction(self):
+        memo = fetch_memo.FetchMemo(budget = 2*SIZE)
+
+        memo.put("a", frame(1))
+        memo.put("b", frame(2))
+        memo.get("a")
+        memo.put("c", frame(3))
+
+        self.assertIsNone(memo.get("b"))
+        self.assertEqual(memo.get("a")["a"].iloc[0], 1)
+        self.assertEqual(memo.get("c")["a"].iloc[0], 3)
+        self.assertEqual(memo.nbytes, 2*SIZE)
+
+        memo.configure(SIZE)
+        self.assertIsNone(memo.get("a"))
+        self.assertIsNotNone(memo.get("c"))
+
+    def test_larger_than_budget(self):
+        memo = fetch_memo.FetchMemo(budget = SIZE)
+        memo.put("a", frame(1, rows = 200))
+        self.assertIsNone(memo.get("a"))
+
+    def test_disabled(self):
+        memo = fetch_memo.FetchMemo()
+        memo.put("a", frame(1))
+        self.assertIsNone(memo.get("a"))
+
+    def test_copy(self):
+        memo = fetch_memo.FetchMemo(budget = SIZE)
+        memo.put("a", frame(1))
+
+        memo.get("a").iloc[0, 0] = 2
+        self.assertEqual(memo.get("a").iloc[0, 0], 1)
+
+    def test_shared_is_read_only(self):
+        memo = fetch_memo.FetchMemo(budget = SIZE, copy = False)
+        df = frame(1)
+        memo.put("a", df)
+
+        self.assertIs(memo.get("a"), df)
+        with self.assertRaises(ValueError):
+            memo.get("a").iloc[0, 0] = 2
+        self.assertEqual(memo.get("a").iloc[0, 0], 1)
+
+class TestQuerysetFetchMemo(TestCase):
+    def setUp(self):
+        self.queryset = (Queryset("my-queryset", "country_month")
+            .with_column(Column("ged_sb", "country_month", "ged_sb_best_sum_nokgi")))
+        Queryset.memoize(1)
+
+    def tearDown(self):
+        Queryset.memoize(0)
+        queryset_module.fetch_memo.clear()
+
+    def test_memoised_fetch(self):
+        with mock.patch.object(queryset_module.queryset_operations, "fetch",
+                side_effect = lambda name, start_date, end_date: frame(1)) as fetch:
+            self.queryset.fetch(400, 410)
+            self.queryset.fetch("400", "410")
+            self.assertEqual(fetch.call_count, 1)
+
+            self.queryset.fetch(400, 411)
+            self.assertEqual(fetch.call_count, 2)
+
+            self.queryset.describe("changed").fetch(400, 410)
+            self.assertEqual(fetch.call_count, 3)
+
+            Queryset.memoize(0)
+            self.queryset.fetch(400, 410)
+            self.assertEqual(fetch.call_count, 4)
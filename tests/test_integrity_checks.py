@@ -0,0 +1,186 @@
+
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+import scipy
+from viewser.commands.queryset import integrity_checks as ic
+from viewser.commands.queryset import drift_ks
+from viewser.commands.queryset import config_drift as config
+
+def make_tensor(ntime = 24, nspace = 30, nfeature = 4, seed = 0):
+    rng = np.random.default_rng(seed)
+    tensor = rng.gamma(0.5, 2.0, size = (ntime, nspace, nfeature))
+    tensor[rng.random(tensor.shape) < 0.3] = 0.0
+    tensor[rng.random(tensor.shape) < 0.02] = np.nan
+    tensor[:8, 3, :] = config.default_dne
+    tensor[5, 7, :] = config.default_dne
+
+    index = pd.MultiIndex.from_product([np.arange(100, 100 + ntime), np.arange(1, nspace + 1)])
+    features = [f"feature_{i}" for i in range(nfeature)]
+    return tensor, index, features
+
+# Per-unit loop implementations the vectorised checks replaced
+
+def reference_nan_fracs(tensor, axis):
+    uoa_mask = ic.get_valid_uoa_mask(tensor)
+    nans = np.where(np.isnan(tensor), 1, 0)
+    fracs = []
+    for i in range(tensor.shape[axis]):
+        fracs.append(np.count_nonzero(np.take(nans, i, axis = axis)) /
+                     np.count_nonzero(np.take(uoa_mask, i, axis = axis)))
+    return np.array(fracs)
+
+def reference_zero_fracs(tensor, axis):
+    uoa_mask = ic.get_valid_uoa_mask(tensor)
+    fracs = []
+    for i in range(tensor.shape[axis]):
+        fracs.append(1. - np.count_nonzero(np.take(tensor, i, axis = axis)) /
+                     np.count_nonzero(np.take(uoa_mask, i, axis = axis)))
+    return np.array(fracs)
+
+class TestAxisFractions(TestCase):
+    def setUp(self):
+        self.tensor, self.index, self.features = make_tensor()
+        self.kwargs = {"tensor": self.tensor, "index": self.index, "features": self.features}
+
+    def test_nan_fracs(self):
+        for axis, check in enumerate((ic.time_nan_fracs, ic.space_nan_fracs, ic.feature_nan_fracs)):
+            results, _ = check(**self.kwargs)
+            np.testing.assert_array_equal(results, reference_nan_fracs(self.tensor, axis))
+
+    def test_zero_fracs(self):
+        for axis, check in enumerate((ic.time_zero_fracs, ic.space_zero_fracs, ic.feature_zero_fracs)):
+            results, _ = check(**self.kwargs)
+            np.testing.assert_array_equal(results, reference_zero_fracs(self.tensor, axis))
+
+    def test_translation_dicts(self):
+        _, index_to_time = ic.time_nan_fracs(**self.kwargs)
+        _, index_to_space = ic.space_zero_fracs(**self.kwargs)
+        _, index_to_feature = ic.feature_nan_fracs(**self.kwargs)
+
+        self.assertEqual(index_to_time[0], 100)
+        self.assertEqual(index_to_space[29], 30)
+        self.assertEqual(index_to_feature[3], "feature_3")
+
+def reference_delta_fracs(tensor, index, flagged, test_partition_length, standard_partition_length):
+    standard, test = ic.partitioner(tensor, index, test_partition_length, standard_partition_length)
+    deltas = []
+    for ifeature in range(tensor.shape[2]):
+        standard_feature, test_feature = standard[:, :, ifeature], test[:, :, ifeature]
+        standard_frac = (np.count_nonzero(flagged(standard_feature)) /
+                         (np.count_nonzero(standard_feature != config.default_dne) + 1e-20))
+        test_frac = (np.count_nonzero(flagged(test_feature)) /
+                     (np.count_nonzero(test_feature != config.default_dne) + 1e-20))
+        deltas.append(np.abs(test_frac - standard_frac) / (standard_frac + 1e-20))
+    return np.array(deltas)
+
+class TestDeltaChecks(TestCase):
+    def setUp(self):
+        self.tensor, self.index, self.features = make_tensor(nfeature = 6)
+        self.tensor[-3:, :5, 2] = np.nan
+        self.tensor[-3:, 5:20, 4] = 0.0
+        self.kwargs = {"tensor": self.tensor, "index": self.index, "features": self.features,
+                "test_partition_length": 1, "standard_partition_length": 10}
+
+    def test_delta_completeness(self):
+        results, _ = ic.delta_completeness(**self.kwargs)
+        np.testing.assert_allclose(results, reference_delta_fracs(self.tensor, self.index, np.isnan, 1, 10))
+        self.assertEqual(np.argmax(results), 2)
+
+    def test_delta_zeroes(self):
+        results, _ = ic.delta_zeroes(**self.kwargs)
+        np.testing.assert_allclose(results, reference_delta_fracs(self.tensor, self.index, lambda x: x == 0, 1, 10))
+        self.assertEqual(np.argmax(results), 4)
+
+def reference_ks(standard_panel, test_panel, method = "auto"):
+    statistics, pvalues = [], []
+    for ifeature in range(standard_panel.shape[1]):
+        standard_feature, test_feature = standard_panel[:, ifeature], test_panel[:, ifeature]
+        result = scipy.stats.ks_2samp(standard_feature[standard_feature > 0], test_feature[test_feature > 0],
+                method = method)
+        statistics.append(result.statistic)
+        pvalues.append(result.pvalue)
+    return np.array(statistics), np.array(pvalues)
+
+class TestKsDrift(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.standard = np.round(rng.gamma(0.5, 2.0, size = (16000, 4)), 2)
+        self.test = np.round(rng.gamma(0.5, 2.2, size = (3000, 4)), 2)
+        self.standard[rng.random(self.standard.shape) < 0.3] = 0.0
+        self.standard[:50, 1] = np.nan
+        self.standard[:50, 2] = config.default_dne
+        self.test[:5, 3] = np.inf
+
+    def test_statistics(self):
+        # the exact method rounds statistics to multiples of 1/lcm(n1, n2)
+        statistics, _ = reference_ks(self.standard, self.test, method = "asymp")
+        np.testing.assert_array_equal(drift_ks.ks_statistics(self.standard, self.test), statistics)
+
+    def test_pvalues(self):
+        # asymptotic p-values, as more than KS_EXACT_MAX_N standard values are > 0
+        _, pvalues = reference_ks(self.standard, self.test)
+        np.testing.assert_allclose(drift_ks.ks_pvalues(self.standard, self.test), pvalues, rtol = 1e-12)
+
+        # exact p-values
+        _, pvalues = reference_ks(self.standard[:500], self.test[:100])
+        np.testing.assert_allclose(drift_ks.ks_pvalues(self.standard[:500], self.test[:100]), pvalues, rtol = 1e-12)
+
+    def test_untestable_features(self):
+        self.test[:, 2] = 0.0
+        pvalues = drift_ks.ks_pvalues(self.standard, self.test)
+        self.assertTrue(np.isnan(pvalues[2]))
+        self.assertFalse(np.isnan(pvalues[[0, 1, 3]]).any())
+
+    def test_subsampling(self):
+        pvalues = drift_ks.ks_pvalues(self.standard, self.test, max_samples = 2000)
+        np.testing.assert_array_equal(pvalues, drift_ks.ks_pvalues(self.standard, self.test, max_samples = 2000))
+
+        statistics = drift_ks.ks_statistics(drift_ks.subsample_rows(self.standard, 2000),
+                drift_ks.subsample_rows(self.test, 2000, 1))
+        full_statistics, _ = reference_ks(self.standard, self.test)
+        self.assertTrue(np.all(np.abs(statistics - full_statistics) < 0.1))
+
+    def test_subsampling_warning(self):
+        # the bound depends on the values > 0 kept, not on max_samples
+        self.standard[:, 0] = np.where(np.arange(self.standard.shape[0]) % 100 == 0, self.standard[:, 0], 0.0)
+
+        with self.assertLogs(drift_ks.logger, level = "WARNING") as logs:
+            drift_ks.ks_pvalues(self.standard, self.test, max_samples = 10000)
+        self.assertIn("of 1 features", logs.output[0])
+
+        with self.assertNoLogs(drift_ks.logger, level = "WARNING"):
+            drift_ks.ks_pvalues(self.standard, self.test, max_samples = 20000)
+
+class TestEcodDrift(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.tensor = rng.gamma(0.5, 2.0, size = (12, 2000, 3))
+        self.tensor[rng.random(self.tensor.shape) < 0.3] = 0.0
+        self.tensor[-2] *= 1.5
+        self.index = pd.MultiIndex.from_product([np.arange(100, 112), np.arange(2000)])
+        self.kwargs = {"tensor": self.tensor, "index": self.index, "features": ["a", "b", "c"],
+                "test_partition_length": 1, "standard_partition_length": 10}
+
+    def test_histogram_method(self):
+        exact, _ = ic.ecod_drift(**self.kwargs)
+        histogram, _ = ic.ecod_drift(method = "histogram", **self.kwargs)
+        self.assertGreater(exact[0], 1.)
+        self.assertAlmostEqual(histogram[0], exact[0], delta = 0.05)
+
+    def test_subsampling(self):
+        results, _ = ic.ecod_drift(max_samples = 5000, **self.kwargs)
+        self.assertGreater(results[0], 0.5)
+        np.testing.assert_array_equal(results, ic.ecod_drift(max_samples = 5000, **self.kwargs)[0])
+
+    def test_unknown_method(self):
+        with self.assertRaises(RuntimeError):
+            ic.ecod_drift(method = "kde", **self.kwargs)
+
+    def test_stratified_rows(self):
+        strata = np.repeat([0, 1, 2], [100, 300, 600])
+        rows = ic.stratified_rows(strata, 100)
+        self.assertEqual(np.bincount(strata[rows]).tolist(), [10, 30, 60])
+        self.assertTrue(np.all(np.diff(rows) > 0))
+        np.testing.assert_array_equal(rows, ic.stratified_rows(strata, 100))
+        np.testing.assert_array_equal(ic.stratified_rows(strata, 2000), np.arange(1000))
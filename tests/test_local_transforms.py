@@ -0,0 +1,70 @@
+
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from viewser.commands.queryset.models import Queryset, Column
+from viewser.commands.queryset import local_transforms
+
+class TestLocalTransforms(TestCase):
+    def setUp(self):
+        index = pd.MultiIndex.from_product([[100, 101, 102], [1, 2]], names = ["month_id", "country_id"])
+        self.raw = pd.DataFrame({
+                "country_month.ged_sb": [0., 1., np.nan, 3., 4., np.nan],
+                "country_year.wdi_pop:sum": [10., 20., 10., 20., 10., 20.],
+            }, index = index)
+
+        self.queryset = (Queryset("my-queryset", "country_month")
+            .with_column(Column("ln_ged_sb_tlag_1", "country_month", "ged_sb")
+                .transform.missing.replace_na()
+                .transform.ops.ln()
+                .transform.temporal.tlag(1))
+            .with_column(Column("pop", "country_year", "wdi_pop")
+                .aggregate("sum"))
+            )
+
+    def test_raw_queryset(self):
+        raw = local_transforms.raw_queryset(self.queryset)
+
+        self.assertEqual(raw.name, "my-queryset_raw")
+        self.assertEqual([c[0].arguments[0] for c in raw.operations],
+                ["country_month.ged_sb", "country_year.wdi_pop:sum"])
+        self.assertEqual([len(c) for c in raw.operations], [2, 2])
+
+    def test_evaluate_queryset(self):
+        df = local_transforms.evaluate_queryset(self.queryset, self.raw)
+
+        self.assertEqual(list(df.columns), ["ln_ged_sb_tlag_1", "pop"])
+        expected = [np.nan, np.nan, 0., np.log1p(1.), 0., np.log1p(3.)]
+        np.testing.assert_allclose(df["ln_ged_sb_tlag_1"].values, expected)
+        np.testing.assert_allclose(df["pop"].values, self.raw["country_year.wdi_pop:sum"].values)
+
+    def test_unsupported_transform(self):
+        column = Column("x", "country_month", "ged_sb").transform.spatial.lag(1)
+        with self.assertRaises(RuntimeError):
+            local_transforms.evaluate_column(column, self.raw)
+
+    def test_moving_window_with_missing(self):
+        index = pd.MultiIndex.from_product([[100, 101, 102], [1]], names = ["month_id", "country_id"])
+        s = pd.Series([np.nan, np.nan, 1.], index = index)
+
+        np.testing.assert_allclose(local_transforms.moving_sum(s, 2).values, [0., 0., 1.])
+        np.testing.assert_allclose(local_transforms.moving_average(s, 2).values, [np.nan, np.nan, 1.])
+
+    def test_fill_limit_area(self):
+        index = pd.MultiIndex.from_product([range(100, 105), [1, 2]], names = ["month_id", "country_id"])
+        s = pd.Series([np.nan, 1., 1., np.nan, np.nan, np.nan, 3., 4., np.nan, np.nan], index = index)
+
+        np.testing.assert_allclose(local_transforms.fill(s, "both", "inside").values,
+                [np.nan, 1., 1., 1., 1., 1., 3., 4., np.nan, np.nan])
+        np.testing.assert_allclose(local_transforms.fill(s, "backward", "inside").values,
+                [np.nan, 1., 1., 4., 3., 4., 3., 4., np.nan, np.nan])
+        np.testing.assert_allclose(local_transforms.fill(s, "both", "outside").values,
+                [1., 1., 1., np.nan, np.nan, np.nan, 3., 4., 3., 4.])
+
+        with self.assertRaises(RuntimeError):
+            local_transforms.fill(s, "both", "everywhere")
+
+    def test_evaluate_fill_limit_area(self):
+        column = Column("x", "country_month", "ged_sb").transform.missing.fill("forward", "outside")
+        series = local_transforms.evaluate_column(column, self.raw)
+        np.testing.assert_allclose(series.values, [0., 1., np.nan, 3., 4., 3.])
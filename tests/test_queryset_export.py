@@ -0,0 +1,106 @@
+from unittest import TestCase, mock
+import json
+import os
+import tempfile
+import responses
+from click.testing import CliRunner
+from viewser.commands.queryset.cli import queryset_export
+from viewser.commands.queryset.operations import QuerysetOperations
+from viewser.commands.queryset.models import Queryset, Column
+
+def definition(name):
+    queryset = (Queryset(name, "country_month")
+        .with_column(Column("ged_sb", "country_month", "ged_sb_best_sum_nokgi")
+            .transform.ops.ln()))
+    return json.loads(json.dumps(queryset.dict()))
+
+class TestQuerysetExport(TestCase):
+    def setUp(self):
+        self.operations = QuerysetOperations("http://www.foo.com")
+        self.directory = tempfile.TemporaryDirectory()
+        self.out_dir = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def export(self, stored, names = None, prune = False):
+        names = names if names is not None else list(stored.keys())
+        with mock.patch.object(self.operations, "definitions_with_errors",
+                side_effect = lambda names, max_workers = 8: ({name: stored.get(name) for name in names}, {})):
+            return self.operations.export(names, self.out_dir, prune = prune)
+
+    def manifest(self):
+        with open(os.path.join(self.out_dir, QuerysetOperations.EXPORT_MANIFEST)) as f:
+            return json.load(f)
+
+    def test_written_unchanged_missing(self):
+        stored = {"a": definition("a"), "b": definition("b")}
+
+        result = self.export(stored, ["a", "b", "c"])
+        self.assertEqual((result["written"], result["missing"]), (["a", "b"], ["c"]))
+        self.assertEqual(sorted(os.listdir(self.out_dir)), [QuerysetOperations.EXPORT_MANIFEST, "a.py", "b.py"])
+
+        stored["b"] = definition("b") | {"description": "changed"}
+        result = self.export(stored)
+        self.assertEqual((result["written"], result["unchanged"]), (["b"], ["a"]))
+
+        with open(os.path.join(self.out_dir, "b.py")) as f:
+            self.assertIn("changed", f.read())
+
+    def test_pruned(self):
+        self.export({"a": definition("a"), "b": definition("b")})
+
+        result = self.export({"a": definition("a")}, prune = True)
+
+        self.assertEqual((result["unchanged"], result["removed"]), (["a"], ["b"]))
+        self.assertEqual(sorted(os.listdir(self.out_dir)), [QuerysetOperations.EXPORT_MANIFEST, "a.py"])
+        self.assertEqual(list(self.manifest().keys()), ["a"])
+
+    def test_failed_definition(self):
+        broken = definition("broken") | {"unknown": None}
+
+        result = self.export({"a": definition("a"), "broken": broken})
+
+        self.assertEqual((result["written"], result["failed"]), (["a"], ["broken"]))
+        self.assertEqual(list(self.manifest().keys()), ["a"])
+
+    def test_module_name_collision(self):
+        result = self.export({"a-b": definition("a-b"), "a.b": definition("a.b"), "c": definition("c")})
+
+        self.assertEqual((result["written"], sorted(result["failed"])), (["c"], ["a-b", "a.b"]))
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir, "a_b.py")))
+
+        self.export({"a-b": definition("a-b")})
+        result = self.export({"a.b": definition("a.b")})
+        self.assertEqual(result["failed"], ["a.b"])
+
+    def test_manifest_written_on_error(self):
+        stored = {"a": definition("a"), "b": definition("b")}
+        render = self.operations.qs_json_to_code
+
+        def interrupted(json_):
+            if json_["name"] == "b":
+                raise KeyboardInterrupt
+            return render(json_)
+
+        with mock.patch.object(self.operations, "qs_json_to_code", side_effect = interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                self.export(stored)
+
+        self.assertEqual(list(self.manifest().keys()), ["a"])
+
+    @responses.activate
+    def test_store_error(self):
+        for name in ("a", "c"):
+            responses.add(method = "GET", url = f"http://www.foo.com/querysets/{name}", json = definition(name))
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/b", status = 500)
+
+        result = CliRunner().invoke(queryset_export, ["a", "b", "c", "--out-dir", self.out_dir],
+                obj = {"operations": self.operations})
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIsInstance(result.exception, SystemExit)
+        self.assertIn("Wrote 2", result.stdout)
+        self.assertIn("Failed to export 1 querysets: b", result.stderr)
+        self.assertEqual(sorted(self.manifest().keys()), ["a", "c"])
+        self.assertEqual(sorted(os.listdir(self.out_dir)), [QuerysetOperations.EXPORT_MANIFEST, "a.py", "c.py"])
@@ -0,0 +1,81 @@
+
+from unittest import TestCase
+import requests
+import responses
+from click.testing import CliRunner
+from viewser.commands.queryset.cli import queryset_analyze
+from viewser.commands.queryset.models import Queryset, Column
+from viewser.commands.queryset.operations import QuerysetOperations
+from viewser.commands.queryset.planner import QueryPlan
+
+class TestQueryPlan(TestCase):
+    def setUp(self):
+        self.queryset = (Queryset("my-queryset", "country_month")
+            .with_column(Column("ln_ged_sb", "country_month", "ged_sb")
+                .transform.ops.ln())
+            .with_column(Column("ln_ged_sb_tlag_1", "country_month", "ged_sb")
+                .transform.ops.ln()
+                .transform.temporal.tlag(1))
+            .with_column(Column("ln_ged_sb_tlag_2", "country_month", "ged_sb")
+                .transform.ops.ln()
+                .transform.temporal.tlag(2))
+            .with_column(Column("ged_os", "country_month", "ged_os"))
+            )
+
+    def test_deduplication(self):
+        plan = QueryPlan.from_queryset(self.queryset)
+
+        self.assertEqual(plan.n_operations, 2 + 3 + 3 + 1)
+        self.assertEqual(plan.n_unique_operations, 5)
+        self.assertEqual(plan.n_redundant_operations, 4)
+        self.assertEqual(plan.n_retrievals, 4)
+        self.assertEqual(plan.n_unique_retrievals, 2)
+
+        tlag_1 = plan.chain(plan.outputs["ln_ged_sb_tlag_1"])
+        self.assertEqual([node.name for node in tlag_1], ["country_month.ged_sb", "ops.ln", "temporal.tlag"])
+        self.assertEqual(plan.chain(plan.outputs["ln_ged_sb_tlag_2"])[:2], tlag_1[:2])
+
+    def test_shared_prefixes(self):
+        prefixes = QueryPlan.from_queryset(self.queryset).shared_prefixes()
+
+        self.assertEqual(len(prefixes), 1)
+        self.assertEqual(prefixes[0].operations, ["country_month.ged_sb[values]", "ops.ln()"])
+        self.assertEqual(prefixes[0].columns, ["ln_ged_sb", "ln_ged_sb_tlag_1", "ln_ged_sb_tlag_2"])
+        self.assertEqual(prefixes[0].redundant_operations, 4)
+
+    def test_nested_prefixes(self):
+        queryset = (self.queryset
+            .with_column(Column("ln_ged_sb_tlag_1_ma", "country_month", "ged_sb")
+                .transform.ops.ln()
+                .transform.temporal.tlag(1)
+                .transform.temporal.moving_average(3)))
+
+        plan = QueryPlan.from_queryset(queryset)
+        prefixes = plan.shared_prefixes()
+
+        self.assertEqual([prefix.operations[-1] for prefix in prefixes], ["ops.ln()", "temporal.tlag(1)"])
+        self.assertEqual([prefix.redundant_operations for prefix in prefixes], [6, 1])
+        self.assertEqual(sum(prefix.redundant_operations for prefix in prefixes), plan.n_redundant_operations)
+
+class TestAnalyze(TestCase):
+    def analyze(self):
+        return CliRunner().invoke(queryset_analyze, ["my-queryset"],
+                obj = {"operations": QuerysetOperations("http://www.foo.com")})
+
+    @responses.activate
+    def test_not_in_store(self):
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/my-queryset", status = 404)
+
+        result = self.analyze()
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("does not appear to be in the queryset store", result.output)
+
+    @responses.activate
+    def test_unreachable(self):
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/my-queryset",
+                body = requests.ConnectionError("unreachable"))
+
+        result = self.analyze()
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("Failed to retrieve queryset my-queryset", result.output)
+        self.assertNotIn("does not appear", result.output)
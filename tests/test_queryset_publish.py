@@ -0,0 +1,71 @@
+
+from unittest import TestCase
+import json
+import requests
+import responses
+from viewser.commands.queryset.operations import QuerysetOperations
+from viewser.commands.queryset.fingerprint import definition_fingerprint
+from viewser.commands.queryset.models import Queryset, Column
+
+class TestQuerysetPublish(TestCase):
+    def setUp(self):
+        self.operations = QuerysetOperations("http://www.foo.com")
+        self.queryset = (Queryset("my-queryset", "country_month")
+            .with_column(Column("ged_sb", "country_month", "ged_sb_best_sum_nokgi")
+                .transform.ops.ln()
+                )
+            )
+
+    @responses.activate
+    def test_unchanged_is_skipped(self):
+        stored = json.loads(json.dumps(self.queryset.dict()))
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/my-queryset", json = stored)
+
+        self.assertIsNone(self.operations.publish(self.queryset, if_changed = True))
+        self.assertEqual([c.request.method for c in responses.calls], ["GET"])
+
+    @responses.activate
+    def test_changed_is_published(self):
+        stored = json.loads(json.dumps(self.queryset.describe("an older description").dict()))
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/my-queryset", json = stored)
+        responses.add(method = "POST", url = "http://www.foo.com/querysets", status = 200)
+
+        response = self.operations.publish(self.queryset, if_changed = True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c.request.method for c in responses.calls], ["GET", "POST"])
+
+    @responses.activate
+    def test_publish_many(self):
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/my-queryset", status = 404)
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/other-queryset",
+                json = json.loads(json.dumps(self.queryset.dict())) | {"name": "other-queryset"})
+        responses.add(method = "POST", url = "http://www.foo.com/querysets", status = 200)
+
+        other = self.queryset.copy()
+        other.name = "other-queryset"
+
+        published = self.operations.publish_many([self.queryset, other], if_changed = True)
+
+        self.assertEqual(list(published.keys()), ["my-queryset", "other-queryset"])
+        self.assertEqual(published["my-queryset"].status_code, 200)
+        self.assertIsNone(published["other-queryset"])
+
+    @responses.activate
+    def test_failed_comparison_is_not_published(self):
+        responses.add(method = "POST", url = "http://www.foo.com/querysets", status = 200)
+
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/my-queryset", status = 503)
+        with self.assertRaises(RuntimeError):
+            self.operations.publish(self.queryset, if_changed = True)
+
+        responses.replace(responses.GET, "http://www.foo.com/querysets/my-queryset",
+                body = requests.ConnectionError("unreachable"))
+        with self.assertRaises(requests.ConnectionError):
+            self.operations.publish(self.queryset, if_changed = True)
+
+        self.assertEqual([c.request.method for c in responses.calls], ["GET", "GET"])
+
+    def test_fingerprint(self):
+        stored = json.loads(json.dumps(self.queryset.dict()))
+        self.assertEqual(self.queryset.fingerprint(), definition_fingerprint(stored))
+        self.assertNotEqual(self.queryset.fingerprint(), self.queryset.with_theme("a").fingerprint())
@@ -0,0 +1,134 @@
+from unittest import TestCase, mock
+import contextlib
+import io
+import json
+import requests
+import responses
+import pandas as pd
+from viewser.settings import config_resolver
+from viewser.commands.queryset.operations import QuerysetOperations
+from viewser.commands.queryset.models import Queryset, Column, util
+from viewser.commands.queryset.models import queryset as queryset_module
+
+def definition(name):
+    queryset = (Queryset(name, "country_month")
+        .with_column(Column("ged_sb", "country_month", "ged_sb_best_sum_nokgi")
+            .transform.ops.ln()))
+    return json.loads(json.dumps(queryset.dict()))
+
+class TestTtlCache(TestCase):
+    def test_expiry(self):
+        cache = util.TtlCache(10)
+
+        with mock.patch("time.monotonic", return_value = 100.):
+            cache.set("a", 1)
+            self.assertEqual(cache.get("a"), 1)
+
+        with mock.patch("time.monotonic", return_value = 109.):
+            self.assertEqual(cache.get("a"), 1)
+
+        with mock.patch("time.monotonic", return_value = 111.):
+            self.assertIsNone(cache.get("a"))
+
+    def test_disabled(self):
+        cache = util.TtlCache(0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_clear(self):
+        cache = util.TtlCache(10)
+        cache.set("a", 1)
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+
+class TestFromStorageMany(TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(config_resolver.ConfigResolver, "get", return_value = "http://www.foo.com"),
+            mock.patch.object(queryset_module, "_definition_cache", util.TtlCache(60))]
+
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def url(self, name):
+        return f"http://www.foo.com/querysets/querysets/{name}"
+
+    @responses.activate
+    def test_cached(self):
+        for name in ("a", "b"):
+            responses.add(method = "GET", url = self.url(name), json = definition(name))
+
+        querysets = Queryset.from_storage_many(["b", "a", "b"])
+        self.assertEqual([queryset.name for queryset in querysets], ["b", "a", "b"])
+        self.assertEqual(len(responses.calls), 2)
+
+        Queryset.from_storage_many(["a", "b"])
+        self.assertEqual(len(responses.calls), 2)
+
+        Queryset.clear_definition_cache()
+        Queryset.from_storage_many(["a"])
+        self.assertEqual(len(responses.calls), 3)
+
+    @responses.activate
+    def test_missing(self):
+        responses.add(method = "GET", url = self.url("a"), json = definition("a"))
+        responses.add(method = "GET", url = self.url("b"), status = 404)
+
+        with self.assertRaisesRegex(RuntimeError, "do not appear to be in the queryset store"):
+            Queryset.from_storage_many(["a", "b"])
+
+    @responses.activate
+    def test_server_error(self):
+        responses.add(method = "GET", url = self.url("a"), status = 500)
+
+        with self.assertRaisesRegex(RuntimeError, "500"):
+            Queryset.from_storage_many(["a"])
+
+    @responses.activate
+    def test_unreachable(self):
+        responses.add(method = "GET", url = self.url("a"), body = requests.ConnectionError("unreachable"))
+
+        with self.assertRaises(requests.ConnectionError):
+            Queryset.from_storage_many(["a"])
+        self.assertIsNone(queryset_module._definition_cache.get("a"))
+
+class TestDefinitionsWithErrors(TestCase):
+    @responses.activate
+    def test_errors_per_name(self):
+        operations = QuerysetOperations("http://www.foo.com")
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/a", json = definition("a"))
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/b", status = 500)
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/c", status = 404)
+        responses.add(method = "GET", url = "http://www.foo.com/querysets/d",
+                body = requests.ConnectionError("unreachable"))
+
+        definitions, errors = operations.definitions_with_errors(["a", "b", "c", "d"])
+
+        self.assertEqual(definitions, {"a": definition("a"), "c": None})
+        self.assertEqual(list(errors.keys()), ["b", "d"])
+        self.assertIsInstance(errors["b"], RuntimeError)
+        self.assertIsInstance(errors["d"], requests.ConnectionError)
+
+        with self.assertRaises(RuntimeError):
+            operations.definitions(["a", "b"])
+
+class TestQuietFetch(TestCase):
+    @responses.activate
+    def test_no_progress(self):
+        operations = QuerysetOperations("http://www.foo.com")
+        body = io.BytesIO()
+        pd.DataFrame({"a": [1., 2.]}).to_parquet(body)
+        responses.add(method = "GET", url = "http://www.foo.com/data/a", body = body.getvalue())
+        responses.add(method = "GET", url = "http://www.foo.com/data/b", body = "queryset b failed")
+
+        with mock.patch("time.sleep"), contextlib.redirect_stdout(io.StringIO()) as stdout:
+            self.assertEqual(operations.fetch("a", progress = False)["a"].tolist(), [1., 2.])
+
+            with self.assertLogs("viewser.commands.queryset.operations", "ERROR"):
+                self.assertTrue(operations.fetch("b", progress = False).empty)
+
+            self.assertEqual(stdout.getvalue(), "")
+
+            operations.fetch("a")
+            self.assertIn("Queryset a read successfully", stdout.getvalue())
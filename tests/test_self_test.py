@@ -0,0 +1,59 @@
+
+from unittest import TestCase, mock
+import numpy as np
+from viewser.commands.queryset import drift_detection
+from viewser.commands.queryset import self_test as st
+from viewser.commands.queryset import config_drift as config
+from .test_integrity_checks import make_tensor
+
+class TestPerturbations(TestCase):
+    def setUp(self):
+        self.tensor, self.index, _ = make_tensor(nfeature = 5)
+        self.original = self.tensor.copy()
+
+    def self_test_kwargs(self, key):
+        return {**config.default_config_dict[key], "index": self.index,
+                "test_partition_length": 1, "standard_partition_length": 10}
+
+    def test_random_indices(self):
+        indices = st.get_random_indices(self.tensor, fraction = 0.1, rng = np.random.default_rng(1))
+
+        self.assertEqual(len(indices), 3)
+        for coordinate, length in zip(indices, self.tensor.shape):
+            self.assertEqual(len(coordinate), int(0.1*self.tensor.size))
+            self.assertTrue(np.all((coordinate >= 0) & (coordinate < length)))
+
+    def test_perturb_and_restore(self):
+        for key, entry in config.default_config_dict.items():
+            if not isinstance(entry, dict):
+                continue
+
+            undo = getattr(st, "perturb_" + entry["test_function"])(self.tensor, **self.self_test_kwargs(key))
+            self.assertFalse(np.array_equal(self.tensor, self.original, equal_nan = True), key)
+
+            st.restore(undo)
+            np.testing.assert_array_equal(self.tensor, self.original)
+
+    def test_reproducible(self):
+        perturbed = []
+        for _ in range(2):
+            undo = st.perturb_ks_drift(self.tensor, **self.self_test_kwargs("ks_drift"))
+            perturbed.append(self.tensor.copy())
+            st.restore(undo)
+
+        np.testing.assert_array_equal(*perturbed)
+
+        undo = st.perturb_ks_drift(self.tensor, seed = 1, **self.self_test_kwargs("ks_drift"))
+        self.assertFalse(np.array_equal(self.tensor, perturbed[0], equal_nan = True))
+        st.restore(undo)
+
+    def test_perturbation_errors(self):
+        kwargs = self.self_test_kwargs("ks_drift")
+
+        for error in (KeyError("threshold"), TypeError("unexpected argument"), ValueError("broken")):
+            with mock.patch.object(st, "perturb_ks_drift", side_effect = error):
+                with self.assertLogs(drift_detection.logger, level = "ERROR") as logs:
+                    self.assertIsNone(drift_detection._run_self_test(self.tensor, None, kwargs))
+
+            self.assertIn("ks_drift", logs.output[0])
+        np.testing.assert_array_equal(self.tensor, self.original)
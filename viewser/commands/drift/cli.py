@@ -0,0 +1,52 @@
+import json
+import sys
+from typing import Optional, Tuple
+import click
+from . import operations
+
+@click.group(name="drift", short_help="input drift detection on local data")
+def cli():
+    """
+    Run the input drift checks on local data files
+    """
+
+@cli.command(name="check", short_help="run the drift checks on parquet files")
+@click.argument("files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("-c", "--config", "config_file", type=click.File("r"), default=None,
+        help="JSON drift configuration, as passed to fetch_with_drift_detection (default: all checks)")
+@click.option("-o", "--output", type=click.File("w"), default="-", help="File to write the JSON report to")
+@click.option("-w", "--workers", type=int, default=None, help="Number of worker processes")
+@click.option("-i", "--index-columns", type=str, default=None,
+        help="Time and space columns to index files stored without their index by, e.g. month_id,country_id")
+@click.option("--precision", type=click.Choice(["float64", "float32"]), default="float64",
+        help="Float type of the data examined by the checks")
+def drift_check(
+        files: Tuple[str, ...],
+        config_file,
+        output,
+        workers: Optional[int],
+        index_columns: Optional[str],
+        precision: str):
+    """
+    Run the drift checks of the configuration on every parquet file in FILES,
+    in parallel worker processes, and write one consolidated JSON report.
+
+    Exits with status 1 if any check failed, and 2 if any file could not be
+    checked.
+    """
+    drift_config_dict = json.load(config_file) if config_file is not None else None
+
+    report = operations.check_files(
+            list(files),
+            drift_config_dict,
+            index_columns.split(",") if index_columns else None,
+            precision,
+            workers)
+
+    json.dump(report, output, indent=2, default=str)
+    output.write("\n")
+
+    for line in operations.summary_lines(report):
+        click.echo(line, err=True)
+
+    sys.exit(operations.exit_code(report))
@@ -0,0 +1,113 @@
+"""
+Drift detection on local data files, outside the fetch of a queryset.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+import copy
+import datetime
+import os
+import pandas as pd
+from viewser.commands.queryset import drift_detection
+
+
+def read_dataset(path: str, index_columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    read_dataset
+
+    Read a parquet file as fetched or exported by viewser, indexed by time and
+    space units. Files stored without their index are indexed by
+    index_columns (time column, space column).
+    """
+    df = pd.read_parquet(path)
+
+    if index_columns and df.index.nlevels != 2:
+        df = df.set_index(list(index_columns))
+
+    if df.index.nlevels != 2:
+        raise RuntimeError(f'{path} is not indexed by time and space units: '
+                           f'pass the names of its time and space columns')
+
+    return df
+
+
+def check_file(path: str, drift_config_dict: Optional[Dict[str, Any]] = None,
+               index_columns: Optional[Sequence[str]] = None, precision: str = 'float64') -> Dict[str, Any]:
+    """
+    check_file
+
+    Run the drift checks of an InputGate on the dataset in path. Returns the
+    report of the file: its path, its number of rows, status 'checked' and the
+    AlertReport of the checks as a dictionary, or status 'error' and the error
+    if the file could not be read or checked.
+    """
+    try:
+        df = read_dataset(path, index_columns)
+
+        report = drift_detection.InputGate(df, drift_config_dict=copy.deepcopy(drift_config_dict),
+                                           precision=precision).assemble_alerts()
+    except Exception as e:
+        return {"file": path, "status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    return {"file": path, "status": "checked", "rows": len(df), "failed": report.failed, "report": report.to_dict()}
+
+
+def check_files(paths: Sequence[str], drift_config_dict: Optional[Dict[str, Any]] = None,
+                index_columns: Optional[Sequence[str]] = None, precision: str = 'float64',
+                max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    check_files
+
+    Check every file of paths with check_file, in a pool of max_workers worker
+    processes (default: one per file, up to the number of CPUs), and return a
+    consolidated report: the reports of the files, in the order of paths, and
+    the numbers of files checked, failing checks and which could not be
+    checked.
+    """
+    max_workers = max_workers if max_workers is not None else max(1, min(len(paths), os.cpu_count() or 1))
+
+    arguments = [(path, drift_config_dict, index_columns, precision) for path in paths]
+
+    if max_workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            files = list(pool.map(check_file, *zip(*arguments)))
+    else:
+        files = [check_file(*file_arguments) for file_arguments in arguments]
+
+    return {"timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "config": drift_config_dict,
+            "files": files,
+            "summary": {"files": len(files),
+                        "failed": sum(1 for file in files if file.get("failed")),
+                        "errors": sum(1 for file in files if file["status"] == "error")}}
+
+
+def exit_code(report: Dict[str, Any]) -> int:
+    """
+    exit_code
+
+    0 if all files were checked and passed, 1 if any check failed, 2 if any
+    file could not be checked
+    """
+    if report["summary"]["errors"] > 0:
+        return 2
+    if report["summary"]["failed"] > 0:
+        return 1
+    return 0
+
+
+def summary_lines(report: Dict[str, Any]) -> List[str]:
+    lines = []
+
+    for file in report["files"]:
+        if file["status"] == "error":
+            lines.append(f"{file['file']}: error: {file['error']}")
+            continue
+
+        checks = file["report"]["checks"]
+        failed = [check["test_function"] for check in checks if check["status"] == "failed"]
+        alarms = sum(check["alarms"] for check in checks)
+
+        lines.append(f"{file['file']}: {len(checks)} checks, {len(failed)} failed ({alarms} alarms)" +
+                     (f": {', '.join(failed)}" if failed else ""))
+
+    return lines
@@ -1,13 +1,16 @@
 
 import datetime
 import io
+import sys
 import pandas as pd
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 import click
+import requests
 from viewser import settings
 from viewser.settings import defaults
-from . import operations, formatting
+from . import operations, formatting, planner, definition_index
+from viewser.tui.formatting import conventions
 
 
 @click.group(name="queryset", short_help="queryset_operations related to querysets")
@@ -62,6 +65,67 @@ def queryset_show(ctx_obj: Dict[str, Any], name: str):
     click.echo(ctx_obj["operations"].show(name))
 
 
+@cli.command(name="analyze", short_help="show redundant operations in a queryset")
+@click.argument("name", type=str)
+@click.option("--plan", is_flag=True, help="Output the deduplicated plan as json")
+@click.pass_obj
+def queryset_analyze(ctx_obj: Dict[str, Any], name: str, plan: bool):
+    """
+    Compile the queryset NAME into a plan in which every shared chain of
+    operations is computed once, and show which operations are repeated
+    across columns.
+    """
+    try:
+        definition = ctx_obj["operations"].definition(name)
+    except (requests.RequestException, RuntimeError) as e:
+        raise click.ClickException(f"Failed to retrieve queryset {name} from the queryset store: {e}")
+
+    if definition is None:
+        raise click.ClickException(f"queryset {name} does not appear to be in the queryset store")
+
+    query_plan = planner.QueryPlan.from_definition(definition)
+
+    if plan:
+        click.echo(query_plan.json())
+    else:
+        click.echo(formatting.QueryPlanFormatter().formatted(query_plan))
+
+
+@cli.command(name="export", short_help="export querysets to python modules")
+@click.argument("names", type=str, nargs=-1)
+@click.option("-a", "--all", "all_", is_flag=True, help="Export all querysets in the queryset store")
+@click.option("-o", "--out-dir", type=click.Path(file_okay=False), required=True)
+@click.option("-w", "--workers", type=int, default=8, help="Number of concurrent requests")
+@click.pass_obj
+def queryset_export(ctx_obj: Dict[str, Any], names: Tuple[str, ...], all_: bool, out_dir: str, workers: int):
+    """
+    Export the querysets NAMES, or all querysets with --all, as python code to
+    one module per queryset in OUT_DIR. Only modules whose definitions have
+    changed since the last export are rewritten. With --all, modules of
+    querysets that have been removed from the store are deleted.
+    """
+    if all_ == bool(names):
+        raise click.UsageError("Pass either queryset names or --all")
+
+    if all_:
+        try:
+            names = ctx_obj["operations"].list()
+        except (requests.RequestException, ValueError, KeyError) as e:
+            raise click.ClickException(f"Failed to list the querysets in the queryset store: {e}")
+
+    result = ctx_obj["operations"].export(names, out_dir, max_workers=workers, prune=all_)
+
+    for name in result["missing"]:
+        click.echo(f"Queryset {name} does not appear to be in the queryset store")
+
+    click.echo(f"Wrote {len(result['written'])}, unchanged {len(result['unchanged'])}, "
+               f"removed {len(result['removed'])}")
+
+    if result["failed"]:
+        click.echo(f"Failed to export {len(result['failed'])} querysets: {', '.join(result['failed'])}", err=True)
+        sys.exit(1)
+
+
 @cli.command(name="delete", short_help="delete a queryset")
 @click.confirmation_option(prompt="Delete queryset?")
 @click.argument("name", type=str)
@@ -72,3 +136,53 @@ def queryset_delete(ctx_obj: Dict[str, Any], name: str):
     """
     ctx_obj["operations"].delete(name)
     click.echo(f"Deleted {name}")
+
+
+@cli.group(name="index", short_help="local, searchable index of queryset definitions")
+@click.pass_obj
+def queryset_index(ctx_obj: Dict[str, Any]):
+    ctx_obj["definition_index"] = definition_index.DefinitionIndex.default()
+
+
+@queryset_index.command(name="sync", short_help="pull all queryset definitions into the local index")
+@click.option("-w", "--workers", type=int, default=8, help="Number of concurrent requests")
+@click.pass_obj
+def queryset_index_sync(ctx_obj: Dict[str, Any], workers: int):
+    """
+    Pull all queryset definitions from the queryset store into the local
+    index, updating only definitions that have changed.
+    """
+    result = ctx_obj["definition_index"].sync(ctx_obj["operations"], max_workers=workers)
+    click.echo(f"Added {len(result.added)}, updated {len(result.updated)}, "
+               f"removed {len(result.removed)}, unchanged {result.unchanged}")
+
+    if result.failed:
+        click.echo(f"Failed to retrieve {len(result.failed)} definitions: {', '.join(result.failed)}", err=True)
+
+
+@queryset_index.command(name="search", short_help="search the local index of queryset definitions")
+@click.option("-b", "--base", type=str, help="Database column, as loa.column or column")
+@click.option("-t", "--transform", type=str, help="Transform name, e.g. temporal.tlag")
+@click.option("--theme", type=str, help="Queryset theme")
+@click.option("--loa", type=str, help="Queryset level of analysis")
+@click.pass_obj
+def queryset_index_search(
+        ctx_obj:   Dict[str, Any],
+        base:      Optional[str],
+        transform: Optional[str],
+        theme:     Optional[str],
+        loa:       Optional[str]):
+    """
+    Search the local index for querysets matching all given criteria. Run
+    "viewser queryset index sync" first to populate the index.
+    """
+    results = ctx_obj["definition_index"].search(base=base, transform=transform, theme=theme, loa=loa)
+
+    if base is not None or transform is not None:
+        rows = [(r.queryset, r.loa, r.column, r.base) for r in results]
+        headers = ("queryset", "loa", "column", "base")
+    else:
+        rows = [(r.queryset, r.loa) for r in results]
+        headers = ("queryset", "loa")
+
+    click.echo(conventions.tabulate(rows, headers))
@@ -63,12 +63,14 @@ default_config_dict = {
     'ks_drift':            {'threshold': 100.,
                             'test_function': 'ks_drift',
                             'message': 'feature KS drift',
-                            'self_test': None},
+                            'self_test': None,
+                            'parameters': {'max_samples': None}},
 
     'ecod_drift':          {'threshold': 0.05,
                             'test_function': 'ecod_drift',
                             'message': 'dataset ECOD drift',
-                            'self_test': None},
+                            'self_test': None,
+                            'parameters': {'max_samples': None, 'n_jobs': 1, 'method': 'exact', 'bins': 1000}},
 
     'standard_partition_length': 10,
     'test_partition_length': 1,
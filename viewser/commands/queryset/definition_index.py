@@ -0,0 +1,281 @@
+"""
+definition_index
+================
+
+A local SQLite index of queryset definitions, which can be searched offline,
+e.g. for all querysets that depend on a given database column.
+
+"""
+from typing import Any, Callable, Dict, List, Optional
+import datetime
+import json
+import os
+import pydantic
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, sessionmaker
+from viewser.settings import static
+from . import fingerprint
+
+INDEX_DB_FILE = os.path.join(static.CONFIG_DIR, "queryset_index.sqlite")
+
+metadata = sa.MetaData()
+Base = declarative_base(metadata = metadata)
+
+
+class IndexedQueryset(Base):
+    __tablename__ = "queryset"
+    name        = sa.Column(sa.String(), primary_key = True)
+    loa         = sa.Column(sa.String(), index = True)
+    description = sa.Column(sa.String())
+    fingerprint = sa.Column(sa.String())
+    definition  = sa.Column(sa.Text())
+    synced      = sa.Column(sa.DateTime(), default = datetime.datetime.now)
+
+
+class IndexedColumn(Base):
+    __tablename__ = "queryset_column"
+    queryset    = sa.Column(sa.String(), sa.ForeignKey("queryset.name", ondelete = "CASCADE"), primary_key = True)
+    name        = sa.Column(sa.String(), primary_key = True)
+    base        = sa.Column(sa.String(), index = True)
+    aggregation = sa.Column(sa.String())
+
+
+class IndexedTransform(Base):
+    __tablename__ = "queryset_transform"
+    queryset    = sa.Column(sa.String(), sa.ForeignKey("queryset.name", ondelete = "CASCADE"), primary_key = True)
+    column      = sa.Column(sa.String(), primary_key = True)
+    position    = sa.Column(sa.Integer(), primary_key = True)
+    name        = sa.Column(sa.String(), index = True)
+    arguments   = sa.Column(sa.String())
+
+
+class IndexedTheme(Base):
+    __tablename__ = "queryset_theme"
+    queryset    = sa.Column(sa.String(), sa.ForeignKey("queryset.name", ondelete = "CASCADE"), primary_key = True)
+    theme       = sa.Column(sa.String(), primary_key = True, index = True)
+
+
+class SyncResult(pydantic.BaseModel):
+    added: List[str] = []
+    updated: List[str] = []
+    removed: List[str] = []
+    failed: List[str] = []
+    unchanged: int = 0
+
+
+class SearchResult(pydantic.BaseModel):
+    queryset: str
+    loa: str
+    column: Optional[str] = None
+    base: Optional[str] = None
+
+
+def escape_like(pattern: str) -> str:
+    """
+    escape_like
+
+    Escape the wildcards of a SQL LIKE pattern (and the escape character
+    itself), to match pattern literally with ESCAPE '\\'.
+    """
+    return pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class DefinitionIndex():
+    """
+    DefinitionIndex
+    ===============
+
+    parameters:
+        sessionmaker (Callable[[], sqlalchemy.orm.Session])
+
+    Local index of queryset definitions. Populate it with sync, and query it
+    with search. Searching does not require a connection to the queryset
+    store.
+    """
+    def __init__(self, sessionmaker: Callable[[], Session]):
+        self._Session = sessionmaker
+
+    @classmethod
+    def default(cls) -> "DefinitionIndex":
+        """
+        default
+
+        The index stored under the viewser configuration directory.
+        """
+        engine = sa.create_engine(f"sqlite:///{INDEX_DB_FILE}")
+        metadata.create_all(engine)
+        return cls(sessionmaker(engine))
+
+    def sync(self, operations: Any, max_workers: int = 8) -> SyncResult:
+        """
+        sync
+        ====
+
+        parameters:
+            operations (viewser.commands.queryset.operations.QuerysetOperations)
+            max_workers (int): Number of concurrent requests
+
+        returns:
+            SyncResult
+
+        Pull all queryset definitions from the queryset store concurrently and
+        update the index, rewriting only definitions whose fingerprints have
+        changed and removing querysets that are no longer in the store.
+        Querysets whose definitions could not be retrieved, because of an
+        error or because they were removed from the store after being
+        listed, are reported as failed, and keep their indexed definitions,
+        if any.
+        """
+
+        definitions, errors = operations.definitions_with_errors(operations.list(), max_workers = max_workers)
+
+        result = SyncResult(failed = list(errors.keys()))
+
+        with self._Session() as session:
+            indexed = {qs.name: qs.fingerprint for qs in session.query(IndexedQueryset).all()}
+
+            for name in sorted(indexed.keys() - definitions.keys() - errors.keys()):
+                self._remove(session, name)
+                result.removed.append(name)
+
+            for name, definition in definitions.items():
+                if definition is None:
+                    result.failed.append(name)
+                    continue
+
+                definition_fingerprint = fingerprint.definition_fingerprint(definition)
+
+                if indexed.get(name) == definition_fingerprint:
+                    result.unchanged += 1
+                    continue
+
+                if name in indexed:
+                    self._remove(session, name)
+                    result.updated.append(name)
+                else:
+                    result.added.append(name)
+
+                self._add(session, definition, definition_fingerprint)
+
+            session.commit()
+
+        return result
+
+    def search(self,
+            base: Optional[str] = None,
+            transform: Optional[str] = None,
+            theme: Optional[str] = None,
+            loa: Optional[str] = None) -> List[SearchResult]:
+        """
+        search
+        ======
+
+        parameters:
+            base (Optional[str]): Database column, as loa.column or just column
+            transform (Optional[str]): Transform name, e.g. temporal.tlag
+            theme (Optional[str]): Queryset theme
+            loa (Optional[str]): Queryset level of analysis
+
+        returns:
+            List[SearchResult]
+
+        Find querysets matching all given criteria. If base or transform is
+        given, one result is returned per matching column, otherwise one per
+        matching queryset.
+        """
+
+        with self._Session() as session:
+            by_column = base is not None or transform is not None
+
+            if by_column:
+                query = (session.query(IndexedQueryset.name, IndexedQueryset.loa, IndexedColumn.name, IndexedColumn.base)
+                    .join(IndexedColumn, IndexedColumn.queryset == IndexedQueryset.name))
+            else:
+                query = session.query(IndexedQueryset.name, IndexedQueryset.loa)
+
+            if base is not None:
+                if "." in base:
+                    query = query.filter(IndexedColumn.base == base)
+                else:
+                    query = query.filter(IndexedColumn.base.like(f"%.{escape_like(base)}", escape = "\\"))
+
+            if transform is not None:
+                query = query.filter(sa.exists().where(sa.and_(
+                    IndexedTransform.queryset == IndexedColumn.queryset,
+                    IndexedTransform.column == IndexedColumn.name,
+                    IndexedTransform.name == transform)))
+
+            if theme is not None:
+                query = query.filter(sa.exists().where(sa.and_(
+                    IndexedTheme.queryset == IndexedQueryset.name,
+                    IndexedTheme.theme == theme)))
+
+            if loa is not None:
+                query = query.filter(IndexedQueryset.loa == loa)
+
+            if by_column:
+                fields = ("queryset", "loa", "column", "base")
+                query = query.order_by(IndexedQueryset.name, IndexedColumn.name)
+            else:
+                fields = ("queryset", "loa")
+                query = query.order_by(IndexedQueryset.name)
+
+            return [SearchResult(**dict(zip(fields, row))) for row in query.all()]
+
+    def definition(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        definition
+        ==========
+
+        Returns the indexed json definition of the queryset name, if any.
+        """
+        with self._Session() as session:
+            indexed = session.get(IndexedQueryset, name)
+            return json.loads(indexed.definition) if indexed is not None else None
+
+    def _add(self, session: Session, definition: Dict[str, Any], definition_fingerprint: str) -> None:
+        definition = fingerprint.normalized_definition(definition)
+        name = definition["name"]
+
+        session.add(IndexedQueryset(
+            name = name,
+            loa = definition["loa"],
+            description = definition["description"],
+            fingerprint = definition_fingerprint,
+            definition = json.dumps(definition)))
+
+        for theme in dict.fromkeys(definition["themes"]):
+            session.add(IndexedTheme(queryset = name, theme = theme))
+
+        column_names = set()
+
+        for column in definition["operations"]:
+            rename, *transforms, database = column
+            column_name = rename["arguments"][0]
+
+            if column_name in column_names:
+                continue
+            column_names.add(column_name)
+
+            session.add(IndexedColumn(
+                queryset = name,
+                name = column_name,
+                base = database["name"],
+                aggregation = database["arguments"][0]))
+
+            for position, operation in enumerate(transforms[::-1]):
+                session.add(IndexedTransform(
+                    queryset = name,
+                    column = column_name,
+                    position = position,
+                    name = operation["name"],
+                    arguments = json.dumps(operation["arguments"])))
+
+        session.flush()
+
+    def _remove(self, session: Session, name: str) -> None:
+        for model in (IndexedTransform, IndexedColumn, IndexedTheme):
+            session.query(model).filter(model.queryset == name).delete()
+        session.query(IndexedQueryset).filter(IndexedQueryset.name == name).delete()
+        session.flush()
@@ -0,0 +1,211 @@
+"""
+drift_chunks
+============
+
+Out-of-core storage of the time x space x feature tensor examined by the
+drift detector, for data too large to hold in memory as a float64 tensor.
+
+The tensor is written to disk in blocks of features, each a memory-mapped
+array, and the checks stream through the blocks one at a time, so that the
+memory they use is bounded by the block size rather than the data size.
+
+"""
+from functools import cached_property
+from typing import Iterator, List, Optional, Tuple
+import shutil
+import tempfile
+import weakref
+import numpy as np
+import pandas as pd
+from . import config_drift as config
+from views_tensor_utilities import mappings
+from .drift_statistics import TensorStatistics, time_space_codes, numeric_columns, TIME_AXES, SPACE_AXES, FEATURE_AXES
+
+MASKS = ('valid_mask', 'nan_mask', 'zero_mask')
+
+
+class ChunkedTensor():
+    """
+    ChunkedTensor
+    =============
+
+    parameters:
+        blocks (List[numpy.memmap]): time x space x feature blocks of the tensor, in feature order
+        columns (List[List[str]]): names of the features of each block
+        index (pandas.MultiIndex): time x space index of the tensor
+        times (TimeUnits), spaces (SpaceUnits): index mappings of the time and space axes
+        directory (str): directory holding the blocks, removed when the tensor is closed
+
+    A time x space x feature tensor stored on disk in blocks of features.
+    """
+
+    def __init__(self, blocks: List[np.memmap], columns: List[List[str]], index: pd.MultiIndex, directory: str,
+                 times: Optional[mappings.TimeUnits] = None, spaces: Optional[mappings.SpaceUnits] = None):
+        self.blocks = blocks
+        self.columns = columns
+        self.index = index
+        self.directory = directory
+        self.times = times
+        self.spaces = spaces
+
+        self._finalizer = weakref.finalize(self, shutil.rmtree, directory, ignore_errors=True)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, chunk_size: int = 16, directory: Optional[str] = None,
+                       dtype: np.dtype = np.float64) -> "ChunkedTensor":
+        """
+        from_dataframe
+
+        Convert the numeric columns of df to memory-mapped tensor blocks of
+        float type dtype, of at most chunk_size features each, one block at a
+        time, with the layout of ViewsDataframe.to_numpy_time_space. The time
+        and space position of each row is computed once, by time_space_codes,
+        and shared by all blocks. The blocks are stored in a new
+        temporary directory, created in directory if given. Boolean columns
+        raise a RuntimeError, as for time_space_tensor.
+        """
+        features = numeric_columns(df)
+
+        directory = tempfile.mkdtemp(prefix="drift_", dir=directory)
+
+        itime, ispace, times, spaces = time_space_codes(df.index)
+        ntime, nspace = len(times.times), len(spaces.spaces)
+
+        blocks, columns = [], []
+
+        for start in range(0, len(features), chunk_size):
+            block_columns = features[start:start+chunk_size]
+            values = df[block_columns].to_numpy(dtype=dtype)
+
+            if np.any(values == config.default_dne):
+                raise RuntimeError(f'does-not-exist token {config.default_dne} found in input columns '
+                                   f'{block_columns}')
+
+            block = np.lib.format.open_memmap(f"{directory}/block_{len(blocks)}.npy", mode="w+",
+                                              dtype=dtype, shape=(ntime, nspace, len(block_columns)))
+            block[...] = config.default_dne
+            block[itime, ispace, :] = values
+            block.flush()
+
+            blocks.append(block)
+            columns.append(block_columns)
+
+            del values
+
+        return cls(blocks, columns, df.index, directory, times, spaces)
+
+    @property
+    def features(self) -> List[str]:
+        return [column for columns in self.columns for column in columns]
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        ntime, nspace, _ = self.blocks[0].shape
+        return ntime, nspace, sum(block.shape[2] for block in self.blocks)
+
+    def iter_blocks(self) -> Iterator[Tuple[np.memmap, List[str]]]:
+        return zip(self.blocks, self.columns)
+
+    def close(self) -> None:
+        """
+        close
+
+        Remove the blocks from disk.
+        """
+        self.blocks = []
+        self._finalizer()
+
+
+class ChunkedStatistics(TensorStatistics):
+
+    """
+    ChunkedStatistics
+
+    Stand-in for the TensorStatistics of a ChunkedTensor. Counts are accumulated over the blocks of the tensor, one
+    block at a time: counts over the time or space axes are summed over blocks, and counts over the feature axes
+    are concatenated. The partitions are assembled from all blocks, so a check using them holds the standard and
+    test partitions - but not the rest of the tensor - in memory.
+
+    """
+
+    def __init__(self, tensor):
+        super().__init__(None, tensor.index, tensor.features, tensor.times, tensor.spaces)
+        self.chunked_tensor = tensor
+        self.shape = tensor.shape
+
+    @cached_property
+    def block_counts(self):
+        counts = {(mask, axes): [] for mask in MASKS for axes in (TIME_AXES, SPACE_AXES, FEATURE_AXES)}
+
+        for block, columns in self.chunked_tensor.iter_blocks():
+            statistics = TensorStatistics(block, self.index, columns, self.times, self.spaces)
+
+            for mask, axes in counts:
+                counts[(mask, axes)].append(statistics.counts(mask, axes))
+
+        return counts
+
+    def counts(self, mask, axes):
+        key = (mask, axes)
+
+        with self._lock:
+            if key not in self._counts:
+                block_counts = self.block_counts[key]
+
+                if axes == FEATURE_AXES:
+                    self._counts[key] = np.concatenate(block_counts)
+                else:
+                    self._counts[key] = np.sum(block_counts, axis=0)
+
+            return self._counts[key]
+
+    @cached_property
+    def n_valid(self):
+        return int(self.counts('valid_mask', FEATURE_AXES).sum())
+
+    @cached_property
+    def n_nan(self):
+        return int(self.counts('nan_mask', FEATURE_AXES).sum())
+
+    @cached_property
+    def n_zero(self):
+        return int(self.counts('zero_mask', FEATURE_AXES).sum())
+
+    def sizes(self, axes):
+        return int(np.prod([self.shape[axis] for axis in axes]))
+
+    def partitions(self, test_partition_length, standard_partition_length):
+        key = (test_partition_length, standard_partition_length)
+
+        with self._lock:
+            if key not in self._partitions:
+                standard_partition, test_partition = self.partition_bounds(test_partition_length,
+                                                                           standard_partition_length)
+
+                self._partitions[key] = tuple(
+                    np.concatenate([block[start:end] for block in self.chunked_tensor.blocks], axis=2)
+                    for start, end in (standard_partition, test_partition))
+
+            return self._partitions[key]
+
+    def partition_counts(self, mask, axes, test_partition_length, standard_partition_length):
+        if axes != FEATURE_AXES:
+            raise RuntimeError(f'chunked tensor cannot count {mask} over axes {axes} by partition')
+
+        key = (mask, axes, test_partition_length, standard_partition_length)
+
+        with self._lock:
+            if key not in self._counts:
+                standard_counts, test_counts = [], []
+
+                for block, columns in self.chunked_tensor.iter_blocks():
+                    block_standard, block_test = TensorStatistics(block, self.index, columns, self.times,
+                                                                  self.spaces).partition_counts(
+                        mask, axes, test_partition_length, standard_partition_length)
+
+                    standard_counts.append(block_standard)
+                    test_counts.append(block_test)
+
+                self._counts[key] = (np.concatenate(standard_counts), np.concatenate(test_counts))
+
+            return self._counts[key]
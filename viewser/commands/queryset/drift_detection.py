@@ -1,23 +1,30 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
-from views_tensor_utilities import objects, mappings
+import pandas as pd
 from . import config_drift as config
-from . import integrity_checks as ic
+from . import integrity_checks as ic  # registers the built-in checks
 from . import self_test as st
+from . import fingerprint
+from .drift_statistics import TensorStatistics, time_space_tensor
+from .drift_state import DriftState, CumulativeState
+from .drift_chunks import ChunkedTensor, ChunkedStatistics
+from .drift_report import AlertReport, InputAlarm
+from .drift_registry import checks, InputResolver
+from .drift_profile import Profile, combine, profile_frame
 #import viewser.commands.queryset.models.self_test_data as std
-import datetime
 
+logger = logging.getLogger(__name__)
 
-class InputAlarm:
-    def __repr__(self):
-        return f"Input alarm: {self.message} Severity: {self.severity} Timestamp: {self.timestamp}\n"
+EXECUTORS = ('serial', 'threads', 'processes')
 
-    def __str__(self):
-        return f"Input alarm: {self.message} Severity: {self.severity} Timestamp: {self.timestamp}\n"
+# numeric precisions of the tensor examined by the checks
 
-    def __init__(self, message, severity=1):
-        self.message = message
-        self.severity = severity
-        self.timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+PRECISIONS = ('float64', 'float32')
 
 
 class Tester:
@@ -27,7 +34,11 @@ class Tester:
 
     Class that mediates between the InputGate class and the testing functions. Brings together the relevant
     test function, the partitions, the threshold, the message describing the test in the alarms, and the input data
-     - tensor, index, and feature names (required for useful reporting in the alarms)
+     - tensor, index, and feature names (required for useful reporting in the alarms) - together with the
+    TensorStatistics shared by all Testers working on the same tensor and any parameters specific to the test
+    function. The test function is looked up in the check registry, and is passed the shared inputs it declares,
+    resolved by the InputResolver of the tensor (or by one of its own if none is given). If profile is True,
+    evaluate records the wall time, CPU time and peak memory of the check in measurements
 
     """
 
@@ -39,6 +50,10 @@ class Tester:
                  data=None,
                  index=None,
                  features=None,
+                 statistics=None,
+                 parameters=None,
+                 resolver=None,
+                 profile=False,
                  ):
 
         self.test_function = test_function
@@ -49,28 +64,66 @@ class Tester:
         self.data = data
         self.index = index
         self.features = features
+        self.statistics = statistics
+        self.parameters = parameters if parameters is not None else {}
+        self.resolver = resolver
+        self.profile = profile
+        self.measurements = None
 
-    def generate_alarms(self):
+    def inputs(self, check):
+        if self.resolver is None:
+            if self.statistics is None:
+                self.statistics = TensorStatistics(self.data, self.index, self.features)
+
+            self.resolver = InputResolver(self.statistics)
+
+        return self.resolver.resolve(check, self.test_partition_length, self.standard_partition_length)
+
+    def evaluate(self):
 
         """
-        generate alarms
+        evaluate
 
         Calls the object's assigned testing function with a kwarg dict that the function picks and chooses from
         as needed.
         The function returns an array of results and a dictionary translating the indexes of the results in the
         array into units of analysis or features for reporting in the alarms.
 
+        Returns arrays of the offenders (results above the threshold) and of their severities, or None if the
+        results cannot be compared with the threshold.
+
+        """
+
+        with Profile(self.profile) as profile:
+            outcome = self._evaluate()
+
+        self.measurements = profile.measurements()
+
+        return outcome
+
+    def results(self):
+
         """
+        results
 
-#        print(self.test_function,self.test_partition_length,self.standard_partition_length,self.data.shape,
-#              self.features)
+        The array of results of the testing function, before comparison with the threshold, and its translation
+        dictionary
 
-        results, translation_dict = getattr(ic, self.test_function)(
-                                              tensor=self.data,
-                                              index=self.index,
-                                              features=self.features,
-                                              test_partition_length=self.test_partition_length,
-                                              standard_partition_length=self.standard_partition_length)
+        """
+
+        check = checks.get(self.test_function)
+
+        return check(tensor=self.data,
+                     index=self.index,
+                     features=self.features,
+                     test_partition_length=self.test_partition_length,
+                     standard_partition_length=self.standard_partition_length,
+                     inputs=self.inputs(check),
+                     statistics=self.statistics,
+                     **self.parameters)
+
+    def _evaluate(self):
+        results, translation_dict = self.results()
 
         results /= self.threshold
 
@@ -81,23 +134,118 @@ class Tester:
 
             return None
 
-        if len(offenders) > 0:
-            alarms = []
-            for offender, severity in zip(offenders, severities):
-                if translation_dict is not None:
-                    offender_id = translation_dict[offender]
-                else:
-                    offender_id = offender
+        if translation_dict is not None:
+            offenders = np.array([translation_dict[offender] for offender in offenders], dtype=object)
 
-                al = InputAlarm(
-                    f"{self.message}; offender: {offender_id}, "
-                    f"threshold: {self.threshold}",
-                    int(1+severity))
-                alarms.append(al)
+        return offenders, 1 + severities
 
-            return alarms
-        else:
-            return f"{self.message} passed"
+    def kwargs(self):
+        return dict(test_function=self.test_function, message=self.message, threshold=self.threshold)
+
+    def generate_alarms(self):
+
+        """
+        generate alarms
+
+        The result of evaluate as a list of InputAlarms, or a "passed" message if there are no offenders
+
+        """
+
+        return AlertReport.from_outcomes([self.kwargs()], [self.evaluate()])[0]
+
+
+def precision_dtype(precision):
+    if precision not in PRECISIONS:
+        raise RuntimeError(f'unknown drift-detection precision {precision}: must be one of {PRECISIONS}')
+
+    return np.dtype(precision)
+
+
+def _run_self_test(self_test_data, features, self_test_dict):
+
+    """
+    _run_self_test
+
+    Perturb the self-test tensor in place with the perturbation of the check described by self_test_dict, run the
+    check on it and restore the tensor. Returns None, logging the error, if the perturbation cannot be applied
+
+    """
+
+    try:
+        perturbation = checks.get(self_test_dict['test_function']).perturbation
+        if perturbation is None:
+            perturbation = getattr(st, 'perturb_'+self_test_dict['test_function'])
+        undo = perturbation(self_test_data, **self_test_dict)
+    except Exception:
+        logger.exception(f"Failed to perturb the self-test data for {self_test_dict.get('test_function')}")
+        return None
+
+    try:
+        return Tester(test_function=self_test_dict['test_function'],
+                      test_partition_length=self_test_dict['test_partition_length'],
+                      standard_partition_length=self_test_dict['standard_partition_length'],
+                      threshold=self_test_dict['threshold'],
+                      message=self_test_dict['message'],
+                      data=self_test_data,
+                      index=self_test_dict['index'],
+                      features=features,
+                      parameters=self_test_dict.get('parameters', {}),
+                      ).generate_alarms()
+    finally:
+        st.restore(undo)
+
+
+# outcomes of the self tests run in this process, keyed by self-test data, configuration and precision. Only the
+# SELF_TEST_OUTCOMES_SIZE most recently used outcomes are kept
+
+SELF_TEST_OUTCOMES_SIZE = 32
+
+_self_test_outcomes = OrderedDict()
+_self_test_lock = threading.Lock()
+
+
+# state of a worker process in a 'processes' pool: the tensor attached from shared memory, and the
+# TensorStatistics shared by all Testers the worker runs
+
+_worker_state = {}
+
+
+def _attach_shared_tensor(shm_name, shape, dtype, index, features):
+    """
+    _attach_shared_tensor
+
+    Initializer of the worker processes in a 'processes' pool. Attaches the tensor published by the InputGate in
+    shared memory, without copying it, and builds the worker's TensorStatistics
+
+    """
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    tensor = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    tensor.flags.writeable = False
+
+    _worker_state['shm'] = shm
+    _worker_state['tensor'] = tensor
+    _worker_state['index'] = index
+    _worker_state['features'] = features
+    _worker_state['statistics'] = TensorStatistics(tensor, index, features)
+    _worker_state['resolver'] = InputResolver(_worker_state['statistics'])
+
+
+def _generate_alarms_in_worker(tester_kwargs):
+
+    tester = Tester(data=_worker_state['tensor'],
+                    index=_worker_state['index'],
+                    features=_worker_state['features'],
+                    statistics=_worker_state['statistics'],
+                    resolver=_worker_state['resolver'],
+                    **tester_kwargs)
+
+    outcome = tester.evaluate()
+
+    if tester.profile:
+        return outcome, tester.measurements
+
+    return outcome
 
 
 class InputGate:
@@ -108,30 +256,80 @@ class InputGate:
     Class which superintends the input warning machinery. Accepts a dataframe containing the data to be examined
     and a configuration dictionary which users can use to override the default settings in config_drift.
 
-    The df is converted to a tensor container and non-numeric parts of the data are stripped out.
+    The numeric columns of the df are scattered into a time x space x feature tensor by time_space_tensor, and
+    non-numeric parts of the data are stripped out. The masks, counts and partitions needed by the checks are
+    computed once, in a TensorStatistics object shared by all Testers, which reuses the index mappings built
+    during the conversion.
+
+    The checks are independent of one another, and can be run concurrently by passing executor:
+
+    - 'serial' (default): one after the other, in the calling thread
+    - 'threads': in a pool of threads sharing the tensor and its TensorStatistics. The heavy checks spend most
+      of their time in numpy and scipy, which release the GIL
+    - 'processes': in a pool of processes, which attach the tensor from shared memory rather than receiving a
+      copy of it. Each process builds its own TensorStatistics
+
+    max_workers sets the size of the pool (default: one worker per check, up to the number of CPUs). Alerts are
+    returned in the order of the checks in the configuration dictionary, whichever executor is used.
+
+    precision sets the float type of the tensor (and of the self-test tensor): 'float64' (default) or 'float32',
+    which halves its memory and that of the float temporaries made by the checks. The checks accumulate
+    means, variances and KS statistics in float64 whatever the precision, but float32 data only carries about 7
+    significant digits, and values beyond 3.4e38 become infinite.
+
+    If profile is True, the wall time, CPU time and peak additional memory of the self test, of the conversion to
+    a tensor, of the computation of the inputs shared by the checks and of each check are measured (see
+    drift_profile), and returned as the profile of the AlertReport.
 
     """
 
-    def __init__(self, df, drift_config_dict=None, self_test=False, self_test_data=None):
+    def __init__(self, df, drift_config_dict=None, self_test=False, self_test_data=None, executor='serial',
+                 max_workers=None, precision='float64', profile=False):
+
+        if executor not in EXECUTORS:
+            raise RuntimeError(f'unknown drift-detection executor {executor}: must be one of {EXECUTORS}')
+
+        self._init_gate(drift_config_dict, self_test, self_test_data, precision, profile, executor, max_workers)
+
+        with Profile(profile) as stage:
+            self.tensor, self.columns, times, spaces = time_space_tensor(df, self.dtype)
+
+        self.stage_profiles['conversion'] = stage.measurements()
+        self.index = df.index
+
+        self.statistics = TensorStatistics(self.tensor, self.index, self.columns, times, spaces)
+
+    def _init_gate(self, drift_config_dict, self_test, self_test_data, precision, profile, executor='serial',
+                   max_workers=None):
+
+        """
+        _init_gate
+
+        Initialisation shared by all gates, before the data is converted: store the configuration and the settings
+        of the run, and run the self test if requested
+
+        """
+
         self.config_dict = drift_config_dict
         self.default_config_dict = config.default_config_dict
+        self.executor = executor
+        self.max_workers = max_workers
+        self.dtype = precision_dtype(precision)
+        self.profile = profile
+        self.stage_profiles = {}
+        self.check_profiles = []
+        self.testers = []
 
         if self_test:
-            self.__self_test(self_test_data)
-
-        self.tensor_container = (objects.ViewsDataframe(df, split_strategy='float_string', cast_strategy='to_64').
-                                 to_numpy_time_space())
-        self.numeric_part = self.tensor_container.get_numeric_views_tensors()[0]
-        self.tensor = self.numeric_part.tensor
-        self.index = self.tensor_container.index
-        self.columns = self.numeric_part.columns
+            with Profile(profile) as stage:
+                self._self_test(self_test_data)
 
-        self.testers = []
+            self.stage_profiles['self_test'] = stage.measurements()
 
-    def __self_test(self, self_test_data):
+    def _self_test(self, self_test_data):
 
         """
-        ___self_test
+        _self_test
 
         Method driving the self-test machinery for the drift detection system
 
@@ -141,23 +339,58 @@ class InputGate:
         By design, all integrity checks should be failed. If this is not the case, it implies a problem with one
         or more of the integrity-checking routines, or with the input data, which must be investigated.
 
+        The outcome is cached in the process, keyed by the fingerprints of the self-test data and of the drift
+        configuration and by the precision, so that repeated validated fetches run the self test once. Only the
+        SELF_TEST_OUTCOMES_SIZE most recently used outcomes are kept.
+
         """
 
-        self_test_container = (objects.ViewsDataframe(self_test_data,
-                                                      split_strategy='float_string',
-                                                      cast_strategy='to_64').to_numpy_time_space())
+        key = (fingerprint.dataframe_fingerprint(self_test_data),
+               fingerprint.drift_config_fingerprint(self.config_dict),
+               self.dtype.name)
 
-        self_test_index = self_test_container.index
-        self_test_features = self_test_container.get_numeric_views_tensors()[0].columns
+        with _self_test_lock:
+            failures = _self_test_outcomes.get(key)
+            if failures is not None:
+                _self_test_outcomes.move_to_end(key)
 
-        self_test_data = self_test_container.get_numeric_numpy_tensors()[0]
+        if failures is None:
+            failures = self._run_self_tests(self_test_data)
 
-        testers = []
+            with _self_test_lock:
+                _self_test_outcomes[key] = failures
+                _self_test_outcomes.move_to_end(key)
+                while len(_self_test_outcomes) > SELF_TEST_OUTCOMES_SIZE:
+                    _self_test_outcomes.popitem(last=False)
+
+        if len(failures) > 0:
+            raise RuntimeError(f'drift-detection self test failed: {failures}')
+        else:
+            print(f'Drift-detection self test passed')
+
+    def _run_self_tests(self, self_test_data):
+
+        """
+        _run_self_tests
+
+        Run the perturbation and check of every configured integrity check on the self-test data, and return the
+        messages of the checks which passed (i.e. failed to detect their perturbation).
+
+        With the 'serial' executor, the checks run one after the other, each perturbing the self-test tensor in
+        place and restoring it. Otherwise they run on a pool of threads, each of which perturbs its own copy of the
+        tensor.
+
+        """
+
+        self_test_index = self_test_data.index
+        self_test_data, self_test_features, _, _ = time_space_tensor(self_test_data, self.dtype)
+
+        self_test_dicts = []
 
         for key in self.config_dict.keys():
             try:
 
-                self_test_dict = self.default_config_dict[key]
+                self_test_dict = dict(self.default_config_dict[key])
 
                 self_test_dict['index'] = self_test_index
 
@@ -165,43 +398,67 @@ class InputGate:
 
                 self_test_dict['standard_partition_length'] = self.config_dict['standard_partition_length']
 
-                perturbed_self_test_data = getattr(st, 'perturb_'+self_test_dict['test_function'])(self_test_data,
-                                                                                                   **self_test_dict)
-
-                testers.append(Tester(test_function=self_test_dict['test_function'],
-                                      test_partition_length=self.config_dict['test_partition_length'],
-                                      standard_partition_length=self.config_dict['standard_partition_length'],
-                                      threshold=self_test_dict['threshold'],
-                                      message=self_test_dict['message'],
-                                      data=perturbed_self_test_data,
-                                      index=self_test_index,
-                                      features=self_test_features,
-                                      ))
+                self_test_dicts.append(self_test_dict)
 
             except:
                 pass
 
-        alerts = [tester.generate_alarms() for tester in testers]
+        if self.executor == 'serial':
+            alerts = [_run_self_test(self_test_data, self_test_features, self_test_dict)
+                      for self_test_dict in self_test_dicts]
+        else:
+            thread_data = threading.local()
+
+            def run_on_thread_copy(self_test_dict):
+                if not hasattr(thread_data, 'tensor'):
+                    thread_data.tensor = self_test_data.copy()
+
+                return _run_self_test(thread_data.tensor, self_test_features, self_test_dict)
+
+            with ThreadPoolExecutor(max_workers=self._pool_size(len(self_test_dicts))) as pool:
+                alerts = list(pool.map(run_on_thread_copy, self_test_dicts))
 
         failures = []
         for alert in alerts:
             if 'passed' in str(alert):
                 failures.append(str(alert))
 
-        if len(failures) > 0:
-            raise RuntimeError(f'drift-detection self test failed: {failures}')
-        else:
-            print(f'Drift-detection self test passed')
+        return failures
 
     def assemble_alerts(self):
         """
         assemble_alerts
 
         Method which compares the default configuration dictionary with that supplied when the InputGate object is
-        instantiated, removes test functions that are not required and updates thresholds of those requested.
+        instantiated, removes test functions that are not required and updates thresholds and parameters of those
+        requested. Parameters supplied for a test function are merged into its default parameters, e.g.
+
+            {'ks_drift': {'threshold': 100., 'parameters': {'max_samples': 100000}}}
 
         The resulting configuration dictionary is then used to generate a list of Tester objects, whose
-        generate_alarm methods are then called in sequence.
+        evaluate methods are then called using the InputGate's executor.
+
+        Returns an AlertReport of the outcomes, which can also be used as the list of per-check alarms returned
+        by earlier versions, and holds the profile of the gate if it was profiled.
+
+        """
+
+        testers = self._tester_kwargs()
+
+        report = AlertReport.from_outcomes(testers, self._generate_alarms(testers))
+
+        if self.profile:
+            report.profile = profile_frame(self.stage_profiles, testers, self.check_profiles)
+
+        return report
+
+    def _tester_kwargs(self):
+
+        """
+        _tester_kwargs
+
+        Merge the configuration dictionary supplied with the defaults, and return the kwarg dicts of the Testers
+        of the checks it requests
 
         """
 
@@ -212,8 +469,10 @@ class InputGate:
             for key in self.default_config_dict.keys():
                 if key in self.config_dict.keys():
                     try:
-                        detector_dict = self.default_config_dict[key]
+                        detector_dict = dict(self.default_config_dict[key])
                         detector_dict['threshold'] = self.config_dict[key]['threshold']
+                        detector_dict['parameters'] = {**detector_dict.get('parameters', {}),
+                                                       **self.config_dict[key].get('parameters', {})}
                         self.config_dict[key] = detector_dict
                     except:
                         pass
@@ -227,16 +486,442 @@ class InputGate:
         for key in self.config_dict.keys():
             try:
                 tester_dict = self.config_dict[key]
-                testers.append(Tester(test_function=tester_dict['test_function'],
-                                      test_partition_length=self.config_dict['test_partition_length'],
-                                      standard_partition_length=self.config_dict['standard_partition_length'],
-                                      threshold=tester_dict['threshold'],
-                                      message=tester_dict['message'],
-                                      data=self.tensor,
-                                      index=self.index,
-                                      features=self.columns,
-                                      ))
+                testers.append(dict(test_function=tester_dict['test_function'],
+                                    test_partition_length=self.config_dict['test_partition_length'],
+                                    standard_partition_length=self.config_dict['standard_partition_length'],
+                                    threshold=tester_dict['threshold'],
+                                    message=tester_dict['message'],
+                                    parameters=tester_dict.get('parameters', {}),
+                                    ))
             except:
                 pass
 
-        return [tester.generate_alarms() for tester in testers]
+        return testers
+
+    def _generate_alarms(self, testers):
+
+        """
+        _generate_alarms
+
+        Run the Testers described by the kwarg dicts testers with the InputGate's executor, and return their
+        outcomes. The inputs declared by the checks are computed first, each once, so that checks sharing an input
+        neither repeat its computation nor wait on each other for it. The measurements of profiled Testers are
+        kept in check_profiles
+
+        """
+
+        if self.executor == 'processes':
+            return self._generate_alarms_in_processes(testers)
+
+        resolver = InputResolver(self.statistics)
+
+        testers = [Tester(data=self.tensor, index=self.index, features=self.columns, statistics=self.statistics,
+                          resolver=resolver, profile=self.profile, **tester_kwargs) for tester_kwargs in testers]
+
+        # an input which cannot be computed fails the checks declaring it when they run
+
+        with Profile(self.profile) as stage:
+            for tester in testers:
+                try:
+                    tester.inputs(checks.get(tester.test_function)).compute()
+                except:
+                    pass
+
+        self.stage_profiles['shared_inputs'] = stage.measurements()
+
+        if self.executor == 'threads':
+            with ThreadPoolExecutor(max_workers=self._pool_size(len(testers))) as pool:
+                outcomes = list(pool.map(Tester.evaluate, testers))
+        else:
+            outcomes = [tester.evaluate() for tester in testers]
+
+        self.check_profiles = [tester.measurements for tester in testers]
+
+        return outcomes
+
+    def sweep(self, thresholds=None, test_partition_lengths=None, standard_partition_lengths=None):
+
+        """
+        sweep
+
+        Evaluate the configured checks under every combination of partition lengths from test_partition_lengths
+        and standard_partition_lengths (default: the configured lengths) and of thresholds from the grids in
+        thresholds, a dictionary of iterables of thresholds keyed by test function (default: the configured
+        threshold), e.g.
+
+            gate.sweep({'ks_drift': [10., 100., 1000.]}, standard_partition_lengths=[12, 24, 48])
+
+        The results of each check are computed once per partitioning, sharing the statistics of the gate, and
+        compared with all its thresholds at once.
+
+        Returns a dataframe with one row per check, partitioning and threshold, and columns test_function, message,
+        test_partition_length, standard_partition_length, threshold, status ('passed', 'failed', 'error' if the
+        check cannot be evaluated, e.g. with partitions longer than the data, or 'unavailable'), alarms (the number
+        of alarms the check raises) and max_severity (the largest severity of its alarms, 0 if none), as
+        assemble_alerts would report them.
+
+        """
+
+        testers = self._tester_kwargs()
+        thresholds = thresholds if thresholds is not None else {}
+
+        if test_partition_lengths is None:
+            test_partition_lengths = [self.config_dict['test_partition_length']]
+
+        if standard_partition_lengths is None:
+            standard_partition_lengths = [self.config_dict['standard_partition_length']]
+
+        resolver = InputResolver(self.statistics)
+
+        frames = []
+        for test_partition_length in test_partition_lengths:
+            for standard_partition_length in standard_partition_lengths:
+                for tester_kwargs in testers:
+                    tester_kwargs = dict(tester_kwargs, test_partition_length=test_partition_length,
+                                         standard_partition_length=standard_partition_length)
+
+                    grid = np.asarray(list(thresholds.get(tester_kwargs['test_function'],
+                                                          [tester_kwargs['threshold']])), dtype=np.float64)
+
+                    frame = pd.DataFrame({'test_function': tester_kwargs['test_function'],
+                                          'message': tester_kwargs['message'],
+                                          'test_partition_length': test_partition_length,
+                                          'standard_partition_length': standard_partition_length,
+                                          'threshold': grid})
+
+                    frame['status'], frame['alarms'], frame['max_severity'] = self._sweep_check(tester_kwargs,
+                                                                                                grid, resolver)
+                    frames.append(frame)
+
+        columns = ['test_function', 'message', 'test_partition_length', 'standard_partition_length', 'threshold',
+                   'status', 'alarms', 'max_severity']
+
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    def _sweep_check(self, tester_kwargs, grid, resolver):
+
+        """
+        _sweep_check
+
+        Status, number of alarms and largest severity of the check described by tester_kwargs for every threshold
+        of grid, from a single computation of its results
+
+        """
+
+        try:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                results = self._check_results(tester_kwargs, resolver)
+        except:
+            return 'error', 0, 0.
+
+        if isinstance(results, str):
+            return 'unavailable', 0, 0.
+
+        try:
+            ratios = np.atleast_1d(np.asarray(results, dtype=np.float64))[:, np.newaxis]/grid[np.newaxis, :]
+        except:
+            return 'error', 0, 0.
+
+        exceeds = ratios > 1
+
+        alarms = np.count_nonzero(exceeds, axis=0)
+        max_severity = np.where(alarms > 0, 1 + np.max(np.where(exceeds, ratios, 0.), axis=0, initial=0.), 0.)
+
+        return np.where(alarms > 0, 'failed', 'passed'), alarms, max_severity
+
+    def _check_results(self, tester_kwargs, resolver):
+        return Tester(data=self.tensor, index=self.index, features=self.columns, statistics=self.statistics,
+                      resolver=resolver, **tester_kwargs).results()[0]
+
+    def _pool_size(self, n_testers):
+        if self.max_workers is not None:
+            return self.max_workers
+
+        return max(1, min(n_testers, os.cpu_count() or 1))
+
+    def _generate_alarms_in_processes(self, testers):
+
+        """
+        _generate_alarms_in_processes
+
+        Publish the tensor in shared memory and run the Testers described by the kwarg dicts testers in a pool of
+        worker processes attached to it. The shared memory is released once all Testers have completed.
+
+        """
+
+        tensor = np.ascontiguousarray(self.tensor)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(tensor.nbytes, 1))
+
+        try:
+            np.ndarray(tensor.shape, dtype=tensor.dtype, buffer=shm.buf)[...] = tensor
+
+            with ProcessPoolExecutor(max_workers=self._pool_size(len(testers)),
+                                     initializer=_attach_shared_tensor,
+                                     initargs=(shm.name, tensor.shape, tensor.dtype, self.index,
+                                               self.columns)) as pool:
+                outcomes = list(pool.map(_generate_alarms_in_worker,
+                                         [dict(tester_kwargs, profile=self.profile) for tester_kwargs in testers]))
+        finally:
+            shm.close()
+            shm.unlink()
+
+        if self.profile:
+            outcomes, self.check_profiles = map(list, zip(*outcomes)) if outcomes else ([], [])
+
+        return outcomes
+
+
+class IncrementalInputGate(InputGate):
+
+    """
+    IncrementalInputGate
+
+    InputGate which runs the checks on a DriftState persisted per queryset fingerprint rather than on the full
+    data. Only the months of df which are not yet in the state, and the latest month of df, which may have been
+    revised since the last run, are summarised and merged into it, and the state is saved for the next run. If the
+    numeric features of df differ from those of the stored state, the state is rebuilt from the whole of df.
+
+    Checks which need the data of the standard partition itself (ecod_drift) cannot be run on a drift state, and
+    are reported as not available. The KS drift check is approximated from the histogram sketches of the state.
+
+    If profile is True, the update of the drift state is profiled as the conversion.
+
+    """
+
+    STATE_UNAVAILABLE = ('ecod_drift',)
+
+    def __init__(self, df, fingerprint, drift_config_dict=None, self_test=False, self_test_data=None,
+                 state_directory=None, profile=False):
+
+        self._init_gate(drift_config_dict, self_test, self_test_data, 'float64', profile)
+
+        months = df.index.get_level_values(0)
+
+        with Profile(profile) as stage:
+            self.state = DriftState.load(fingerprint, state_directory)
+
+            if not self.state.update(df[~months.isin(self.state.months) | (months == months.max())]):
+                self.state = DriftState()
+                self.state.update(df)
+
+            self.state.save(fingerprint, state_directory)
+
+        self.stage_profiles['conversion'] = stage.measurements()
+
+        self.tensor = None
+        self.index = None
+        self.columns = self.state.features
+        self.statistics = self.state.statistics(months.unique())
+
+    def _check_results(self, tester_kwargs, resolver):
+        if tester_kwargs['test_function'] in self.STATE_UNAVAILABLE:
+            return f"{tester_kwargs['message']} not available from drift state"
+
+        return super()._check_results(tester_kwargs, resolver)
+
+    def _generate_alarms(self, testers):
+        alerts = []
+        self.check_profiles = []
+
+        for tester_kwargs in testers:
+            if tester_kwargs['test_function'] in self.STATE_UNAVAILABLE:
+                alerts.append(f"{tester_kwargs['message']} not available from drift state")
+                self.check_profiles.append(None)
+            else:
+                tester = Tester(data=self.tensor, index=self.index, features=self.columns,
+                                statistics=self.statistics, profile=self.profile, **tester_kwargs)
+                alerts.append(tester.evaluate())
+                self.check_profiles.append(tester.measurements)
+
+        return alerts
+
+
+class ChunkedInputGate(InputGate):
+
+    """
+    ChunkedInputGate
+
+    InputGate for data too large to be held in memory as a single float64 tensor. The numeric columns of df are
+    converted to a ChunkedTensor - blocks of at most chunk_size features, memory-mapped from files in a temporary
+    directory (created in directory if given) - one block at a time.
+
+    Checks which report one result per feature (FEATURE_CHECKS) are run on each block in turn, with a
+    TensorStatistics of that block alone, and their alarms concatenated. The remaining checks are run once, on a
+    ChunkedStatistics whose counts are accumulated block by block. Memory is then bounded by the size of a block,
+    except for ecod_drift, which scores rows over all features and so holds the standard and test partitions in
+    memory; its max_samples parameter bounds this further.
+
+    The files are removed by close(), or when the gate is garbage-collected. precision and profile are as for
+    InputGate; the profile of a check run block by block sums its times over the blocks, and reports the peak
+    memory of its largest block.
+
+    """
+
+    FEATURE_CHECKS = ('feature_nan_fracs', 'feature_zero_fracs', 'delta_completeness', 'delta_zeroes',
+                      'extreme_values', 'ks_drift')
+
+    def __init__(self, df, drift_config_dict=None, self_test=False, self_test_data=None, chunk_size=16,
+                 directory=None, precision='float64', profile=False):
+
+        self._init_gate(drift_config_dict, self_test, self_test_data, precision, profile)
+
+        with Profile(profile) as stage:
+            self.tensor = ChunkedTensor.from_dataframe(df, chunk_size, directory, dtype=self.dtype)
+
+        self.stage_profiles['conversion'] = stage.measurements()
+        self.index = self.tensor.index
+        self.columns = self.tensor.features
+
+        self.statistics = ChunkedStatistics(self.tensor)
+
+    def close(self):
+        self.tensor.close()
+
+    def _generate_alarms(self, testers):
+        block_testers = [tester_kwargs for tester_kwargs in testers
+                         if tester_kwargs['test_function'] in self.FEATURE_CHECKS]
+
+        block_alerts = [[] for _ in block_testers]
+        block_profiles = [[] for _ in block_testers]
+
+        for block, columns in self.tensor.iter_blocks():
+            statistics = TensorStatistics(block, self.index, columns, self.tensor.times, self.tensor.spaces)
+
+            for alerts, profiles, tester_kwargs in zip(block_alerts, block_profiles, block_testers):
+                tester = Tester(data=block, index=self.index, features=columns, statistics=statistics,
+                                profile=self.profile, **tester_kwargs)
+                alerts.append(tester.evaluate())
+                profiles.append(tester.measurements)
+
+            del statistics
+
+        block_alerts = iter(block_alerts)
+        block_profiles = iter(block_profiles)
+
+        alerts = []
+        self.check_profiles = []
+        for tester_kwargs in testers:
+            if tester_kwargs['test_function'] in self.FEATURE_CHECKS:
+                alerts.append(self._combine_block_outcomes(next(block_alerts)))
+                self.check_profiles.append(combine(next(block_profiles)))
+            else:
+                tester = Tester(data=None, index=self.index, features=self.columns, statistics=self.statistics,
+                                profile=self.profile, **tester_kwargs)
+                alerts.append(tester.evaluate())
+                self.check_profiles.append(tester.measurements)
+
+        return alerts
+
+    def _check_results(self, tester_kwargs, resolver):
+        if tester_kwargs['test_function'] not in self.FEATURE_CHECKS:
+            return Tester(data=None, index=self.index, features=self.columns, statistics=self.statistics,
+                          resolver=resolver, **tester_kwargs).results()[0]
+
+        results = []
+
+        for block, columns in self.tensor.iter_blocks():
+            statistics = TensorStatistics(block, self.index, columns, self.tensor.times, self.tensor.spaces)
+            results.append(Tester(data=block, index=self.index, features=columns, statistics=statistics,
+                                  **tester_kwargs).results()[0])
+
+        return np.concatenate(results)
+
+    @staticmethod
+    def _combine_block_outcomes(outcomes):
+
+        """
+        _combine_block_outcomes
+
+        Combine the outcomes of one check over the blocks of the tensor: the offenders and severities of every
+        block, in feature order, or None if the check could not be evaluated on some block
+
+        """
+
+        if any(outcome is None for outcome in outcomes):
+            return None
+
+        return (np.concatenate([offenders for offenders, _ in outcomes]),
+                np.concatenate([severities for _, severities in outcomes]))
+
+
+class BacktestInputGate(IncrementalInputGate):
+
+    """
+    BacktestInputGate
+
+    InputGate which runs the checks as if every month of df had in turn been the newest, to calibrate thresholds
+    on the history of a queryset. df is summarised once, month by month, into a DriftState, and the statistics of
+    each month's run - over the months up to it - are read from the prefix sums of the summaries along the time
+    axis (CumulativeState), so that the cost of each run does not grow with the length of the history, rather than
+    by running an InputGate on a slice of df per month.
+
+    The checks are computed as by an IncrementalInputGate: ecod_drift is not available, and the KS drift check is
+    approximated from histogram sketches. assemble_alerts runs the checks once, with df's newest month as the
+    newest.
+
+    """
+
+    def __init__(self, df, drift_config_dict=None, profile=False):
+
+        self._init_gate(drift_config_dict, False, None, 'float64', profile)
+
+        with Profile(profile) as stage:
+            self.state = DriftState()
+            self.state.update(df)
+
+            self.cumulative = CumulativeState(self.state)
+
+        self.stage_profiles['conversion'] = stage.measurements()
+
+        self.time_name = df.index.names[0]
+
+        self.tensor = None
+        self.index = None
+        self.columns = self.state.features
+        self.statistics = self.cumulative.window(0, len(self.state.months))
+
+    def backtest(self, start=None, end=None):
+
+        """
+        backtest
+
+        Run the checks once for every month from start to end (inclusive, default: all months of df) as the
+        newest month, on the data of all months up to it.
+
+        Returns a dataframe indexed by newest month with one column per check (named after its test function),
+        holding the check's score: the largest of its results, which exceeds the check's threshold exactly when
+        the check raises alarms. Scores are NaN for checks which cannot be evaluated, e.g. because the history up
+        to the month is shorter than the standard and test partitions.
+
+        """
+
+        testers = self._tester_kwargs()
+        months = self.state.months
+
+        newest = np.flatnonzero((months >= (start if start is not None else months[0])) &
+                                (months <= (end if end is not None else months[-1])))
+
+        scores = np.full((len(newest), len(testers)), np.nan)
+
+        for irow, imonth in enumerate(newest):
+            statistics = self.cumulative.window(0, imonth + 1)
+
+            for icolumn, tester_kwargs in enumerate(testers):
+                if tester_kwargs['test_function'] in self.STATE_UNAVAILABLE:
+                    continue
+
+                try:
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        results, _ = Tester(features=self.columns, statistics=statistics, **tester_kwargs).results()
+                except Exception:
+                    continue
+
+                results = np.atleast_1d(np.asarray(results, dtype=np.float64))
+                results = results[~np.isnan(results)]
+
+                if len(results) > 0:
+                    scores[irow, icolumn] = results.max()
+
+        return pd.DataFrame(scores, index=pd.Index(months[newest], name=self.time_name),
+                            columns=[tester_kwargs['test_function'] for tester_kwargs in testers])
@@ -0,0 +1,207 @@
+"""
+drift_ks
+========
+
+Two-sample Kolmogorov-Smirnoff tests of every feature of a pair of
+(samples x features) panels at once, exactly or on deterministic subsamples,
+and their approximation from histogram sketches of the values > 0, as used by
+the KS drift check on tensors and on drift states.
+
+"""
+import logging
+import numpy as np
+import scipy
+
+logger = logging.getLogger(__name__)
+
+# largest sample size for which ks_2samp computes exact p-values, as in scipy's default (auto) method
+
+KS_EXACT_MAX_N = 10000
+
+# number of panel entries sorted together by ks_statistics, bounding its working memory to ~40 bytes per entry
+
+KS_BLOCK_SIZE = 2**21
+
+# sort key of the entries ignored by ks_statistics, which sorts after the key of any value
+
+KS_IGNORED = np.iinfo(np.uint64).max
+
+# largest deviation, with probability 95%, of the KS statistic of subsampled panels from that of the full panels
+# above which ks_pvalues warns that too few values > 0 were kept by subsampling
+
+KS_SUBSAMPLE_TOLERANCE = 0.05
+
+
+def subsample_rows(panel, max_samples, seed=0):
+    """
+    subsample_rows
+
+    Deterministically draw at most max_samples rows of a (samples x features) panel, without replacement, using
+    a generator seeded with seed. The rows keep their original order.
+
+    """
+
+    if max_samples is None or panel.shape[0] <= max_samples:
+        return panel
+
+    rows = np.random.default_rng(seed).choice(panel.shape[0], size=max_samples, replace=False)
+
+    return panel[np.sort(rows)]
+
+
+def ks_statistics(standard_panel, test_panel):
+    """
+    ks_statistics
+
+    Compute the two-sample Kolmogorov-Smirnoff statistic of every feature (column) of a pair of (samples x
+    features) panels, considering only entries > 0.
+
+    The entries of each block of features are sorted once, as a whole. Since the bit patterns of positive floats
+    sort in the same order as their values, the partition an entry comes from is stored in the lowest bit of its
+    sort key, and the number of standard entries at or below every position is obtained with a single cumulative
+    sum. The difference between the two empirical CDFs is only evaluated at the last of each run of tied values,
+    so ties are handled as in scipy.stats.ks_2samp, whose statistics are reproduced exactly.
+
+    Features with no values > 0 in either panel get a statistic of nan.
+
+    """
+
+    nfeatures = standard_panel.shape[1]
+    nstandard = standard_panel.shape[0]
+    nsamples = nstandard + test_panel.shape[0]
+
+    block = max(1, KS_BLOCK_SIZE//max(1, nsamples))
+    positions = np.arange(1, nsamples+1)
+
+    ks = np.empty(nfeatures)
+
+    for start in range(0, nfeatures, block):
+        combined = np.ascontiguousarray(np.concatenate([standard_panel[:, start:start+block],
+                                                        test_panel[:, start:start+block]]).T, dtype=np.float64)
+
+        valid = combined > 0
+
+        keys = np.where(valid, combined, 0.).view(np.uint64) << np.uint64(1)
+        keys[:, nstandard:] |= np.uint64(1)
+        keys[~valid] = KS_IGNORED
+        keys.sort(axis=1)
+
+        standard_n = np.count_nonzero(valid[:, :nstandard], axis=1)[:, np.newaxis]
+        test_n = np.count_nonzero(valid[:, nstandard:], axis=1)[:, np.newaxis]
+
+        standard_counts = np.cumsum((keys & np.uint64(1)) == 0, axis=1)
+
+        last_of_run = keys != KS_IGNORED
+        keys >>= np.uint64(1)
+        last_of_run[:, :-1] &= keys[:, :-1] != keys[:, 1:]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cdf_diffs = np.abs(standard_counts/standard_n - (positions - standard_counts)/test_n)
+
+        ks[start:start+block] = np.where(last_of_run, cdf_diffs, 0.).max(axis=1, initial=0.)
+
+        ks[start:start+block][(standard_n[:, 0] == 0) | (test_n[:, 0] == 0)] = np.nan
+
+    return ks
+
+
+def ks_pvalues(standard_panel, test_panel, max_samples=None, seed=0):
+    """
+    ks_pvalues
+
+    Compute the two-sided, two-sample Kolmogorov-Smirnoff p-value of every feature (column) of a pair of
+    (samples x features) panels, considering only entries > 0, with the same method selection as
+    scipy.stats.ks_2samp: exact p-values if neither sample of a feature has more than KS_EXACT_MAX_N values,
+    asymptotic ones otherwise.
+
+    Asymptotic p-values are computed from the batched statistics of ks_statistics, for all such features at
+    once. Exact p-values are computed by scipy, one feature at a time.
+
+    If max_samples is given, each panel is first reduced to at most max_samples rows drawn at random, with fixed
+    seeds, so that results are reproducible. The values > 0 of a feature kept in a subsampled panel are then a
+    uniform sample of its values > 0 in the full panel, and by the Dvoretzky-Kiefer-Wolfowitz inequality the
+    empirical distribution of k such values differs from that of the full panel by more than eps with probability
+    at most 2*exp(-2*k*eps**2). The KS statistic of the subsamples thus differs from that of the full panels by more
+    than eps_standard + eps_test with probability at most the sum of these bounds, where k is the number of values
+    > 0 kept, not max_samples: for k=100000 in both panels, by more than 0.01 with probability < 5%, but sparse
+    features keep far fewer values. A warning is logged if, for any feature, the deviation that is exceeded with
+    probability 5% is larger than KS_SUBSAMPLE_TOLERANCE. p-values are those of the test on the subsamples.
+
+    Features with no values > 0 in either panel get a p-value of nan.
+
+    """
+
+    standard_subsampled = max_samples is not None and standard_panel.shape[0] > max_samples
+    test_subsampled = max_samples is not None and test_panel.shape[0] > max_samples
+
+    standard_panel = subsample_rows(standard_panel, max_samples, seed)
+    test_panel = subsample_rows(test_panel, max_samples, seed+1)
+
+    standard_n = np.count_nonzero(standard_panel > 0, axis=0)
+    test_n = np.count_nonzero(test_panel > 0, axis=0)
+
+    if standard_subsampled or test_subsampled:
+        # DKW deviation exceeded with probability 2.5% by each subsampled panel, 5% by the statistic
+        with np.errstate(divide='ignore'):
+            deviation = (standard_subsampled*np.sqrt(np.log(80)/(2*standard_n)) +
+                         test_subsampled*np.sqrt(np.log(80)/(2*test_n)))
+
+        inaccurate = (standard_n > 0) & (test_n > 0) & (deviation > KS_SUBSAMPLE_TOLERANCE)
+
+        if inaccurate.any():
+            logger.warning(f'Subsampling to {max_samples} rows kept too few values > 0 of {inaccurate.sum()} '
+                           f'features for their KS statistics to be within {KS_SUBSAMPLE_TOLERANCE} of those of '
+                           f'the full data with probability 95% (deviation up to {deviation[inaccurate].max():.3f})')
+
+    pvalues = np.full(standard_panel.shape[1], np.nan)
+
+    testable = (standard_n > 0) & (test_n > 0)
+    exact = testable & (np.maximum(standard_n, test_n) <= KS_EXACT_MAX_N)
+    asymptotic = testable & ~exact
+
+    for ifeature in np.flatnonzero(exact):
+        standard_feature = standard_panel[:, ifeature]
+        test_feature = test_panel[:, ifeature]
+
+        pvalues[ifeature] = scipy.stats.ks_2samp(standard_feature[standard_feature > 0],
+                                                 test_feature[test_feature > 0]).pvalue
+
+    if asymptotic.any():
+        ks = ks_statistics(standard_panel[:, asymptotic], test_panel[:, asymptotic])
+
+        m = np.maximum(standard_n[asymptotic], test_n[asymptotic]).astype(float)
+        n = np.minimum(standard_n[asymptotic], test_n[asymptotic]).astype(float)
+
+        pvalues[asymptotic] = np.clip(scipy.stats.kstwo.sf(ks, np.round(m*n/(m+n))), 0, 1)
+
+    return pvalues
+
+
+def sketch_ks_pvalues(standard_sketches, test_sketches):
+    """
+    sketch_ks_pvalues
+
+    Approximate two-sided, two-sample Kolmogorov-Smirnoff p-values of every feature from (features x bins)
+    histograms of the values > 0 of the standard and test partitions, using the asymptotic distribution of the
+    statistic. The statistic is evaluated at bin edges only, so it can underestimate the exact statistic by up to
+    the largest fraction of either sample falling in a single bin.
+
+    Features with no values > 0 in either partition get a p-value of nan.
+
+    """
+
+    standard_n = standard_sketches.sum(axis=1)
+    test_n = test_sketches.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ks = np.abs(np.cumsum(standard_sketches, axis=1)/standard_n[:, np.newaxis] -
+                    np.cumsum(test_sketches, axis=1)/test_n[:, np.newaxis]).max(axis=1)
+
+        m = np.maximum(standard_n, test_n).astype(float)
+        n = np.minimum(standard_n, test_n).astype(float)
+
+        pvalues = np.clip(scipy.stats.kstwo.sf(ks, np.round(m*n/(m+n))), 0, 1)
+
+    pvalues[(standard_n == 0) | (test_n == 0)] = np.nan
+
+    return pvalues
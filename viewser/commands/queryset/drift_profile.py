@@ -0,0 +1,137 @@
+"""
+drift_profile
+=============
+
+Wall time, CPU time and peak memory of the stages of drift detection: the
+self test, the conversion of the data to a tensor, the computation of the
+inputs shared by the checks, and each check.
+
+Memory is measured with tracemalloc, which numpy reports its allocations to,
+as the peak of the memory traced during a stage above that traced when it
+started. Tracing is only switched on while a stage is being profiled, but
+slows down allocations by Python code while it is. tracemalloc keeps a
+single peak per process, so the peaks of checks run concurrently in threads
+overlap one another; run the checks serially, or in processes, to
+attribute peak memory to each check. CPU time is that of the thread
+running the stage.
+
+"""
+from typing import Dict, Iterable, List, Optional
+import threading
+import time
+import tracemalloc
+import pandas as pd
+
+MEASUREMENTS = ('wall_time', 'cpu_time', 'peak_memory')
+
+# number of Profiles currently tracing, so that tracing is stopped by the last one to finish
+
+_tracing = 0
+_tracing_lock = threading.Lock()
+
+
+def _start_tracing():
+    global _tracing
+
+    with _tracing_lock:
+        if _tracing == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing = 1
+        elif _tracing > 0:
+            _tracing += 1
+
+
+def _stop_tracing():
+    global _tracing
+
+    with _tracing_lock:
+        if _tracing > 0:
+            _tracing -= 1
+
+            if _tracing == 0:
+                tracemalloc.stop()
+
+
+class Profile():
+    """
+    Profile
+    =======
+
+    parameters:
+        enabled (bool): Whether to measure anything
+
+    Context manager measuring the wall time and CPU time, in seconds, and the
+    peak additional memory, in bytes, of the code it wraps. If tracemalloc
+    was already tracing when the Profile started, it is left running.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.wall_time = None
+        self.cpu_time = None
+        self.peak_memory = None
+
+    def __enter__(self) -> "Profile":
+        if self.enabled:
+            _start_tracing()
+            tracemalloc.reset_peak()
+
+            self._start_memory = tracemalloc.get_traced_memory()[0]
+            self._start_wall = time.perf_counter()
+            self._start_cpu = time.thread_time()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.enabled:
+            self.cpu_time = time.thread_time() - self._start_cpu
+            self.wall_time = time.perf_counter() - self._start_wall
+            self.peak_memory = max(0, tracemalloc.get_traced_memory()[1] - self._start_memory)
+
+            _stop_tracing()
+
+        return False
+
+    def measurements(self) -> Optional[Dict[str, float]]:
+        if not self.enabled:
+            return None
+
+        return {'wall_time': self.wall_time, 'cpu_time': self.cpu_time, 'peak_memory': self.peak_memory}
+
+
+def combine(measurements: Iterable[Optional[Dict[str, float]]]) -> Optional[Dict[str, float]]:
+    """
+    combine
+
+    Measurements of a stage run in parts one after the other, e.g. a check
+    run block by block: the sums of the times and the largest peak memory
+    """
+
+    measurements = [measurement for measurement in measurements if measurement is not None]
+
+    if len(measurements) == 0:
+        return None
+
+    return {'wall_time': sum(measurement['wall_time'] for measurement in measurements),
+            'cpu_time': sum(measurement['cpu_time'] for measurement in measurements),
+            'peak_memory': max(measurement['peak_memory'] for measurement in measurements)}
+
+
+def profile_frame(stages: Dict[str, Optional[Dict[str, float]]],
+                  checks: List[Dict], measurements: List[Optional[Dict[str, float]]]) -> pd.DataFrame:
+    """
+    profile_frame
+
+    One row per profiled stage of the gate, followed by one row per check, in
+    the order of the checks of the report, with columns stage, test_function
+    (empty for the gate's own stages), wall_time, cpu_time and peak_memory
+    """
+
+    rows = [{'stage': stage, 'test_function': None, **measurement}
+            for stage, measurement in stages.items() if measurement is not None]
+
+    for check, measurement in zip(checks, measurements):
+        rows.append({'stage': 'check', 'test_function': check['test_function'],
+                     **(measurement if measurement is not None else dict.fromkeys(MEASUREMENTS))})
+
+    return pd.DataFrame(rows, columns=['stage', 'test_function', *MEASUREMENTS])
@@ -0,0 +1,265 @@
+"""
+drift_registry
+==============
+
+Registry of the integrity checks run by the drift detector, and of the
+shared inputs they can declare.
+
+A check is a function accepting the kwargs passed by a Tester (tensor,
+index, features, test_partition_length, standard_partition_length,
+statistics, inputs and its parameters) and returning an array of results
+and a dictionary translating result positions to units of analysis or
+features. It declares the inputs it needs by name, and receives them,
+computed once per tensor and shared with every other check, in the inputs
+mapping. Checks can be registered from outside viewser, e.g.
+
+    @register_check(inputs=("partitions", "valid_mask"), config_key="max_drift", threshold=5.,
+                    message="feature max drift")
+    def max_drift(inputs, **kwargs):
+        standard, test = inputs["partitions"]
+        ...
+
+after which the check runs with the others, and can be configured under
+config_key like the built-in checks.
+
+"""
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import threading
+import numpy as np
+from . import config_drift as config
+
+
+class IntegrityCheck():
+    """
+    IntegrityCheck
+    ==============
+
+    parameters:
+        name (str): Name of the check, used as test_function in the drift configuration
+        function (Callable): The check
+        inputs (Tuple[str]): Names of the shared inputs the check uses
+        perturbation (Callable): Self-test perturbation of the check, perturbing a tensor in place and returning the
+                                 undo list restoring it (default: the perturb_<name> function of self_test)
+
+    """
+
+    def __init__(self, name: str, function: Callable, inputs: Tuple[str, ...] = (),
+                 perturbation: Optional[Callable] = None):
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+        self.perturbation = perturbation
+
+    def __call__(self, **kwargs):
+        return self.function(**kwargs)
+
+
+class CheckRegistry():
+    """
+    CheckRegistry
+    =============
+
+    Integrity checks, by name, and providers of the shared inputs checks can
+    declare. An input provider is called with the TensorStatistics of the
+    tensor checked and the lengths of the test and standard partitions.
+    """
+
+    def __init__(self):
+        self._checks: Dict[str, IntegrityCheck] = {}
+        self._inputs: Dict[str, Callable] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._checks
+
+    @property
+    def checks(self) -> Tuple[str, ...]:
+        return tuple(self._checks)
+
+    @property
+    def inputs(self) -> Tuple[str, ...]:
+        return tuple(self._inputs)
+
+    def register_input(self, name: str, provider: Callable) -> None:
+        self._inputs[name] = provider
+
+    def register(self, function: Callable, name: Optional[str] = None, inputs: Iterable[str] = (),
+                 perturbation: Optional[Callable] = None, config_key: Optional[str] = None,
+                 threshold: Optional[float] = None, message: Optional[str] = None,
+                 parameters: Optional[Dict[str, Any]] = None, self_test: Optional[float] = None) -> IntegrityCheck:
+        """
+        register
+
+        Register function as the check name (default: the function's name).
+        If config_key is given, the check is also added to the default drift
+        configuration under config_key, with the given threshold, message,
+        parameters and self-test perturbation size.
+        """
+        name = name if name is not None else function.__name__
+        inputs = tuple(inputs)
+
+        unknown = [input_name for input_name in inputs if input_name not in self._inputs]
+
+        if len(unknown) > 0:
+            raise RuntimeError(f'check {name} declares unknown inputs {unknown}: must be among {self.inputs}')
+
+        check = IntegrityCheck(name, function, inputs, perturbation)
+        self._checks[name] = check
+
+        if config_key is not None:
+            config.default_config_dict[config_key] = {'threshold': threshold,
+                                                      'test_function': name,
+                                                      'message': message if message is not None else name,
+                                                      'self_test': self_test,
+                                                      'parameters': dict(parameters or {})}
+
+        return check
+
+    def get(self, name: str) -> IntegrityCheck:
+        try:
+            return self._checks[name]
+        except KeyError:
+            raise RuntimeError(f'unknown integrity check {name}: must be one of {self.checks}')
+
+    def provider(self, name: str) -> Callable:
+        return self._inputs[name]
+
+
+class InputResolver():
+    """
+    InputResolver
+    =============
+
+    parameters:
+        statistics (TensorStatistics): Statistics of the tensor checked
+        registry (CheckRegistry): Registry providing the inputs
+
+    Computes the inputs declared by checks from statistics, each once, and
+    shares them between checks, including checks running in different
+    threads.
+    """
+
+    def __init__(self, statistics, registry: Optional[CheckRegistry] = None):
+        self.statistics = statistics
+        self.registry = registry if registry is not None else checks
+        self._values: Dict[Tuple[str, int, int], Any] = {}
+        self._lock = threading.RLock()
+
+    def value(self, name: str, test_partition_length: int, standard_partition_length: int) -> Any:
+        key = (name, test_partition_length, standard_partition_length)
+
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = self.registry.provider(name)(self.statistics, test_partition_length,
+                                                                 standard_partition_length)
+
+            return self._values[key]
+
+    def resolve(self, check: IntegrityCheck, test_partition_length: int,
+                standard_partition_length: int) -> "ResolvedInputs":
+        return ResolvedInputs(self, check.inputs, test_partition_length, standard_partition_length)
+
+
+class ResolvedInputs(Mapping):
+    """
+    ResolvedInputs
+
+    The inputs declared by a check, computed by an InputResolver on first
+    access, or all at once by compute().
+    """
+
+    def __init__(self, resolver: InputResolver, names: Tuple[str, ...], test_partition_length: int,
+                 standard_partition_length: int):
+        self.resolver = resolver
+        self.names = names
+        self.test_partition_length = test_partition_length
+        self.standard_partition_length = standard_partition_length
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self.names:
+            raise KeyError(f'input {name} was not declared by the check')
+
+        return self.resolver.value(name, self.test_partition_length, self.standard_partition_length)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def compute(self) -> "ResolvedInputs":
+        for name in self.names:
+            self[name]
+
+        return self
+
+
+checks = CheckRegistry()
+
+
+def register_check(name: Optional[str] = None, **kwargs) -> Callable:
+    """
+    register_check
+
+    Decorator registering a function as an integrity check, with the keyword
+    arguments of CheckRegistry.register
+    """
+    def decorator(function: Callable) -> Callable:
+        checks.register(function, name=name, **kwargs)
+        return function
+
+    return decorator
+
+
+def register_input(name: str) -> Callable:
+    """
+    register_input
+
+    Decorator registering a function as the provider of a shared input
+    """
+    def decorator(provider: Callable) -> Callable:
+        checks.register_input(name, provider)
+        return provider
+
+    return decorator
+
+
+# built-in inputs
+
+for mask in ('valid_mask', 'nan_mask', 'zero_mask'):
+    checks.register_input(mask, lambda statistics, *_, mask=mask: getattr(statistics, mask))
+
+
+@register_input('times')
+def _times(statistics, *_):
+    return statistics.times
+
+
+@register_input('spaces')
+def _spaces(statistics, *_):
+    return statistics.spaces
+
+
+@register_input('index_to_feature')
+def _index_to_feature(statistics, *_):
+    return statistics.index_to_feature
+
+
+@register_input('partitions')
+def _partitions(statistics, test_partition_length, standard_partition_length):
+    return statistics.partitions(test_partition_length, standard_partition_length)
+
+
+@register_input('partition_valid_masks')
+def _partition_valid_masks(statistics, test_partition_length, standard_partition_length):
+    return statistics.partition_masks(statistics.valid_mask, test_partition_length, standard_partition_length)
+
+
+@register_input('sorted_partitions')
+def _sorted_partitions(statistics, test_partition_length, standard_partition_length):
+    """
+    The standard and test partitions as (units of analysis x features) panels, each feature sorted, with
+    does-not-exist entries first and NaNs last
+    """
+    return tuple(np.sort(partition.reshape(-1, partition.shape[-1]), axis=0)
+                 for partition in statistics.partitions(test_partition_length, standard_partition_length))
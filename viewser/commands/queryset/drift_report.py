@@ -0,0 +1,252 @@
+"""
+drift_report
+============
+
+Structured results of the drift-detection checks run by an InputGate.
+
+"""
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List, Optional, Union
+import datetime
+import json
+import numpy as np
+import pandas as pd
+
+STATUSES = ("passed", "failed", "error", "unavailable")
+
+
+def now() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class InputAlarm:
+    def __repr__(self):
+        return f"Input alarm: {self.message} Severity: {self.severity} Timestamp: {self.timestamp}\n"
+
+    def __str__(self):
+        return f"Input alarm: {self.message} Severity: {self.severity} Timestamp: {self.timestamp}\n"
+
+    def __init__(self, message, severity=1, timestamp=None):
+        self.message = message
+        self.severity = severity
+        self.timestamp = timestamp if timestamp is not None else now()
+
+
+class AlertReport(Sequence):
+    """
+    AlertReport
+    ===========
+
+    parameters:
+        checks (pandas.DataFrame): One row per check run, with columns test_function, message, threshold, status
+                                   (one of STATUSES) and note (the text reported for unavailable checks)
+        check (numpy.ndarray): Position in checks of the check raising each alarm
+        offender (numpy.ndarray): Time unit, space unit, feature or index flagged by each alarm
+        severity (numpy.ndarray): Severity of each alarm: 1 + the ratio of the check's result to its threshold.
+                                  InputAlarms report its integer part
+        timestamp (str): Time at which the checks were run
+        profile (pandas.DataFrame): Wall time, CPU time and peak memory of the stages of the gate and of each check,
+                                    as built by drift_profile.profile_frame, if the gate was profiled
+
+    The alarms raised by a set of drift-detection checks, held in arrays
+    rather than as one object per alarm.
+
+    The report is also a sequence with one item per check, as returned by
+    InputGate.assemble_alerts before it returned reports: a list of
+    InputAlarm objects for a failed check, built on first access, the
+    string "<message> passed" for a passed check, None for a check which
+    could not be evaluated, and its note for an unavailable check.
+    """
+
+    def __init__(self, checks: pd.DataFrame, check: np.ndarray, offender: np.ndarray, severity: np.ndarray,
+                 timestamp: Optional[str] = None, profile: Optional[pd.DataFrame] = None):
+        self.checks = checks.reset_index(drop=True)
+        self.check = np.asarray(check, dtype=np.int64)
+        self.offender = np.asarray(offender, dtype=object)
+        self.severity = np.asarray(severity, dtype=np.float64)
+        self.timestamp = timestamp if timestamp is not None else now()
+        self.profile = profile
+
+        self._alarms: Dict[int, List[InputAlarm]] = {}
+
+    @classmethod
+    def from_outcomes(cls, testers: Iterable[Dict[str, Any]], outcomes: Iterable[Any]) -> "AlertReport":
+        """
+        from_outcomes
+
+        Build a report from the kwarg dicts of the Testers run and their
+        outcomes, as returned by Tester.evaluate: a pair of arrays of
+        offenders and severities, None if the check could not be evaluated,
+        or a string noting why the check is unavailable.
+        """
+        rows, checks, offenders, severities = [], [], [], []
+
+        for icheck, (tester, outcome) in enumerate(zip(testers, outcomes)):
+            note = None
+
+            if outcome is None:
+                status = "error"
+            elif isinstance(outcome, str):
+                status, note = "unavailable", outcome
+            else:
+                offender, severity = outcome
+                status = "failed" if len(offender) > 0 else "passed"
+
+                checks.append(np.full(len(offender), icheck))
+                offenders.append(np.asarray(offender, dtype=object))
+                severities.append(np.asarray(severity, dtype=np.float64))
+
+            rows.append({"test_function": tester["test_function"], "message": tester["message"],
+                         "threshold": tester["threshold"], "status": status, "note": note})
+
+        checks_frame = pd.DataFrame(rows, columns=["test_function", "message", "threshold", "status", "note"])
+
+        return cls(checks_frame,
+                   np.concatenate(checks) if checks else np.empty(0, dtype=np.int64),
+                   np.concatenate(offenders) if offenders else np.empty(0, dtype=object),
+                   np.concatenate(severities) if severities else np.empty(0, dtype=np.float64))
+
+    # sequence view
+
+    def __len__(self) -> int:
+        return len(self.checks)
+
+    def __getitem__(self, item: Union[int, slice]):
+        if isinstance(item, slice):
+            return [self[icheck] for icheck in range(*item.indices(len(self)))]
+
+        icheck = range(len(self))[item]
+        check = self.checks.iloc[icheck]
+
+        if check["status"] == "passed":
+            return f"{check['message']} passed"
+        elif check["status"] == "error":
+            return None
+        elif check["status"] == "unavailable":
+            return check["note"]
+
+        if icheck not in self._alarms:
+            rows = np.flatnonzero(self.check == icheck)
+
+            self._alarms[icheck] = [
+                InputAlarm(f"{check['message']}; offender: {offender}, threshold: {check['threshold']}",
+                           int(severity) if np.isfinite(severity) else severity, self.timestamp)
+                for offender, severity in zip(self.offender[rows], self.severity[rows])]
+
+        return self._alarms[icheck]
+
+    def __repr__(self) -> str:
+        counts = self.checks["status"].value_counts()
+        return (f"AlertReport({len(self)} checks: " +
+                ", ".join(f"{counts.get(status, 0)} {status}" for status in STATUSES) +
+                f"; {len(self.severity)} alarms)")
+
+    # structured views
+
+    @property
+    def failed(self) -> bool:
+        return bool((self.checks["status"] == "failed").any())
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        to_frame
+
+        One row per alarm, with the test function, message and threshold of
+        the check raising it, the offender and the severity.
+        """
+        checks = self.checks.iloc[self.check]
+
+        return pd.DataFrame({"test_function": checks["test_function"].to_numpy(),
+                             "message": checks["message"].to_numpy(),
+                             "threshold": checks["threshold"].to_numpy(),
+                             "offender": self.offender,
+                             "severity": self.severity})
+
+    def summary(self) -> pd.DataFrame:
+        """
+        summary
+
+        One row per check, with its status, number of alarms and largest
+        severity.
+        """
+        summary = self.checks[["test_function", "message", "threshold", "status"]].copy()
+
+        summary["alarms"] = np.bincount(self.check, minlength=len(self))
+
+        max_severity = np.zeros(len(self))
+        np.maximum.at(max_severity, self.check, self.severity)
+        summary["max_severity"] = max_severity
+
+        return summary
+
+    def filter(self, test_functions: Optional[Iterable[str]] = None, min_severity: Optional[float] = None,
+               offenders: Optional[Iterable[Any]] = None) -> "AlertReport":
+        """
+        filter
+
+        The report restricted to the checks running test_functions, and to the
+        alarms with a severity of at least min_severity and flagging one of
+        offenders. The status of the checks is unchanged.
+        """
+        keep_checks = np.ones(len(self), dtype=bool)
+
+        if test_functions is not None:
+            keep_checks = self.checks["test_function"].isin(list(test_functions)).to_numpy()
+
+        keep = keep_checks[self.check]
+
+        if min_severity is not None:
+            keep &= self.severity >= min_severity
+
+        if offenders is not None:
+            keep &= pd.Series(self.offender).isin(list(offenders)).to_numpy()
+
+        renumber = np.cumsum(keep_checks) - 1
+
+        return AlertReport(self.checks[keep_checks], renumber[self.check[keep]], self.offender[keep],
+                           self.severity[keep], self.timestamp, self.profile)
+
+    # export
+
+    def to_parquet(self, path: str) -> None:
+        """
+        to_parquet
+
+        Write the alarms of to_frame to a parquet file. Offenders are stored
+        as strings, since they mix time and space units and feature names.
+        """
+        frame = self.to_frame()
+        frame["offender"] = frame["offender"].astype(str)
+        frame["timestamp"] = self.timestamp
+
+        frame.to_parquet(path, index=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        checks = self.summary()
+        checks["note"] = self.checks["note"]
+
+        document = {"timestamp": self.timestamp,
+                    "checks": json.loads(checks.to_json(orient="records")),
+                    "alarms": json.loads(self.to_frame().to_json(orient="records", default_handler=str))}
+
+        if self.profile is not None:
+            document["profile"] = json.loads(self.profile.to_json(orient="records"))
+
+        return document
+
+    def to_json(self, path: Optional[str] = None) -> Optional[str]:
+        """
+        to_json
+
+        The summary, alarms and profile of the report as a json document, written to
+        path if given, returned otherwise.
+        """
+        document = json.dumps(self.to_dict(), default=str)
+
+        if path is None:
+            return document
+
+        with open(path, "w") as f:
+            f.write(document)
+
+        return None
@@ -0,0 +1,498 @@
+"""
+drift_state
+===========
+
+Running sufficient statistics of a queryset's data, persisted between drift
+detection runs, so that a monthly run only needs to summarise the months it
+has not seen before.
+
+For every time unit, the state holds:
+
+- per feature: the number of valid, missing and zero entries, the count,
+  mean, sum of squared deviations and maximum of the valid values, and a
+  histogram of the positive values on fixed logarithmic bins (a mergeable
+  quantile sketch)
+- per space unit: the number of valid, missing and zero entries
+
+which is sufficient to compute the count-based integrity checks and the
+extreme value check exactly over any range of time units, and the KS drift
+check approximately. States are stored per queryset fingerprint under
+~/.views/drift_state. The prefix sums of a CumulativeState give the
+statistics of any range of time units in time independent of its length.
+
+"""
+from functools import cached_property
+from typing import Dict, List, Optional
+import os
+import tempfile
+import numpy as np
+from views_tensor_utilities import mappings
+from viewser.settings import static
+from . import config_drift as config
+from .drift_statistics import TensorStatistics, time_space_tensor, TIME_AXES, SPACE_AXES, FEATURE_AXES
+from .drift_ks import sketch_ks_pvalues
+
+DRIFT_STATE_DIR = os.path.join(static.CONFIG_DIR, "drift_state")
+
+# histogram sketch of positive values: SKETCH_BINS_PER_DECADE logarithmic bins per decade between 10**SKETCH_MIN
+# and 10**SKETCH_MAX, plus one bin for smaller and one for larger values
+
+SKETCH_BINS_PER_DECADE = 16
+SKETCH_MIN = -6
+SKETCH_MAX = 12
+SKETCH_EDGES = 10.**np.linspace(SKETCH_MIN, SKETCH_MAX, (SKETCH_MAX - SKETCH_MIN)*SKETCH_BINS_PER_DECADE + 1)
+
+COUNTS = ("valid", "nan", "zero")
+MOMENTS = ("n", "mean", "m2", "max")
+
+
+class DriftState():
+    """
+    DriftState
+    ==========
+
+    parameters:
+        features (Optional[List[str]]): Names of the numeric features of the queryset (None until data is added)
+        months (numpy.ndarray): Time units summarised, sorted
+        spaces (numpy.ndarray): Space units seen, sorted
+        arrays (Dict[str, numpy.ndarray]): Summaries, see summarise
+
+    Sufficient statistics of every time unit of a queryset's data. Months are
+    added with update, and the statistics of a range of months are read with
+    statistics, which can be used in place of the TensorStatistics of the
+    full data by the integrity checks.
+    """
+
+    def __init__(self, features: Optional[List[str]] = None, months: np.ndarray = None, spaces: np.ndarray = None,
+                 arrays: Optional[Dict[str, np.ndarray]] = None):
+        self.features = list(features) if features is not None else None
+        self.months = np.array([], dtype=np.int64) if months is None else np.asarray(months)
+        self.spaces = np.array([], dtype=np.int64) if spaces is None else np.asarray(spaces)
+        self.arrays = arrays if arrays is not None else empty_summaries(0, 0, len(features) if features else 0)
+
+    @staticmethod
+    def path(fingerprint: str, directory: Optional[str] = None) -> str:
+        return os.path.join(directory if directory else DRIFT_STATE_DIR, f"{fingerprint}.npz")
+
+    @classmethod
+    def load(cls, fingerprint: str, directory: Optional[str] = None) -> "DriftState":
+        """
+        load
+
+        Load the state stored for the queryset fingerprint, or an empty state
+        if none is stored.
+        """
+        path = cls.path(fingerprint, directory)
+
+        if not os.path.exists(path):
+            return cls()
+
+        with np.load(path) as stored:
+            return cls(stored["features"].tolist(), stored["months"], stored["spaces"],
+                       {name: stored[name] for name in stored.files if name not in ("features", "months", "spaces")})
+
+    def save(self, fingerprint: str, directory: Optional[str] = None) -> None:
+        path = self.path(fingerprint, directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write next to the stored state and swap it in, so that an interrupted save leaves it intact
+
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+            try:
+                np.savez_compressed(f, features=np.array(self.features, dtype=str), months=self.months,
+                                    spaces=self.spaces, **self.arrays)
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+
+        os.replace(f.name, path)
+
+    def missing_months(self, months) -> np.ndarray:
+        return np.setdiff1d(np.unique(months), self.months)
+
+    def update(self, df) -> bool:
+        """
+        update
+
+        Summarise the data in the dataframe df (indexed by time and space
+        units) and merge it into the state, replacing any months already
+        summarised. Returns False, leaving the state unchanged, if the numeric
+        features of df differ from those of the state.
+        """
+        if len(df) == 0:
+            return True
+
+        tensor, features, times, spaces = time_space_tensor(df)
+
+        if self.features is None:
+            self.features = features
+            self.arrays = empty_summaries(0, 0, len(self.features))
+
+        if features != self.features:
+            return False
+
+        self.merge(np.array(times.times), np.array(spaces.spaces), summarise(tensor))
+
+        return True
+
+    def merge(self, months: np.ndarray, spaces: np.ndarray, arrays: Dict[str, np.ndarray]) -> None:
+        """
+        merge
+
+        Merge the summaries arrays of the time units months and space units
+        spaces into the state.
+        """
+        all_months = np.union1d(np.setdiff1d(self.months, months), months)
+        all_spaces = np.union1d(self.spaces, spaces)
+
+        merged = empty_summaries(len(all_months), len(all_spaces), len(self.features))
+
+        kept = ~np.isin(self.months, months)
+
+        for source_months, source_spaces, source_arrays, rows in ((self.months, self.spaces, self.arrays, kept),
+                                                                  (months, spaces, arrays, slice(None))):
+            month_index = np.searchsorted(all_months, source_months[rows])
+            space_index = np.searchsorted(all_spaces, source_spaces)
+
+            for name, array in source_arrays.items():
+                if name.startswith("space_"):
+                    merged[name][np.ix_(month_index, space_index)] = array[rows]
+                else:
+                    merged[name][month_index] = array[rows]
+
+        self.months, self.spaces, self.arrays = all_months, all_spaces, merged
+
+    def statistics(self, months) -> "StateStatistics":
+        """
+        statistics
+
+        TensorStatistics-like view of the state restricted to the time units
+        months, all of which must have been summarised.
+        """
+        months = np.unique(months)
+
+        missing = np.setdiff1d(months, self.months)
+        if len(missing) > 0:
+            raise RuntimeError(f'drift state does not cover months {missing.tolist()}')
+
+        return StateStatistics(self, months)
+
+
+def empty_summaries(nmonths: int, nspaces: int, nfeatures: int) -> Dict[str, np.ndarray]:
+    arrays = {}
+
+    for name in COUNTS:
+        arrays[f"feature_{name}"] = np.zeros((nmonths, nfeatures), dtype=np.int64)
+        arrays[f"space_{name}"] = np.zeros((nmonths, nspaces), dtype=np.int32)
+
+    for name in MOMENTS:
+        arrays[f"feature_{name}"] = np.zeros((nmonths, nfeatures), dtype=np.float64)
+    arrays["feature_max"][:] = config.default_dne
+
+    arrays["feature_sketch"] = np.zeros((nmonths, nfeatures, len(SKETCH_EDGES) + 1), dtype=np.int64)
+
+    return arrays
+
+
+def summarise(tensor: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    summarise
+
+    Sufficient statistics of every time unit of a time x space x feature
+    tensor, as stored in a DriftState.
+    """
+    masks = {"valid": tensor != config.default_dne, "nan": np.isnan(tensor), "zero": tensor == 0}
+
+    arrays = {}
+
+    for name, mask in masks.items():
+        arrays[f"feature_{name}"] = np.count_nonzero(mask, axis=1).astype(np.int64)
+        arrays[f"space_{name}"] = np.count_nonzero(mask, axis=2).astype(np.int32)
+
+    values = np.where(masks["valid"], tensor, np.nan)
+
+    n = np.count_nonzero(~np.isnan(values), axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, np.nansum(values, axis=1)/n, 0.)
+
+    arrays["feature_n"] = n.astype(np.float64)
+    arrays["feature_mean"] = mean
+    arrays["feature_m2"] = np.nansum((values - mean[:, np.newaxis, :])**2, axis=1)
+    arrays["feature_max"] = np.max(tensor, axis=1)
+
+    ntimes, _, nfeatures = tensor.shape
+    nbins = len(SKETCH_EDGES) + 1
+
+    time_index, _, feature_index = np.nonzero(tensor > 0)
+    bins = np.searchsorted(SKETCH_EDGES, tensor[tensor > 0])
+
+    arrays["feature_sketch"] = np.bincount((time_index*nfeatures + feature_index)*nbins + bins,
+                                           minlength=ntimes*nfeatures*nbins).reshape(ntimes, nfeatures, nbins)
+
+    return arrays
+
+
+class StateStatistics(TensorStatistics):
+
+    """
+    StateStatistics
+
+    Stand-in for the TensorStatistics of the data summarised by a DriftState over a range of time units. The
+    count-based integrity checks run on it unchanged; the extreme value and KS drift checks use the moments and
+    sketches of the state instead of the data. The data itself is not available.
+
+    """
+
+    def __init__(self, state, months):
+        super().__init__(None, None, state.features)
+
+        rows = np.searchsorted(state.months, months)
+
+        self.months = months
+        self.arrays = {name: array[rows] for name, array in state.arrays.items()}
+
+        # space units with no entries in any of the months do not appear in the data
+
+        present = (self.arrays["space_valid"] > 0).any(axis=0)
+
+        self.space_units = state.spaces[present]
+        for name in COUNTS:
+            self.arrays[f"space_{name}"] = self.arrays[f"space_{name}"][:, present]
+
+        self.shape = (len(self.months), len(self.space_units), len(self.features))
+
+    @cached_property
+    def times(self):
+        times = list(self.months)
+        return mappings.TimeUnits(times=times,
+                                  index_to_time=dict(enumerate(times)),
+                                  time_to_index={time: i for i, time in enumerate(times)})
+
+    @cached_property
+    def spaces(self):
+        return mappings.SpaceUnits(spaces=self.space_units,
+                                   index_to_space=dict(enumerate(self.space_units)),
+                                   space_to_index={space: i for i, space in enumerate(self.space_units)})
+
+    @cached_property
+    def n_valid(self):
+        return int(self.arrays["feature_valid"].sum())
+
+    @cached_property
+    def n_nan(self):
+        return int(self.arrays["feature_nan"].sum())
+
+    @cached_property
+    def n_zero(self):
+        return int(self.arrays["feature_zero"].sum())
+
+    def counts(self, mask, axes):
+        name = mask[:-len("_mask")]
+
+        if axes == TIME_AXES:
+            return self.arrays[f"feature_{name}"].sum(axis=1)
+        if axes == SPACE_AXES:
+            return self.arrays[f"space_{name}"].sum(axis=0)
+        if axes == FEATURE_AXES:
+            return self.arrays[f"feature_{name}"].sum(axis=0)
+
+        raise RuntimeError(f'drift state cannot count {mask} over axes {axes}')
+
+    def sizes(self, axes):
+        return int(np.prod([self.shape[axis] for axis in axes]))
+
+    def partitions(self, test_partition_length, standard_partition_length):
+        raise RuntimeError('the data of a drift state is not available')
+
+    def partition_rows(self, test_partition_length, standard_partition_length):
+        standard_partition, test_partition = self.partition_bounds(test_partition_length,
+                                                                   standard_partition_length)
+
+        return slice(*standard_partition), slice(*test_partition)
+
+    def partition_counts(self, mask, axes, test_partition_length, standard_partition_length):
+        if axes != FEATURE_AXES:
+            raise RuntimeError(f'drift state cannot count {mask} over axes {axes} by partition')
+
+        counts = self.arrays[f"feature_{mask[:-len('_mask')]}"]
+        standard, test = self.partition_rows(test_partition_length, standard_partition_length)
+
+        return counts[standard].sum(axis=0), counts[test].sum(axis=0)
+
+    def partition_moments(self, test_partition_length, standard_partition_length):
+        """
+        partition_moments
+
+        Mean and standard deviation of the valid values of every feature in the standard partition, and maximum
+        of every feature in the test partition, merging the moments of the time units in each partition
+
+        """
+
+        standard, test = self.partition_rows(test_partition_length, standard_partition_length)
+
+        n = self.summary_rows("feature_n", standard)
+        means = self.summary_rows("feature_mean", standard)
+
+        total = n.sum(axis=0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (n*means).sum(axis=0)/total
+            m2 = self.summary_rows("feature_m2", standard).sum(axis=0) + (n*(means - mean)**2).sum(axis=0)
+            sigma = np.sqrt(m2/total)
+
+        return mean, sigma, np.max(self.summary_rows("feature_max", test), axis=0)
+
+    def summary_rows(self, name, rows):
+        return self.arrays[name][rows]
+
+    def partition_sketches(self, test_partition_length, standard_partition_length):
+        """
+        partition_sketches
+
+        Histograms of the positive values of every feature in the standard and test partitions
+
+        """
+
+        sketches = self.arrays["feature_sketch"]
+        standard, test = self.partition_rows(test_partition_length, standard_partition_length)
+
+        return sketches[standard].sum(axis=0), sketches[test].sum(axis=0)
+
+    def partition_ks_pvalues(self, test_partition_length, standard_partition_length, max_samples=None):
+        """
+        partition_ks_pvalues
+
+        KS p-values approximated from the partition sketches by drift_ks.sketch_ks_pvalues. The sketches already
+        summarise all values, so max_samples is not used
+
+        """
+
+        return sketch_ks_pvalues(*self.partition_sketches(test_partition_length, standard_partition_length))
+
+
+class CumulativeState():
+    """
+    CumulativeState
+    ===============
+
+    parameters:
+        state (DriftState): State whose summaries are accumulated
+
+    Prefix sums of the summaries of a DriftState along the time axis, from
+    which the statistics of any range of its time units are read by window
+    in time independent of the length of the range. The prefix sums of a
+    summary are computed the first time a window needs them.
+    """
+
+    def __init__(self, state: DriftState):
+        self.state = state
+        self._prefixes: Dict[str, np.ndarray] = {}
+
+    def prefix(self, name: str) -> np.ndarray:
+        """
+        prefix
+
+        Prefix sums of the summary name, with a leading row of zeros, so that the sum over time units start to
+        end (exclusive) is prefix[end] - prefix[start]
+        """
+        if name not in self._prefixes:
+            array = self.state.arrays[name]
+
+            prefix = np.zeros((array.shape[0] + 1,) + array.shape[1:], dtype=np.result_type(array, np.int64))
+            np.cumsum(array, axis=0, out=prefix[1:])
+
+            self._prefixes[name] = prefix
+
+        return self._prefixes[name]
+
+    def total(self, name: str, start: int, end: int) -> np.ndarray:
+        prefix = self.prefix(name)
+        return prefix[end] - prefix[start]
+
+    def window(self, start: int, end: int) -> "WindowStatistics":
+        return WindowStatistics(self, start, end)
+
+
+class WindowStatistics(StateStatistics):
+
+    """
+    WindowStatistics
+
+    StateStatistics of the time units start to end (exclusive) of a DriftState, read from the prefix sums of a
+    CumulativeState rather than by summing the summaries of every time unit of the range. The moments of the
+    standard partition are the exception: they are merged from the summaries of its time units, which is stable
+    for values with a large mean and a small spread.
+
+    """
+
+    def __init__(self, cumulative, start, end):
+        TensorStatistics.__init__(self, None, None, cumulative.state.features)
+
+        state = cumulative.state
+
+        self.cumulative = cumulative
+        self.start = start
+        self.end = end
+        self.months = state.months[start:end]
+
+        # space units with no entries in any of the months do not appear in the data
+
+        self.present = cumulative.total("space_valid", start, end) > 0
+        self.space_units = state.spaces[self.present]
+
+        self.shape = (len(self.months), len(self.space_units), len(self.features))
+
+    @cached_property
+    def n_valid(self):
+        return int(self.counts("valid_mask", FEATURE_AXES).sum())
+
+    @cached_property
+    def n_nan(self):
+        return int(self.counts("nan_mask", FEATURE_AXES).sum())
+
+    @cached_property
+    def n_zero(self):
+        return int(self.counts("zero_mask", FEATURE_AXES).sum())
+
+    def counts(self, mask, axes):
+        name = mask[:-len("_mask")]
+
+        if axes == TIME_AXES:
+            return self.cumulative.state.arrays[f"feature_{name}"][self.start:self.end].sum(axis=1)
+        if axes == SPACE_AXES:
+            return self.cumulative.total(f"space_{name}", self.start, self.end)[self.present]
+        if axes == FEATURE_AXES:
+            return self.cumulative.total(f"feature_{name}", self.start, self.end)
+
+        raise RuntimeError(f'drift state cannot count {mask} over axes {axes}')
+
+    def partition_rows(self, test_partition_length, standard_partition_length):
+        standard, test = super().partition_rows(test_partition_length, standard_partition_length)
+
+        return (slice(self.start + standard.start, self.start + standard.stop),
+                slice(self.start + test.start, self.start + test.stop))
+
+    def partition_counts(self, mask, axes, test_partition_length, standard_partition_length):
+        if axes != FEATURE_AXES:
+            raise RuntimeError(f'drift state cannot count {mask} over axes {axes} by partition')
+
+        name = f"feature_{mask[:-len('_mask')]}"
+        standard, test = self.partition_rows(test_partition_length, standard_partition_length)
+
+        return (self.cumulative.total(name, standard.start, standard.stop),
+                self.cumulative.total(name, test.start, test.stop))
+
+    def summary_rows(self, name, rows):
+
+        # moments are merged from the summaries of the standard partition by StateStatistics.partition_moments
+        # rather than from prefix sums, whose differences lose the precision of the variance of large values
+
+        return self.cumulative.state.arrays[name][rows]
+
+    def partition_sketches(self, test_partition_length, standard_partition_length):
+        standard, test = self.partition_rows(test_partition_length, standard_partition_length)
+
+        return (self.cumulative.total("feature_sketch", standard.start, standard.stop),
+                self.cumulative.total("feature_sketch", test.start, test.stop))
@@ -0,0 +1,294 @@
+import threading
+import numpy as np
+import pandas as pd
+from functools import cached_property
+from views_tensor_utilities import mappings
+from . import config_drift as config
+from .drift_ks import ks_pvalues
+
+# axes to reduce over to obtain one value per time unit, space unit or feature
+
+TIME_AXES = (1, 2)
+SPACE_AXES = (0, 2)
+FEATURE_AXES = (0, 1)
+
+
+def time_space_codes(index):
+    """
+    time_space_codes
+
+    Factorise a (time, space) MultiIndex into the position of each row along the time and space axes of its
+    tensor, and the TimeUnits and SpaceUnits mapping those positions to the (sorted) time and space units
+
+    """
+
+    itime, times = pd.factorize(index.get_level_values(0), sort=True)
+    ispace, spaces = pd.factorize(index.get_level_values(1), sort=True)
+
+    times = list(times.to_numpy())
+    spaces = spaces.to_numpy()
+
+    time_units = mappings.TimeUnits(times=times, index_to_time=dict(enumerate(times)),
+                                    time_to_index={time: itime for itime, time in enumerate(times)})
+    space_units = mappings.SpaceUnits(spaces=spaces, index_to_space=dict(enumerate(spaces)),
+                                      space_to_index={space: ispace for ispace, space in enumerate(spaces)})
+
+    return itime, ispace, time_units, space_units
+
+
+def numeric_columns(df):
+    """
+    numeric_columns
+
+    The columns of df converted to features of a tensor, i.e. its numeric columns. Boolean columns, which pandas
+    counts as numeric, are rejected, as they are by ViewsDataframe
+
+    """
+
+    boolean = [column for column in df.columns if pd.api.types.is_bool_dtype(df[column])]
+
+    if boolean:
+        raise RuntimeError(f'boolean columns {boolean} cannot be examined: cast them to a numeric type')
+
+    return [column for column in df.columns if pd.api.types.is_numeric_dtype(df[column])]
+
+
+def time_space_tensor(df, dtype=np.float64):
+    """
+    time_space_tensor
+
+    Convert the numeric columns of a df indexed by (time, space) units to a time x space x feature tensor of float
+    type dtype, with the layout of the numeric part of ViewsDataframe(df, split_strategy='float_string') but
+    without per-row work: the index is factorised once and all columns are scattered into the tensor, prefilled
+    with config.default_dne for units of analysis absent from df, in a single assignment. Boolean columns raise
+    a RuntimeError (see numeric_columns).
+
+    Returns the tensor, the names of its features and the TimeUnits and SpaceUnits of its time and space axes.
+
+    """
+
+    itime, ispace, times, spaces = time_space_codes(df.index)
+
+    columns = numeric_columns(df)
+
+    values = df[columns].to_numpy(dtype=dtype)
+
+    if np.any(values == config.default_dne):
+        raise RuntimeError(f'does-not-exist token {config.default_dne} found in input data')
+
+    tensor = np.full((len(times.times), len(spaces.spaces), len(columns)), config.default_dne, dtype=dtype)
+    tensor[itime, ispace, :] = values
+
+    return tensor, columns, times, spaces
+
+
+class TensorStatistics:
+
+    """
+    TensorStatistics
+
+    Class which holds the quantities shared by the integrity checks - masks of valid, missing and zero entries,
+    their counts, the time and space index mappings and the standard/test partitions - for a single
+    time x space x feature tensor.
+
+    Every quantity is computed on first use and then reused by all checks run against the same tensor, so that
+    the tensor is traversed once per quantity rather than once per check. Masks are stored as booleans.
+
+    A TensorStatistics object can be shared by checks running in different threads.
+
+    The time and space index mappings can be passed in if they are already known, as returned by
+    time_space_tensor, rather than rebuilt from the index.
+
+    """
+
+    def __init__(self, tensor, index, features, times=None, spaces=None):
+        self.tensor = tensor
+        self.index = index
+        self.features = features
+
+        # index mappings already built along with the tensor, e.g. by time_space_tensor
+
+        if times is not None:
+            self.times = times
+
+        if spaces is not None:
+            self.spaces = spaces
+
+        self._partitions = {}
+        self._counts = {}
+        self._lock = threading.RLock()
+
+    @cached_property
+    def times(self):
+        return mappings.TimeUnits.from_pandas(self.index)
+
+    @cached_property
+    def spaces(self):
+        return mappings.SpaceUnits.from_pandas(self.index)
+
+    @cached_property
+    def index_to_feature(self):
+        return {ifeature: feature for ifeature, feature in enumerate(self.features)}
+
+    @cached_property
+    def valid_mask(self):
+        """
+        Mask of units-of-analysis which exist (e.g. excluding countries that do not exist in a given month)
+        """
+        return self.tensor != config.default_dne
+
+    @cached_property
+    def nan_mask(self):
+        return np.isnan(self.tensor)
+
+    @cached_property
+    def zero_mask(self):
+        return self.tensor == 0
+
+    @cached_property
+    def n_valid(self):
+        return np.count_nonzero(self.valid_mask)
+
+    @cached_property
+    def n_nan(self):
+        return np.count_nonzero(self.nan_mask)
+
+    @cached_property
+    def n_zero(self):
+        return np.count_nonzero(self.zero_mask)
+
+    def counts(self, mask, axes):
+        """
+        counts
+
+        Number of True entries of the shared mask named mask (valid_mask, nan_mask or zero_mask), reduced over
+        axes, e.g. TIME_AXES for one count per time unit
+
+        """
+
+        key = (mask, axes)
+
+        with self._lock:
+            if key not in self._counts:
+                self._counts[key] = np.count_nonzero(getattr(self, mask), axis=axes)
+
+            return self._counts[key]
+
+    def sizes(self, axes):
+        """
+        sizes
+
+        Number of entries of the tensor reduced over axes
+
+        """
+
+        return int(np.prod([self.tensor.shape[axis] for axis in axes]))
+
+    def partition_bounds(self, test_partition_length, standard_partition_length):
+        """
+        partition_bounds
+
+        Indices along the time axis of the standard and test partitions defined in drift_config
+
+        """
+
+        times = self.times
+
+        tend = times.times[-1]
+        tboundary = tend - test_partition_length
+        tstart = tboundary - standard_partition_length
+
+        tstart_index = times.time_to_index[tstart]
+        tboundary_index = times.time_to_index[tboundary]
+        tend_index = times.time_to_index[tend]
+
+        return (tstart_index, tboundary_index), (tboundary_index, tend_index)
+
+    def partitions(self, test_partition_length, standard_partition_length):
+        """
+        partitions
+
+        Views of the tensor covering the standard and test partitions
+
+        """
+
+        key = (test_partition_length, standard_partition_length)
+
+        with self._lock:
+            if key not in self._partitions:
+                standard_partition, test_partition = self.partition_bounds(test_partition_length,
+                                                                           standard_partition_length)
+
+                self._partitions[key] = (self.tensor[standard_partition[0]:standard_partition[1], :, :],
+                                         self.tensor[test_partition[0]:test_partition[1], :, :])
+
+            return self._partitions[key]
+
+    def partition_masks(self, mask, test_partition_length, standard_partition_length):
+        """
+        partition_masks
+
+        Views of one of the shared masks covering the standard and test partitions
+
+        """
+
+        standard_partition, test_partition = self.partition_bounds(test_partition_length, standard_partition_length)
+
+        return (mask[standard_partition[0]:standard_partition[1], :, :],
+                mask[test_partition[0]:test_partition[1], :, :])
+
+    def partition_counts(self, mask, axes, test_partition_length, standard_partition_length):
+        """
+        partition_counts
+
+        Number of True entries of the shared mask named mask in the standard and test partitions, reduced over axes
+
+        """
+
+        key = (mask, axes, test_partition_length, standard_partition_length)
+
+        with self._lock:
+            if key not in self._counts:
+                standard_mask, test_mask = self.partition_masks(getattr(self, mask), test_partition_length,
+                                                                standard_partition_length)
+
+                self._counts[key] = (np.count_nonzero(standard_mask, axis=axes),
+                                     np.count_nonzero(test_mask, axis=axes))
+
+            return self._counts[key]
+
+    def partition_moments(self, test_partition_length, standard_partition_length):
+        """
+        partition_moments
+
+        Mean and standard deviation of the valid values of every feature in the standard partition, and maximum
+        of every feature in the test partition, accumulated in float64, also for float32 tensors
+
+        """
+
+        standard, test = self.partitions(test_partition_length, standard_partition_length)
+        standard_valid, _ = self.partition_masks(self.valid_mask, test_partition_length, standard_partition_length)
+        standard_non_zero = np.where(standard_valid, standard, np.nan)
+
+        means, sigmas, maxima = [], [], []
+
+        for ifeature in range(standard.shape[2]):
+            means.append(np.nanmean(standard_non_zero[:, :, ifeature], dtype=np.float64))
+            sigmas.append(np.nanstd(standard_non_zero[:, :, ifeature], dtype=np.float64))
+            maxima.append(np.float64(np.max(test[:, :, ifeature])))
+
+        return np.array(means), np.array(sigmas), np.array(maxima)
+
+    def partition_ks_pvalues(self, test_partition_length, standard_partition_length, max_samples=None):
+        """
+        partition_ks_pvalues
+
+        KS p-values of the values > 0 of every feature in the standard and test partitions, computed by
+        drift_ks.ks_pvalues on subsamples of at most max_samples units of analysis per partition, if given
+
+        """
+
+        standard, test = self.partitions(test_partition_length, standard_partition_length)
+        nfeatures = standard.shape[2]
+
+        return ks_pvalues(standard.reshape(-1, nfeatures), test.reshape(-1, nfeatures), max_samples=max_samples)
@@ -0,0 +1,129 @@
+"""
+fetch_memo
+==========
+
+Opt-in, in-process memoisation of fetched querysets.
+
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class FetchMemo():
+    """
+    FetchMemo
+    =========
+
+    parameters:
+        budget (int): Maximum number of bytes of dataframes to keep in memory. 0 disables memoisation.
+        copy (bool): Return copies of memoised dataframes (default). If False, the memoised dataframe
+                     itself is returned, with its values made read-only, so that callers cannot modify
+                     the dataframes shared through the memo.
+
+    An LRU cache of dataframes with a memory budget. When adding a dataframe
+    would exceed the budget, the least recently used dataframes are evicted.
+    Dataframes larger than the budget are not memoised.
+    """
+    def __init__(self, budget: int = 0, copy: bool = True):
+        self.budget = budget
+        self.copy = copy
+        self._frames: "OrderedDict[Hashable, pd.DataFrame]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def configure(self, budget: int, copy: bool = True) -> None:
+        """
+        configure
+
+        Change the memory budget and read semantics, evicting dataframes as
+        required by the new budget.
+        """
+        with self._lock:
+            self.budget = budget
+            self.copy = copy
+            self._evict(0)
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        with self._lock:
+            try:
+                df = self._frames[key]
+            except KeyError:
+                return None
+
+            self._frames.move_to_end(key)
+
+        logger.debug(f"Returning memoised dataframe for {key}")
+        return df.copy() if self.copy else df
+
+    def put(self, key: Hashable, df: pd.DataFrame) -> None:
+        if not self.enabled:
+            return
+
+        size = int(df.memory_usage(index=True, deep=True).sum())
+
+        if size > self.budget:
+            logger.debug(f"Dataframe for {key} ({size} bytes) exceeds memo budget, not memoising")
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._evict(size)
+            self._frames[key] = df.copy() if self.copy else read_only(df)
+            self._sizes[key] = size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self._sizes.clear()
+
+    def _remove(self, key: Hashable) -> None:
+        self._frames.pop(key, None)
+        self._sizes.pop(key, None)
+
+    def _evict(self, incoming: int) -> None:
+        while self._frames and self.nbytes + incoming > self.budget:
+            key, _ = self._frames.popitem(last=False)
+            del self._sizes[key]
+
+
+def read_only(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    read_only
+
+    Make the numpy blocks of df read-only in place, so that setting values in
+    df raises a ValueError. Extension arrays are left as they are.
+    """
+    for values in df._mgr.arrays:
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+    return df
+
+
+def memo_date(date: Any) -> Any:
+    """
+    memo_date
+
+    Cast a start or end date to int, as QuerysetOperations.fetch does, so that
+    e.g. 400 and "400" share a memo entry. Dates that cannot be cast are
+    returned as they are, for fetch to reject.
+    """
+    if date is None:
+        return None
+    try:
+        return int(date)
+    except (TypeError, ValueError):
+        return date
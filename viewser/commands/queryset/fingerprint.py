@@ -0,0 +1,107 @@
+"""
+fingerprint
+===========
+
+Content fingerprints for queryset definitions, used to decide whether a
+definition has changed relative to a stored (or previously exported) version,
+and for fetched data and drift-detection configurations, used as cache keys.
+
+"""
+from typing import Any, Dict, List
+import hashlib
+import json
+import pandas as pd
+
+
+def _operation_to_dict(operation: Any) -> Dict[str, Any]:
+    if not isinstance(operation, dict):
+        operation = {
+            'namespace': operation.namespace,
+            'name': operation.name,
+            'arguments': operation.arguments,
+            }
+
+    return {
+        'namespace': operation['namespace'],
+        'name': operation['name'],
+        'arguments': [str(argument) for argument in operation['arguments']],
+        }
+
+
+def normalized_definition(definition: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    normalized_definition
+
+    parameters:
+        definition (Dict[str, Any]): Queryset json, as returned by the queryset store or Queryset.dict()
+
+    returns:
+        Dict[str, Any]: The definition restricted to the fields that determine its content
+
+    """
+
+    operations: List[List[Dict[str, Any]]] = [
+        [_operation_to_dict(operation) for operation in column] for column in definition.get('operations', [])
+        ]
+
+    return {
+        'name': definition.get('name'),
+        'loa': definition.get('loa'),
+        'description': definition.get('description'),
+        'themes': list(definition.get('themes') or []),
+        'operations': operations,
+        }
+
+
+def definition_fingerprint(definition: Dict[str, Any]) -> str:
+    """
+    definition_fingerprint
+
+    parameters:
+        definition (Dict[str, Any]): Queryset json, as returned by the queryset store or Queryset.dict()
+
+    returns:
+        str: sha256 hex digest of the canonical json form of the definition
+
+    Two definitions have the same fingerprint if and only if they define the
+    same name, loa, description, themes and operations.
+    """
+
+    canonical = json.dumps(normalized_definition(definition), sort_keys=True, separators=(',', ':'))
+
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def dataframe_fingerprint(df: pd.DataFrame) -> str:
+    """
+    dataframe_fingerprint
+
+    parameters:
+        df (pandas.DataFrame): Dataframe, e.g. a fetched queryset
+
+    returns:
+        str: sha256 hex digest of the column names, dtypes and the hashes of the rows (index included) of df
+
+    """
+
+    digest = hashlib.sha256(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+
+    return digest.hexdigest()
+
+
+def drift_config_fingerprint(drift_config_dict: Dict[str, Any]) -> str:
+    """
+    drift_config_fingerprint
+
+    parameters:
+        drift_config_dict (Dict[str, Any]): Drift-detection configuration dictionary
+
+    returns:
+        str: sha256 hex digest of the canonical json form of the configuration
+
+    """
+
+    canonical = json.dumps(drift_config_dict, sort_keys=True, separators=(',', ':'), default=str)
+
+    return hashlib.sha256(canonical.encode()).hexdigest()
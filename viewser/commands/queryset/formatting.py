@@ -1,7 +1,7 @@
 
 from views_schema import queryset_manager as schema
 from viewser.tui.formatting import abc, conventions
-from . import queryset_list
+from . import queryset_list, planner
 
 class QuerysetListTable(abc.Section[queryset_list.QuerysetList]):
     TITLE = "Querysets"
@@ -36,3 +36,33 @@ class QuerysetDetailFormatter(abc.Formatter[schema.DetailQueryset]):
             QuerysetSummary,
         ]
 
+
+class QueryPlanSummary(abc.Section[planner.QueryPlan]):
+    TITLE = "Summary"
+
+    def compile_output(self, model: planner.QueryPlan):
+        return conventions.tabulate([
+                ("columns", len(model.outputs)),
+                ("operations", model.n_operations),
+                ("unique operations", model.n_unique_operations),
+                ("redundant operations", model.n_redundant_operations),
+                ("retrievals", model.n_retrievals),
+                ("unique retrievals", model.n_unique_retrievals),
+            ], ("", f"{model.name} at {model.loa}"))
+
+class QueryPlanSharedPrefixes(abc.Section[planner.QueryPlan]):
+    TITLE = "Shared prefixes"
+
+    def compile_output(self, model: planner.QueryPlan):
+        prefixes = model.shared_prefixes()
+        if not prefixes:
+            return "No operations are shared between columns"
+        return conventions.tabulate(
+                [(" -> ".join(p.operations), ", ".join(p.columns), p.redundant_operations) for p in prefixes],
+                ("operations", "columns", "redundant"))
+
+class QueryPlanFormatter(abc.Formatter[planner.QueryPlan]):
+    SECTIONS = [
+            QueryPlanSummary,
+            QueryPlanSharedPrefixes,
+        ]
@@ -0,0 +1,211 @@
+"""
+local_transforms
+================
+
+Local, vectorised implementations of the most commonly used transforms, which
+make it possible to re-derive queryset columns from cached raw data without a
+round trip to the transform service.
+
+Raw data is a pandas DataFrame indexed by (time, unit), at the level of
+analysis of the queryset, with one column per database retrieval named by
+raw_column_key. Such a frame can be fetched once with the queryset returned by
+raw_queryset:
+
+    raw = local_transforms.raw_queryset(queryset).publish().fetch()
+    df = local_transforms.evaluate_queryset(queryset, raw)
+
+Only the transforms registered in this module can be evaluated locally;
+evaluating a column containing any other transform raises a RuntimeError.
+
+"""
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import strconv
+
+from . import fingerprint
+from .models import Queryset, Column
+
+TRANSFORMS: Dict[str, Callable[..., pd.Series]] = {}
+
+
+def transform(name: str) -> Callable[[Callable[..., pd.Series]], Callable[..., pd.Series]]:
+    """
+    transform
+
+    Decorator registering a local implementation of the transform name
+    (namespace.function). Implementations take a series indexed by
+    (time, unit) and the transform arguments, and return a series with the
+    same index.
+    """
+    def register(fn: Callable[..., pd.Series]) -> Callable[..., pd.Series]:
+        TRANSFORMS[name] = fn
+        return fn
+    return register
+
+
+@transform("ops.ln")
+def ln(s: pd.Series) -> pd.Series:
+    return np.log1p(s)
+
+
+@transform("bool.gte")
+def gte(s: pd.Series, value: float) -> pd.Series:
+    return (s >= value).astype(int)
+
+
+@transform("missing.replace_na")
+def replace_na(s: pd.Series, replacement: float = 0) -> pd.Series:
+    return s.fillna(replacement)
+
+
+@transform("missing.fill")
+def fill(s: pd.Series, limit_direction: str = "both", limit_area: Optional[str] = None) -> pd.Series:
+    units = s.groupby(level=1)
+
+    if limit_area is None:
+        if limit_direction == "forward":
+            return units.ffill()
+        if limit_direction == "backward":
+            return units.bfill()
+        return units.ffill().groupby(level=1).bfill()
+
+    valid = s.notna().groupby(level=1)
+    after_first = valid.cummax()
+    before_last = valid.transform(lambda v: v[::-1].cummax()[::-1])
+
+    if limit_area == "inside":
+        # As in the transform service, "both" fills forward within the valid range.
+        filled = units.bfill() if limit_direction == "backward" else units.ffill()
+        return s.where(~(after_first & before_last), filled)
+    if limit_area == "outside":
+        return s.where(after_first, units.bfill()).where(before_last, units.ffill())
+
+    raise RuntimeError(f"missing.fill does not support limit_area {limit_area}")
+
+
+@transform("temporal.tlag")
+def tlag(s: pd.Series, time: int) -> pd.Series:
+    return s.groupby(level=1).shift(int(time))
+
+
+@transform("temporal.tlead")
+def tlead(s: pd.Series, time: int) -> pd.Series:
+    return s.groupby(level=1).shift(-int(time))
+
+
+@transform("temporal.moving_average")
+def moving_average(s: pd.Series, time: int) -> pd.Series:
+    return s.groupby(level=1).rolling(int(time), min_periods=0).mean().droplevel(0).reindex(s.index)
+
+
+@transform("temporal.moving_sum")
+def moving_sum(s: pd.Series, time: int) -> pd.Series:
+    return s.groupby(level=1).rolling(int(time), min_periods=0).sum().droplevel(0).reindex(s.index)
+
+
+@transform("temporal.decay")
+def decay(s: pd.Series, halflife: float) -> pd.Series:
+    return 2 ** (-s / halflife)
+
+
+def raw_column_key(operation: Dict[str, Any]) -> str:
+    """
+    raw_column_key
+
+    Name of the raw data column holding the result of a database retrieval
+    operation: loa.column, suffixed with :aggregation if the column is
+    aggregated.
+    """
+    aggregation = operation["arguments"][0]
+    if aggregation == "values":
+        return operation["name"]
+    return f"{operation['name']}:{aggregation}"
+
+
+def _column_operations(column: Any) -> List[Dict[str, Any]]:
+    if isinstance(column, Column):
+        column = column.operations
+    return fingerprint.normalized_definition({"operations": [column]})["operations"][0]
+
+
+def raw_queryset(queryset: Queryset, name: Optional[str] = None) -> Queryset:
+    """
+    raw_queryset
+
+    parameters:
+        queryset (Queryset): Queryset whose raw data is wanted
+        name (str): Name of the raw queryset (default: queryset name suffixed with _raw)
+
+    returns:
+        Queryset: Queryset retrieving every distinct database column of queryset, untransformed
+
+    """
+
+    raw = Queryset(name if name else f"{queryset.name}_raw", queryset.loa)
+
+    keys = {}
+    for column in queryset.operations:
+        database = _column_operations(column)[-1]
+        keys[raw_column_key(database)] = database
+
+    for key, database in keys.items():
+        from_loa, from_column = database["name"].split(".", 1)
+        raw = raw.with_column(Column(key, from_loa, from_column).aggregate(database["arguments"][0]))
+
+    return raw
+
+
+def evaluate_column(column: Any, raw: pd.DataFrame) -> pd.Series:
+    """
+    evaluate_column
+
+    parameters:
+        column (Union[Column, List[Operation]]): Column, or list of column operations
+        raw (pandas.DataFrame): Raw data, with columns named by raw_column_key
+
+    returns:
+        pandas.Series: The transformed column, named by its rename operation
+
+    """
+
+    rename, *transforms, database = _column_operations(column)
+
+    key = raw_column_key(database)
+    if key not in raw.columns:
+        raise RuntimeError(f"raw data does not contain column {key}")
+
+    series = raw[key].sort_index()
+
+    for operation in transforms[::-1]:
+        try:
+            fn = TRANSFORMS[operation["name"]]
+        except KeyError:
+            raise RuntimeError(f"transform {operation['name']} cannot be evaluated locally")
+
+        arguments = [strconv.convert(argument) for argument in operation["arguments"]]
+
+        try:
+            series = fn(series, *arguments)
+        except TypeError:
+            raise RuntimeError(f"transform {operation['name']} cannot be evaluated locally with arguments {arguments}")
+
+    return series.rename(rename["arguments"][0])
+
+
+def evaluate_queryset(queryset: Queryset, raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    evaluate_queryset
+
+    parameters:
+        queryset (Queryset)
+        raw (pandas.DataFrame): Raw data, with columns named by raw_column_key
+
+    returns:
+        pandas.DataFrame: The queryset's data, computed locally
+
+    """
+
+    raw = raw.sort_index()
+
+    return pd.concat([evaluate_column(column, raw) for column in queryset.operations], axis=1)
@@ -1,7 +1,10 @@
 import logging
+from copy import deepcopy
 import requests
 from views_schema import queryset_manager as schema
 from viewser.commands.queryset.operations import QuerysetOperations
+from viewser.commands.queryset.fingerprint import definition_fingerprint
+from viewser.commands.queryset.fetch_memo import FetchMemo, memo_date
 from viewser import settings
 from viewser.settings import defaults
 from . import column, util
@@ -10,6 +13,8 @@ logger = logging.getLogger(__name__)
 queryset_operations = QuerysetOperations(
         settings.QUERYSET_URL,
         defaults.default_error_handler())
+_definition_cache = util.TtlCache(settings.QUERYSET_DEFINITION_CACHE_TTL)
+fetch_memo = FetchMemo(int(settings.QUERYSET_FETCH_MEMO_BUDGET_MB * 2**20))
 
 
 class Queryset(schema.Queryset):
@@ -45,17 +50,103 @@ class Queryset(schema.Queryset):
 
     @classmethod
     def from_storage(cls, name):
+        """
+        from_storage
+        ============
+
+        parameters:
+            name (str): Name of a queryset in the queryset store
+
+        returns:
+            Queryset
+
+        Retrieve a queryset definition from the queryset store. Definitions
+        are cached in-process for QUERYSET_DEFINITION_CACHE_TTL seconds
+        (default 300, 0 disables caching), so repeated calls for the same
+        name do not go back to the store. Definitions published in the
+        meantime are seen once the cached ones expire, or after
+        Queryset.clear_definition_cache().
+        """
+
+        json_ = _definition_cache.get(name)
+
+        if json_ is None:
+            remote_url = settings.config.get("REMOTE_URL")
+
+            response = requests.request(method="GET", url=f'{remote_url}/querysets/querysets/{name}')
+
+            if response.status_code == 404:
+                raise RuntimeError(f'queryset {name} does not appear to be in the queryset store')
 
-        config = settings.config_resolver.ConfigResolver(settings.db.Session)
+            if response.status_code != 200:
+                raise RuntimeError(f'Failed to retrieve queryset {name}: {response.status_code} {response.text}')
 
-        remote_url = config.get("REMOTE_URL")
+            json_ = response.json()
 
-        response = requests.request(method="GET", url=f'{remote_url}/querysets/querysets/{name}')
+            cls._validate_json(json_)
 
-        if response.status_code == 404:
-            raise RuntimeError(f'queryset {name} does not appear to be in the queryset store')
+            _definition_cache.set(name, json_)
+
+        return cls._from_json(json_)
+
+    @classmethod
+    def from_storage_many(cls, names, max_workers=8):
+        """
+        from_storage_many
+        =================
+
+        parameters:
+            names (Iterable[str]): Names of querysets in the queryset store
+            max_workers (int): Number of concurrent requests
+
+        returns:
+            List[Queryset]: Querysets in the same order as names
+
+        Retrieve several queryset definitions concurrently over a shared
+        session, using and populating the same cache as from_storage. Raises
+        a RuntimeError if any queryset is not in the store, and the error of
+        the request if the store could not be reached.
+        """
 
-        json_ = response.json()
+        names = list(names)
+
+        definitions = {}
+        for name in dict.fromkeys(names):
+            if (json_ := _definition_cache.get(name)) is not None:
+                definitions[name] = json_
+
+        uncached = [name for name in dict.fromkeys(names) if name not in definitions]
+
+        if uncached:
+            operations = QuerysetOperations(f'{settings.config.get("REMOTE_URL")}/querysets')
+
+            fetched = operations.definitions(uncached, max_workers=max_workers)
+
+            missing = [name for name, json_ in fetched.items() if json_ is None]
+
+            if missing:
+                raise RuntimeError(f'querysets {missing} do not appear to be in the queryset store')
+
+            for name, json_ in fetched.items():
+                cls._validate_json(json_)
+                _definition_cache.set(name, json_)
+                definitions[name] = json_
+
+        return [cls._from_json(definitions[name]) for name in names]
+
+    @classmethod
+    def clear_definition_cache(cls):
+        """
+        clear_definition_cache
+        ======================
+
+        Forget all queryset definitions cached by from_storage and
+        from_storage_many.
+        """
+        _definition_cache.clear()
+
+    @staticmethod
+    def _validate_json(json_):
 
         allowed_fields = ['name', 'loa', 'description', 'themes', 'operations']
         allowed_namespaces = ['base', 'trf']
@@ -69,6 +160,11 @@ class Queryset(schema.Queryset):
                 if operation['namespace'] not in allowed_namespaces:
                     raise RuntimeError(f"Queryset operation contains unrecognised namespace: {operation['namespace']}")
 
+    @classmethod
+    def _from_json(cls, json_):
+
+        json_ = deepcopy(json_)
+
         qs = cls(name=json_['name'], loa=json_['loa'])
 
         qs.operations = json_['operations']
@@ -194,36 +290,91 @@ class Queryset(schema.Queryset):
         self.themes.append(theme)
         return self
 
+    def fingerprint(self) -> str:
+        """
+        fingerprint
+        ===========
+
+        returns:
+            str
+
+        A hash of the queryset definition, which is identical for querysets
+        that define the same data.
+        """
+        return definition_fingerprint(self.dict())
+
     def publish(self, *args, **kwargs):
         """
         publish
         =======
 
+        parameters:
+            overwrite (bool): Overwrite a stored queryset with the same name (default True)
+            if_changed (bool): Skip publishing if the stored definition is identical (default False)
+
         returns:
             self
 
         Publish the queryset to ViEWS 3, making it available to yourself and
-        other users.
+        other users. Publishing invalidates cached results on the server, so
+        pass if_changed=True when republishing definitions that may not have
+        changed.
         """
         logger.info(f"Publishing queryset {self.name}")
         queryset_operations.publish(self, *args, **kwargs)
         return self
 
-    def fetch(self, *args, **kwargs):
+    def fetch(self, start_date=None, end_date=None):
         """
         fetch
         =====
 
+        parameters:
+            start_date (Optional[int]): first month to include in output
+            end_date (Optional[int]): last month to include in output
+
         returns:
             pandas.DataFrame
 
         Fetch the dataset corresponding to this queryset in its current state.
         Requires a self.push first.
+
+        If memoisation is enabled (see Queryset.memoize), repeated fetches of
+        the same definition and date range within a session are returned from
+        memory.
         """
+        key = ((self.name, self.fingerprint(), memo_date(start_date), memo_date(end_date))
+               if fetch_memo.enabled else None)
+
+        if key is not None and (dataset := fetch_memo.get(key)) is not None:
+            logger.info(f"Returning memoised queryset {self.name}")
+            return dataset
+
         logger.info(f"Fetching queryset {self.name}")
-        dataset = queryset_operations.fetch(self.name, *args, **kwargs)
+        dataset = queryset_operations.fetch(self.name, start_date, end_date)
+
+        if key is not None and not dataset.empty:
+            fetch_memo.put(key, dataset)
+
         return dataset
 
+    @staticmethod
+    def memoize(budget_mb, copy=True):
+        """
+        memoize
+        =======
+
+        parameters:
+            budget_mb (float): Memory budget in MB for memoised datasets. 0 disables memoisation.
+            copy (bool): Return copies of memoised datasets. If False, memoised datasets are shared
+                         between callers, and their values are made read-only.
+
+        Enable, resize or disable in-process memoisation of fetched datasets.
+        Least recently used datasets are evicted when the budget is exceeded.
+        The default budget is set by the QUERYSET_FETCH_MEMO_BUDGET_MB setting.
+        """
+        fetch_memo.configure(int(budget_mb * 2**20), copy=copy)
+
     def fetch_with_drift_detection(self, *args, **kwargs):
         """
         fetch
@@ -234,7 +385,45 @@ class Queryset(schema.Queryset):
 
         Fetch the dataset corresponding to this queryset in its current state.
         Requires a self.push first.
+
+        Arguments are passed on to QuerysetOperations.fetch_with_drift_detection,
+        e.g. precision='float32' to run the drift checks on float32 data, or
+        profile=True to time and measure the memory of each drift check.
         """
         logger.info(f"Fetching queryset {self.name}")
         dataset = queryset_operations.fetch_with_drift_detection(self.name, *args, **kwargs)
         return dataset
+
+    def drift_backtest(self, *args, **kwargs):
+        """
+        drift_backtest
+        =====
+
+        returns:
+            Tuple[pandas.DataFrame, pandas.DataFrame]
+
+        Fetch the dataset corresponding to this queryset, and score every drift
+        check with each month of it in turn as the newest month, to calibrate
+        drift-detection thresholds. Requires a self.push first.
+
+        Arguments are passed on to QuerysetOperations.drift_backtest.
+        """
+        logger.info(f"Backtesting drift detection on queryset {self.name}")
+        return queryset_operations.drift_backtest(self.name, *args, **kwargs)
+
+    def drift_sweep(self, *args, **kwargs):
+        """
+        drift_sweep
+        =====
+
+        returns:
+            Tuple[pandas.DataFrame, pandas.DataFrame]
+
+        Fetch the dataset corresponding to this queryset, and evaluate its
+        drift checks under grids of thresholds and partition lengths.
+        Requires a self.push first.
+
+        Arguments are passed on to QuerysetOperations.drift_sweep.
+        """
+        logger.info(f"Sweeping drift-detection settings on queryset {self.name}")
+        return queryset_operations.drift_sweep(self.name, *args, **kwargs)
@@ -1,5 +1,8 @@
 
+import threading
+import time
 from copy import deepcopy
+from typing import Any, Dict, Hashable, Optional, Tuple
 
 def deepcopy_self(fn):
     """
@@ -12,3 +15,44 @@ def deepcopy_self(fn):
     def inner(self, *args,**kwargs):
         return fn(deepcopy(self), *args, **kwargs)
     return inner
+
+
+class TtlCache():
+    """
+    TtlCache
+    ========
+
+    parameters:
+        ttl (float): Number of seconds an entry stays valid
+
+    Thread-safe in-process cache whose entries expire ttl seconds after they
+    were set. A ttl of 0 or less disables caching.
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            try:
+                expires, value = self._entries[key]
+            except KeyError:
+                return None
+
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -3,9 +3,12 @@ queryset_operations
 ===================
 
 """
+import os
+import re
 import sys
 import time
-from typing import Optional, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Iterable, Any, List, Tuple
 from urllib import parse
 from tqdm import tqdm
 import json
@@ -20,12 +23,25 @@ from IPython.display import clear_output
 
 from . import queryset_list
 from . import drift_detection
+from . import fingerprint
 
 logger = logging.getLogger(__name__)
 
 
 class QuerysetOperations():
 
+    EXPORT_MANIFEST = ".fingerprints.json"
+
+    EXPORT_TEMPLATE = '''"""
+{name}
+
+Exported from the queryset store with viewser queryset export.
+"""
+from viewser import Queryset, Column
+
+queryset = {code}
+'''
+
     def __init__(self,
                  remote_url: str,
                  error_handler: Optional[error_handling.ErrorDumper] = None,
@@ -35,7 +51,8 @@ class QuerysetOperations():
         self._max_retries = max_retries
         self._error_handler = error_handler if error_handler else error_handling.ErrorDumper([])
 
-    def fetch(self, queryset_name: str, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+    def fetch(self, queryset_name: str, start_date: str = None, end_date: str = None,
+              progress: bool = True) -> pd.DataFrame:
         """
         fetch
         =====
@@ -43,6 +60,7 @@ class QuerysetOperations():
         parameters:
             queryset_name (str): Name of the queryset to fetch
             out_file (BufferedWriter): File to write queryset to
+            progress (bool): Print the progress of the retrieval (default). Errors are logged instead if False
 
         returns:
             Maybe[pandas.DataFrame]: Dataframe corresponding to queryset (if query succeeds)
@@ -70,13 +88,17 @@ class QuerysetOperations():
             self._remote_url,
             queryset_name,
             start_date,
-            end_date
+            end_date,
+            progress,
             )
 
         return f
 
     def fetch_with_drift_detection(self, queryset_name: str, start_date: str, end_date: str, drift_config_dict:
-                                   Optional[Dict] = None, self_test: Optional[bool] = False):
+                                   Optional[Dict] = None, self_test: Optional[bool] = False,
+                                   executor: str = 'serial', max_workers: Optional[int] = None,
+                                   incremental: bool = False, chunk_size: Optional[int] = None,
+                                   precision: str = 'float64', profile: bool = False):
         """
         fetch_with_drift_detection
         =====
@@ -86,30 +108,138 @@ class QuerysetOperations():
             start_date: first month to include in output
             end_data: last month to include in output
             drift_config_dict: dictionary specifying which drift detection parameters to use
+            executor: how to run the drift checks - 'serial', 'threads' or 'processes'. The self-test checks run on
+                      threads unless executor is 'serial'
+            max_workers: number of threads or processes running the drift checks
+            incremental: run the drift checks on the drift state persisted for the queryset, summarising only
+                         months not seen in earlier runs
+            chunk_size: run the drift checks out of core, on a memory-mapped copy of the data stored in blocks of
+                        chunk_size features
+            precision: float type of the data examined by the drift checks - 'float64' or 'float32'
+            profile: measure the wall time, CPU time and peak memory of the conversion of the data and of each
+                     drift check, returned as the profile of the AlertReport
 
         returns:
-            Dataframe corresponding to queryset (if query succeeds)
+            Dataframe corresponding to queryset (if query succeeds), and the AlertReport of the drift checks
+
+        Incremental and chunked drift detection run the checks serially, and incremental drift detection in
+        float64: passing an executor, max_workers or precision that they would ignore raises a RuntimeError.
 
         """
 
+        if incremental or chunk_size is not None:
+            mode = 'incremental' if incremental else 'chunked'
+
+            if executor != 'serial' or max_workers is not None:
+                raise RuntimeError(f'{mode} drift detection runs the checks serially: '
+                                   f'executor {executor} and max_workers {max_workers} are not supported')
+
+            if incremental and precision != 'float64':
+                raise RuntimeError(f'incremental drift detection runs in float64: precision {precision} '
+                                   f'is not supported')
+
         self_test_data = None
 
         if self_test:
-            try:
-                self_test_data = self.fetch("drift_detection_self_test", start_date, end_date)
-            except:
-                print(f'Attempt to fetch elf test qs failed. Self test queryset MUST be defined outside viewser')
-                raise RuntimeError
 
-        f = self.fetch(queryset_name, start_date, end_date)
+            # fetch the self-test data while the queryset itself is being fetched, quietly so that its progress
+            # does not overwrite that of the queryset
+
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                self_test_future = pool.submit(self.fetch, "drift_detection_self_test", start_date, end_date,
+                                               progress=False)
 
-        input_gate = drift_detection.InputGate(f, drift_config_dict=drift_config_dict, self_test=self_test,
-                                               self_test_data=self_test_data)
+                f = self.fetch(queryset_name, start_date, end_date)
 
-        alerts = input_gate.assemble_alerts()
+                try:
+                    self_test_data = self_test_future.result()
+                except:
+                    print(f'Attempt to fetch elf test qs failed. Self test queryset MUST be defined outside viewser')
+                    raise RuntimeError
+        else:
+            f = self.fetch(queryset_name, start_date, end_date)
+
+        if incremental:
+            definition = self.definition(queryset_name)
+
+            if definition is None:
+                raise RuntimeError(f'queryset {queryset_name} has no stored definition to key its drift state by')
+
+            input_gate = drift_detection.IncrementalInputGate(f, fingerprint.definition_fingerprint(definition),
+                                                              drift_config_dict=drift_config_dict,
+                                                              self_test=self_test, self_test_data=self_test_data,
+                                                              profile=profile)
+        elif chunk_size is not None:
+            input_gate = drift_detection.ChunkedInputGate(f, drift_config_dict=drift_config_dict,
+                                                          self_test=self_test, self_test_data=self_test_data,
+                                                          chunk_size=chunk_size, precision=precision,
+                                                          profile=profile)
+        else:
+            input_gate = drift_detection.InputGate(f, drift_config_dict=drift_config_dict, self_test=self_test,
+                                                   self_test_data=self_test_data, executor=executor,
+                                                   max_workers=max_workers, precision=precision,
+                                                   profile=profile)
+
+        try:
+            alerts = input_gate.assemble_alerts()
+        finally:
+            if isinstance(input_gate, drift_detection.ChunkedInputGate):
+                input_gate.close()
 
         return f, alerts
 
+    def drift_backtest(self, queryset_name: str, start_date: str, end_date: str,
+                       drift_config_dict: Optional[Dict] = None, start: Optional[int] = None,
+                       end: Optional[int] = None):
+        """
+        drift_backtest
+        =====
+
+        parameters:
+            queryset_name (str): Name of the queryset to fetch
+            start_date: first month to include in output
+            end_data: last month to include in output
+            drift_config_dict: dictionary specifying which drift detection parameters to use
+            start, end: first and last month to run the drift checks as the newest month for (default: all)
+
+        returns:
+            Dataframe corresponding to queryset (if query succeeds), and a dataframe of the score of every drift
+            check with each month from start to end as the newest month (see BacktestInputGate.backtest)
+
+        """
+
+        f = self.fetch(queryset_name, start_date, end_date)
+
+        return f, drift_detection.BacktestInputGate(f, drift_config_dict=drift_config_dict).backtest(start, end)
+
+    def drift_sweep(self, queryset_name: str, start_date: str, end_date: str,
+                    thresholds: Optional[Dict[str, Iterable[float]]] = None,
+                    test_partition_lengths: Optional[Iterable[int]] = None,
+                    standard_partition_lengths: Optional[Iterable[int]] = None,
+                    drift_config_dict: Optional[Dict] = None):
+        """
+        drift_sweep
+        =====
+
+        parameters:
+            queryset_name (str): Name of the queryset to fetch
+            start_date: first month to include in output
+            end_data: last month to include in output
+            thresholds: grids of thresholds to evaluate, keyed by test function
+            test_partition_lengths, standard_partition_lengths: partition lengths to evaluate
+            drift_config_dict: dictionary specifying which drift checks to run, and their other parameters
+
+        returns:
+            Dataframe corresponding to queryset (if query succeeds), and a dataframe of the outcome of every drift
+            check under every combination of thresholds and partition lengths (see InputGate.sweep)
+
+        """
+
+        f = self.fetch(queryset_name, start_date, end_date)
+
+        return f, drift_detection.InputGate(f, drift_config_dict=drift_config_dict).sweep(
+            thresholds, test_partition_lengths, standard_partition_lengths)
+
     def list(self):
         """
         list
@@ -200,7 +330,263 @@ class QuerysetOperations():
 
         return self.qs_json_to_code(json_)
 
-    def publish(self, queryset: queryset_schema.Queryset, overwrite: bool = True) -> requests.Response:
+    def definition(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        definition
+        ==========
+
+        parameters:
+            name (str): Name of the queryset to retrieve
+
+        returns:
+            Optional[Dict[str, Any]]: Stored json definition, None if the queryset is not in the store
+
+        Raises requests.RequestException if the store cannot be reached, and
+        RuntimeError on error responses other than 404.
+        """
+
+        return self._definition(requests, name)
+
+    def definitions(self, names: Iterable[str], max_workers: int = 8) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        definitions
+        ===========
+
+        parameters:
+            names (Iterable[str]): Names of querysets to retrieve
+            max_workers (int): Number of concurrent requests
+
+        returns:
+            Dict[str, Optional[Dict[str, Any]]]: Stored json definition per name, None if not in the store
+
+        Retrieve several queryset definitions concurrently over a single pooled
+        connection. Errors other than a queryset not being in the store are
+        raised, as by definition.
+        """
+
+        definitions, errors = self.definitions_with_errors(names, max_workers=max_workers)
+
+        for error in errors.values():
+            raise error
+
+        return definitions
+
+    def definitions_with_errors(self,
+                                names: Iterable[str],
+                                max_workers: int = 8,
+                                ) -> Tuple[Dict[str, Optional[Dict[str, Any]]], Dict[str, Exception]]:
+        """
+        definitions_with_errors
+        =======================
+
+        parameters:
+            names (Iterable[str]): Names of querysets to retrieve
+            max_workers (int): Number of concurrent requests
+
+        returns:
+            Tuple[Dict[str, Optional[Dict[str, Any]]], Dict[str, Exception]]: Stored json definition per name
+                retrieved, None if not in the store, and the error per name that could not be retrieved
+
+        As definitions, but a queryset whose definition cannot be retrieved
+        does not fail the others: its error is returned instead, so that
+        callers working through many querysets can report it and carry on.
+        """
+
+        names: List[str] = list(names)
+
+        def guarded_definition(session, name):
+            try:
+                return self._definition(session, name), None
+            except (requests.RequestException, RuntimeError, ValueError) as e:
+                logger.warning(f"Failed to retrieve stored definition of queryset {name}: {e}")
+                return None, e
+
+        with self._pooled_session(max_workers) as session:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                outcomes = list(executor.map(lambda name: guarded_definition(session, name), names))
+
+        definitions = {name: definition for name, (definition, error) in zip(names, outcomes) if error is None}
+        errors = {name: error for name, (_, error) in zip(names, outcomes) if error is not None}
+
+        return definitions, errors
+
+    def export(self,
+               names: Iterable[str],
+               out_dir: str,
+               max_workers: int = 8,
+               prune: bool = False) -> Dict[str, List[str]]:
+        """
+        export
+        ======
+
+        parameters:
+            names (Iterable[str]): Names of querysets to export
+            out_dir (str): Directory to write one python module per queryset to
+            max_workers (int): Number of concurrent requests
+            prune (bool): Remove previously exported modules for querysets not in names
+
+        returns:
+            Dict[str, List[str]]: Names of querysets that were written, unchanged, missing, failed and removed
+
+        Fetch queryset definitions concurrently and write each, rendered with
+        qs_json_to_code, to a module in out_dir. The fingerprints of exported
+        definitions are kept in a manifest in out_dir, so that only modules
+        whose definitions have changed since the last export are rewritten.
+        Querysets whose definitions cannot be retrieved or rendered, or whose
+        module names would collide with those of other querysets (e.g. a-b
+        and a.b), are reported as failed and not written, and the others are
+        exported as usual. The manifest is saved even if the export is
+        interrupted, so that it records the modules already written.
+        """
+
+        os.makedirs(out_dir, exist_ok=True)
+
+        manifest_path = os.path.join(out_dir, self.EXPORT_MANIFEST)
+
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+
+        names = list(names)
+
+        definitions, errors = self.definitions_with_errors(names, max_workers=max_workers)
+
+        result = {"written": [], "unchanged": [], "missing": [], "failed": list(errors.keys()), "removed": []}
+
+        try:
+            if prune:
+                exported_modules = {self.export_module_name(name) for name in names}
+
+                for name in sorted(set(manifest) - set(names)):
+                    if self.export_module_name(name) not in exported_modules:
+                        try:
+                            os.remove(os.path.join(out_dir, self.export_module_name(name)))
+                        except FileNotFoundError:
+                            pass
+                    del manifest[name]
+                    result["removed"].append(name)
+
+            module_owners = {}
+            for name in set(manifest) | set(names):
+                module_owners.setdefault(self.export_module_name(name), []).append(name)
+
+            for name, definition in definitions.items():
+                if definition is None:
+                    result["missing"].append(name)
+                    continue
+
+                module_name = self.export_module_name(name)
+
+                if len(module_owners[module_name]) > 1:
+                    others = sorted(set(module_owners[module_name]) - {name})
+                    logger.error(f"Queryset {name} would be exported to the same module {module_name} "
+                                 f"as {', '.join(others)}")
+                    result["failed"].append(name)
+                    continue
+
+                definition_fingerprint = fingerprint.definition_fingerprint(definition)
+                path = os.path.join(out_dir, module_name)
+
+                if manifest.get(name) == definition_fingerprint and os.path.exists(path):
+                    result["unchanged"].append(name)
+                    continue
+
+                try:
+                    code = self.qs_json_to_code(definition)
+                except Exception as e:
+                    logger.error(f"Failed to render queryset {name} as code: {e}")
+                    result["failed"].append(name)
+                    continue
+
+                with open(path, "w") as f:
+                    f.write(self.EXPORT_TEMPLATE.format(name=name, code=code))
+
+                manifest[name] = definition_fingerprint
+                result["written"].append(name)
+
+        finally:
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+
+        return result
+
+    @staticmethod
+    def export_module_name(name: str) -> str:
+        return re.sub(r"\W", "_", name) + ".py"
+
+    def publish(self,
+                queryset: queryset_schema.Queryset,
+                overwrite: bool = True,
+                if_changed: bool = False) -> Optional[requests.Response]:
+        """
+        publish
+        =======
+
+        parameters:
+            queryset (views_schema.queryset_manager.Queryset): Queryset to publish
+            overwrite (bool): Overwrite a stored queryset with the same name
+            if_changed (bool): Only publish if the stored definition differs from this one
+
+        returns:
+            Optional[requests.Response]: Response from the queryset store, or None if publishing was skipped
+
+        Publishing an unchanged definition invalidates the server-side result
+        cache, so if_changed=True first compares the fingerprint of the stored
+        definition with that of the queryset, and skips the POST if they match.
+        If the stored definition cannot be retrieved (other than because the
+        queryset is not in the store), the error is raised and nothing is
+        published.
+        """
+
+        return self._publish(requests, queryset, overwrite, if_changed)
+
+    def publish_many(self,
+                     querysets: Iterable[queryset_schema.Queryset],
+                     overwrite: bool = True,
+                     if_changed: bool = False,
+                     max_workers: int = 8) -> Dict[str, Optional[requests.Response]]:
+        """
+        publish_many
+        ============
+
+        parameters:
+            querysets (Iterable[views_schema.queryset_manager.Queryset]): Querysets to publish
+            overwrite (bool): Overwrite stored querysets with the same names
+            if_changed (bool): Only publish querysets whose stored definitions differ
+            max_workers (int): Number of concurrent requests
+
+        returns:
+            Dict[str, Optional[requests.Response]]: Response per queryset name, None where publishing was skipped
+
+        Publish several querysets concurrently over a single pooled connection.
+        """
+
+        querysets = list(querysets)
+
+        with self._pooled_session(max_workers) as session:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                responses = list(executor.map(
+                    lambda queryset: self._publish(session, queryset, overwrite, if_changed), querysets))
+
+        return {queryset.name: response for queryset, response in zip(querysets, responses)}
+
+    def _publish(self,
+                 session: Any,
+                 queryset: queryset_schema.Queryset,
+                 overwrite: bool,
+                 if_changed: bool) -> Optional[requests.Response]:
+
+        definition = queryset.dict()
+
+        if if_changed:
+            stored = self._definition(session, queryset.name)
+
+            if (stored is not None and
+                    fingerprint.definition_fingerprint(stored) == fingerprint.definition_fingerprint(definition)):
+                logger.info(f"Queryset {queryset.name} is unchanged, skipping publish")
+                return None
 
         method = "POST"
 
@@ -208,14 +594,54 @@ class QuerysetOperations():
 
         request_kwargs = {"headers": {}}
 
-        request_kwargs.update({"data": json.dumps(queryset.dict())})
+        request_kwargs.update({"data": json.dumps(definition)})
 
         request_kwargs["headers"].update({"Content-Type": "application/json"})
 
-        response = requests.request(method=method, url=url, **request_kwargs)
+        response = session.request(method=method, url=url, **request_kwargs)
 
         return response
 
+    def _definition(self, session: Any, name: str) -> Optional[Dict[str, Any]]:
+        """
+        _definition
+        ===========
+
+        Fetch the stored json definition of a queryset, using session (either
+        the requests module or a requests.Session). Returns None only if the
+        queryset is not in the store (404). Transport errors are raised as
+        they are, and other error responses as a RuntimeError, so that callers
+        do not mistake an unreachable store for a missing queryset.
+        """
+
+        response = session.request(method="GET", url=f'{self._remote_url}/querysets/{name}')
+
+        if response.status_code == 404:
+            return None
+
+        if response.status_code != 200:
+            raise RuntimeError(f'Failed to retrieve stored definition of queryset {name}: '
+                               f'{response.status_code} {response.text}')
+
+        return response.json()
+
+    @staticmethod
+    def _pooled_session(pool_size: int) -> requests.Session:
+        """
+        _pooled_session
+        ===============
+
+        Returns a requests.Session whose connection pool can serve pool_size
+        concurrent requests to the same host.
+        """
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        return session
+
     def delete(self, name: str) -> requests.Response:
 
         method = "DELETE"
@@ -226,7 +652,8 @@ class QuerysetOperations():
 
         return response
 
-    def _fetch(self, max_retries: int, base_url: str, name: str, start_date: int, end_date: int) -> pd.DataFrame:
+    def _fetch(self, max_retries: int, base_url: str, name: str, start_date: int, end_date: int,
+               progress: bool = True) -> pd.DataFrame:
         """
         _fetch
         ======
@@ -234,11 +661,15 @@ class QuerysetOperations():
         Args:
             base_url(str)
             name(str)
+            progress(bool): print progress, or only log errors
         Returns:
             pd.DataFrame
         """
 
         def overprint(message_string, last_line_length, end):
+            if not progress:
+                return 0
+
             space = ' '
             new_line_length = len(message_string)
             pad = max(0, last_line_length - new_line_length)
@@ -269,7 +700,7 @@ class QuerysetOperations():
             response = requests.get(url, stream=True)
             total_size = int(response.headers.get("content-length", 0))
 
-            if total_size > 1e6:
+            if total_size > 1e6 and progress:
                 with tqdm(total=total_size, unit="B", unit_scale=True) as progress_bar:
                     for segment in response.iter_content(block_size):
                         progress_bar.update(len(segment))
@@ -293,13 +724,18 @@ class QuerysetOperations():
                 last_line_length = overprint(message_string, last_line_length, end="\r")
 
                 if 'failed' in message:
+                    if not progress:
+                        logger.error(f"Retrieval of queryset {name} failed: {message}")
                     failed = True
                     data = pd.DataFrame()
 
             if retries > max_retries:
 
-                clear_output(wait=True)
-                print(f'Max attempts ({max_retries}) to retrieve {name} exceeded: aborting retrieval', end="\r")
+                if progress:
+                    clear_output(wait=True)
+                    print(f'Max attempts ({max_retries}) to retrieve {name} exceeded: aborting retrieval', end="\r")
+                else:
+                    logger.error(f'Max attempts ({max_retries}) to retrieve {name} exceeded: aborting retrieval')
 
                 failed = True
                 data = pd.DataFrame()
@@ -0,0 +1,185 @@
+"""
+planner
+=======
+
+Client-side query planning for querysets.
+
+Each column of a queryset is a chain of operations: a rename, a number of
+transforms and a database retrieval, stored in reverse order of execution.
+Columns frequently share the same retrieval and the same leading transforms
+(e.g. ln(ged_sb) with different temporal lags on top), which are currently
+computed once per column. The planner compiles the columns into a prefix tree
+(a DAG in which every shared prefix is a single node), which exposes the
+redundancy and can be emitted as a deduplicated plan.
+
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import pydantic
+
+from . import fingerprint
+
+
+class PlanNode(pydantic.BaseModel):
+    """
+    A single operation in a deduplicated plan. The node is applied to the
+    output of its parent, or is a database retrieval if it has no parent.
+    """
+    id: int
+    parent: Optional[int] = None
+    namespace: str
+    name: str
+    arguments: List[str]
+    columns: List[str]
+
+    def describe(self) -> str:
+        arguments = ",".join(self.arguments)
+        if self.namespace == "base":
+            return f"{self.name}[{arguments}]"
+        return f"{self.name}({arguments})"
+
+
+class SharedPrefix(pydantic.BaseModel):
+    """
+    A chain of operations that is computed identically for several columns.
+    """
+    columns: List[str]
+    operations: List[str]
+    redundant_operations: int
+
+
+class QueryPlan(pydantic.BaseModel):
+    """
+    QueryPlan
+    =========
+
+    A deduplicated execution plan for a queryset. Build with
+    QueryPlan.from_queryset or QueryPlan.from_definition.
+    """
+    name: str
+    loa: str
+    nodes: List[PlanNode]
+    outputs: Dict[str, int]
+    n_operations: int
+
+    @classmethod
+    def from_queryset(cls, queryset: Any) -> "QueryPlan":
+        return cls.from_definition(queryset.dict())
+
+    @classmethod
+    def from_definition(cls, definition: Dict[str, Any]) -> "QueryPlan":
+        """
+        from_definition
+
+        parameters:
+            definition (Dict[str, Any]): Queryset json, as returned by the queryset store
+
+        returns:
+            QueryPlan
+
+        """
+
+        definition = fingerprint.normalized_definition(definition)
+
+        nodes: List[PlanNode] = []
+        node_ids: Dict[Tuple[Optional[int], str, str, Tuple[str, ...]], int] = {}
+        outputs: Dict[str, int] = {}
+        n_operations = 0
+
+        for column in definition["operations"]:
+            rename, *transforms, database = column
+            column_name = rename["arguments"][0]
+
+            parent = None
+            for operation in [database, *transforms[::-1]]:
+                n_operations += 1
+
+                key = (parent, operation["namespace"], operation["name"], tuple(operation["arguments"]))
+
+                if key not in node_ids:
+                    node_ids[key] = len(nodes)
+                    nodes.append(PlanNode(id=len(nodes), parent=parent, columns=[], **operation))
+
+                parent = node_ids[key]
+                nodes[parent].columns.append(column_name)
+
+            outputs[column_name] = parent
+
+        return cls(
+                name=definition["name"],
+                loa=definition["loa"],
+                nodes=nodes,
+                outputs=outputs,
+                n_operations=n_operations)
+
+    @property
+    def n_unique_operations(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def n_redundant_operations(self) -> int:
+        return self.n_operations - self.n_unique_operations
+
+    @property
+    def n_retrievals(self) -> int:
+        return sum(len(node.columns) for node in self.nodes if node.parent is None)
+
+    @property
+    def n_unique_retrievals(self) -> int:
+        return len([node for node in self.nodes if node.parent is None])
+
+    def chain(self, node_id: int) -> List[PlanNode]:
+        """
+        chain
+
+        Returns the operations leading up to and including node_id, in
+        order of execution.
+        """
+        chain = []
+        current: Optional[int] = node_id
+        while current is not None:
+            chain.append(self.nodes[current])
+            current = self.nodes[current].parent
+        return chain[::-1]
+
+    def shared_prefixes(self) -> List[SharedPrefix]:
+        """
+        shared_prefixes
+
+        Returns the longest chains of operations shared by more than one
+        column, i.e. shared nodes none of whose children are shared by the
+        same set of columns.
+
+        A prefix can extend a shorter one shared by more columns (e.g.
+        ln(ged_sb) shared by three columns, and tlag(ln(ged_sb)) by two of
+        them). The redundant operations of each prefix only count the
+        operations it adds to the longest such shorter prefix, so that every
+        redundant operation is counted once, and the redundant operations of
+        all prefixes sum to n_redundant_operations.
+        """
+
+        children: Dict[int, List[PlanNode]] = {}
+        for node in self.nodes:
+            if node.parent is not None:
+                children.setdefault(node.parent, []).append(node)
+
+        shared = {node.id for node in self.nodes
+                  if len(node.columns) >= 2 and
+                  not any(len(child.columns) == len(node.columns) for child in children.get(node.id, []))}
+
+        prefixes = []
+        for node_id in sorted(shared):
+            node = self.nodes[node_id]
+            chain = self.chain(node_id)
+
+            added = 0
+            for step in chain[::-1]:
+                if step.id != node_id and step.id in shared:
+                    break
+                added += 1
+
+            prefixes.append(SharedPrefix(
+                columns=node.columns,
+                operations=[step.describe() for step in chain],
+                redundant_operations=added * (len(node.columns) - 1)))
+
+        return sorted(prefixes, key=lambda prefix: prefix.redundant_operations, reverse=True)
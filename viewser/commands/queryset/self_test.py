@@ -1,5 +1,5 @@
 import numpy as np
-from views_tensor_utilities import mappings
+from .drift_statistics import time_space_codes
 
 #from .models import Queryset, Column
 
@@ -37,6 +37,11 @@ from views_tensor_utilities import mappings
 #    return qs_self_test.publish().fetch(start_date=start_date, end_date=end_date)
 
 
+# seed of the random number generators of the perturbations, unless overridden by a 'seed' in their kwargs
+
+SELF_TEST_SEED = 0
+
+
 def perturbation_partitioner(tensor, index, test_partition_length, standard_partition_length):
     """
     partitioner
@@ -47,7 +52,7 @@ def perturbation_partitioner(tensor, index, test_partition_length, standard_part
 
     """
 
-    times = mappings.TimeUnits.from_pandas(index)
+    _, _, times, _ = time_space_codes(index)
 
     tend = times.times[-1]
     tboundary = tend - test_partition_length
@@ -65,25 +70,66 @@ def perturbation_partitioner(tensor, index, test_partition_length, standard_part
     return standard_data, test_data
 
 
-def get_random_indices(array, fraction=0.01):
+def get_rng(kwargs):
+    """
+    Random number generator of a perturbation, seeded with kwargs['seed'] if given, SELF_TEST_SEED otherwise, so
+    that self tests are reproducible
 
     """
-    Draw a random selection of indices pointing to locations in the input array
+
+    return np.random.default_rng(kwargs.get('seed', SELF_TEST_SEED))
+
+
+def get_random_indices(array, fraction=0.01, rng=None):
 
     """
+    Draw a random selection of indices pointing to locations in the input array, with replacement, using the
+    generator rng (default: one seeded with SELF_TEST_SEED). All coordinates are drawn in one call per axis.
+
+    """
+
+    if rng is None:
+        rng = np.random.default_rng(SELF_TEST_SEED)
 
     nsample = int(fraction*array.size)
-    ncoord = len(array.shape)
 
-    coords = []
-    for icoord in range(ncoord):
-        coord = []
-        for sample in range(nsample):
-            co = np.random.choice(array.shape[icoord])
-            coord.append(co)
-        coords.append(coord)
+    return tuple(rng.integers(0, length, size=nsample) for length in array.shape)
+
+
+def assign(undo, array, indices, what):
+
+    """
+    Set array[indices] to what in place, appending the overwritten values to the undo list
+
+    """
+
+    undo.append((array, indices, np.array(array[indices], copy=True)))
+
+    array[indices] = what
+
+
+def restore(undo):
+
+    """
+    Write back the values recorded in an undo list, latest first
+
+    """
+
+    for array, indices, values in reversed(undo):
+        array[indices] = values
+
+
+def zero_non_finite(undo, array):
+
+    """
+    Set the NaN and infinite (including does-not-exist) entries of array to 0
+
+    """
+
+    assign(undo, array, np.nonzero(~np.isfinite(array)), 0.0)
+
 
-    return tuple(coords)
+# Each perturb_ function perturbs its data in place and returns the undo list restoring it
 
 
 def perturb_global(data, what, **kwargs):
@@ -94,31 +140,25 @@ def perturb_global(data, what, **kwargs):
 
     fraction = kwargs['self_test']
 
-    data_copy = data.copy()
+    undo = []
 
-    indices = get_random_indices(data_copy, fraction=fraction)
+    assign(undo, data, get_random_indices(data, fraction=fraction, rng=get_rng(kwargs)), what)
 
-    data_copy[indices] = what
-
-    return data_copy
+    return undo
 
 
 def perturb_global_zero_fracs(data, **kwargs):
 
     what = 0.0
 
-    perturbed_data = perturb_global(data, what, **kwargs)
-
-    return perturbed_data
+    return perturb_global(data, what, **kwargs)
 
 
 def perturb_global_nan_fracs(data, **kwargs):
 
     what = np.nan
 
-    perturbed_data = perturb_global(data, what, **kwargs)
-
-    return perturbed_data
+    return perturb_global(data, what, **kwargs)
 
 
 def perturb_time(data, what, **kwargs):
@@ -130,33 +170,28 @@ def perturb_time(data, what, **kwargs):
 
     fraction = kwargs['self_test']
 
-    data_copy = data.copy()
-
     itime = int(data.shape[0] / 2)
 
-    indices = get_random_indices(data_copy[itime, :, :], fraction=fraction)
+    undo = []
 
-    data_copy[itime, :, :][indices] = what
+    assign(undo, data[itime, :, :], get_random_indices(data[itime, :, :], fraction=fraction, rng=get_rng(kwargs)),
+           what)
 
-    return data_copy
+    return undo
 
 
 def perturb_time_zero_fracs(data, **kwargs):
 
     what = 0.0
 
-    perturbed_data = perturb_time(data, what, **kwargs)
-
-    return perturbed_data
+    return perturb_time(data, what, **kwargs)
 
 
 def perturb_time_nan_fracs(data, **kwargs):
 
     what = np.nan
 
-    perturbed_data = perturb_time(data, what, **kwargs)
-
-    return perturbed_data
+    return perturb_time(data, what, **kwargs)
 
 
 def perturb_space(data, what, **kwargs):
@@ -167,33 +202,28 @@ def perturb_space(data, what, **kwargs):
 
     fraction = kwargs['self_test']
 
-    data_copy = data.copy()
-
     ispace = int(data.shape[1]/2)
 
-    indices = get_random_indices(data_copy[:, ispace, :], fraction=fraction)
+    undo = []
 
-    data_copy[:, ispace, :][indices] = what
+    assign(undo, data[:, ispace, :], get_random_indices(data[:, ispace, :], fraction=fraction, rng=get_rng(kwargs)),
+           what)
 
-    return data_copy
+    return undo
 
 
 def perturb_space_zero_fracs(data, **kwargs):
 
     what = 0.0
 
-    perturbed_data = perturb_space(data, what, **kwargs)
-
-    return perturbed_data
+    return perturb_space(data, what, **kwargs)
 
 
 def perturb_space_nan_fracs(data, **kwargs):
 
     what = np.nan
 
-    perturbed_data = perturb_space(data, what, **kwargs)
-
-    return perturbed_data
+    return perturb_space(data, what, **kwargs)
 
 
 def perturb_feature(data, what, **kwargs):
@@ -204,33 +234,28 @@ def perturb_feature(data, what, **kwargs):
 
     fraction = kwargs['self_test']
 
-    data_copy = data.copy()
-
     ifeature = int(data.shape[2]/2)
 
-    indices = get_random_indices(data_copy[:, :, ifeature], fraction=fraction)
+    undo = []
 
-    data_copy[:, :, ifeature][indices] = what
+    assign(undo, data[:, :, ifeature],
+           get_random_indices(data[:, :, ifeature], fraction=fraction, rng=get_rng(kwargs)), what)
 
-    return data_copy
+    return undo
 
 
 def perturb_feature_zero_fracs(data, **kwargs):
 
     what = 0.0
 
-    perturbed_data = perturb_feature(data, what, **kwargs)
-
-    return perturbed_data
+    return perturb_feature(data, what, **kwargs)
 
 
 def perturb_feature_nan_fracs(data, **kwargs):
 
     what = np.nan
 
-    perturbed_data = perturb_feature(data, what, **kwargs)
-
-    return perturbed_data
+    return perturb_feature(data, what, **kwargs)
 
 
 def perturb_delta(data, what, whatever, **kwargs):
@@ -246,21 +271,17 @@ def perturb_delta(data, what, whatever, **kwargs):
     standard_partition_length = kwargs['standard_partition_length']
     fraction = kwargs['self_test']
 
-    data_copy = data.copy()
-
-    standard, test = perturbation_partitioner(data_copy, index, test_partition_length, standard_partition_length)
+    rng = get_rng(kwargs)
 
-    indices = get_random_indices(test, fraction=fraction)
+    standard, test = perturbation_partitioner(data, index, test_partition_length, standard_partition_length)
 
-    test[indices] = what
+    undo = []
 
-    indices = get_random_indices(standard, fraction=fraction)
+    assign(undo, test, get_random_indices(test, fraction=fraction, rng=rng), what)
 
-    standard[indices] = whatever
+    assign(undo, standard, get_random_indices(standard, fraction=fraction, rng=rng), whatever)
 
-    data_copy = np.concatenate((standard, test), axis=0)
-
-    return data_copy
+    return undo
 
 
 def perturb_delta_zeroes(data, **kwargs):
@@ -269,9 +290,7 @@ def perturb_delta_zeroes(data, **kwargs):
 
     whatever = 1.0
 
-    perturbed_data = perturb_delta(data, what, whatever, **kwargs)
-
-    return perturbed_data
+    return perturb_delta(data, what, whatever, **kwargs)
 
 
 def perturb_delta_completeness(data, **kwargs):
@@ -280,9 +299,7 @@ def perturb_delta_completeness(data, **kwargs):
 
     whatever = 1.0
 
-    perturbed_data = perturb_delta(data, what, whatever, **kwargs)
-
-    return perturbed_data
+    return perturb_delta(data, what, whatever, **kwargs)
 
 
 def perturb_extreme_values(data, **kwargs):
@@ -296,9 +313,7 @@ def perturb_extreme_values(data, **kwargs):
     standard_partition_length = kwargs['standard_partition_length']
     fraction = kwargs['self_test']
 
-    data_copy = data.copy()
-
-    standard, test = perturbation_partitioner(data_copy, index, test_partition_length, standard_partition_length)
+    standard, test = perturbation_partitioner(data, index, test_partition_length, standard_partition_length)
 
     itime = int(test.shape[0]/2)
 
@@ -306,18 +321,18 @@ def perturb_extreme_values(data, **kwargs):
 
     ifeature = 0
 
-    standard = np.nan_to_num(standard, nan=0.0, posinf=0.0, neginf=0.0)
-    test = np.nan_to_num(test, nan=0.0, posinf=0.0, neginf=0.0)
+    undo = []
+
+    zero_non_finite(undo, standard)
+    zero_non_finite(undo, test)
 
     test_mean = np.nanmean(test[:, :, ifeature])
 
     test_std = np.nanstd(test[:, :, ifeature])
 
-    test[itime, ispace, ifeature] = test_mean + (1 + fraction)*test_std
+    assign(undo, test, (itime, ispace, ifeature), test_mean + (1 + fraction)*test_std)
 
-    data_copy = np.concatenate((standard, test), axis=0)
-
-    return data_copy
+    return undo
 
 
 def perturb_ks_drift(data, **kwargs):
@@ -331,23 +346,22 @@ def perturb_ks_drift(data, **kwargs):
     test_partition_length = kwargs['test_partition_length']
     standard_partition_length = kwargs['standard_partition_length']
 
-    data_copy = data.copy()
-
-    standard, test = perturbation_partitioner(data_copy, index, test_partition_length, standard_partition_length)
+    standard, test = perturbation_partitioner(data, index, test_partition_length, standard_partition_length)
 
     ifeature = 0
 
-    test = np.nan_to_num(test, nan=0.0, posinf=0.0, neginf=0.0)
+    undo = []
+
+    zero_non_finite(undo, test)
 
     test_mean = np.mean(test[:, :, ifeature])
 
     test_std = np.std(test[:, :, ifeature])
 
-    test[:, :, ifeature] = np.random.normal(test_mean, test_std, (test.shape[0], test.shape[1]))
-
-    data_copy = np.concatenate((standard, test), axis=0)
+    assign(undo, test, (slice(None), slice(None), ifeature),
+           get_rng(kwargs).normal(test_mean, test_std, (test.shape[0], test.shape[1])))
 
-    return data_copy
+    return undo
 
 
 def perturb_ecod_drift(data, **kwargs):
@@ -360,16 +374,10 @@ def perturb_ecod_drift(data, **kwargs):
     test_partition_length = kwargs['test_partition_length']
     standard_partition_length = kwargs['standard_partition_length']
 
-    data_copy = data.copy()
-
-    standard, test = perturbation_partitioner(data_copy, index, test_partition_length, standard_partition_length)
-
-    f0copy = test[:, :, 0].copy()
-
-    test[:, :, 0] = test[:, :, -1]
-    test[:, :, -1] = f0copy
+    standard, test = perturbation_partitioner(data, index, test_partition_length, standard_partition_length)
 
-    data_copy = np.concatenate((standard, test), axis=0)
+    undo = []
 
-    return data_copy
+    assign(undo, test, (slice(None), slice(None), [0, -1]), test[:, :, [-1, 0]])
 
+    return undo
@@ -16,6 +16,10 @@ QUERYSET_URL = os.path.join(REMOTE_URL, "querysets")
 
 QUERYSET_MAX_RETRIES = config.get("QUERYSET_MAX_RETRIES")
 
+QUERYSET_DEFINITION_CACHE_TTL = config.get("QUERYSET_DEFINITION_CACHE_TTL")
+
+QUERYSET_FETCH_MEMO_BUDGET_MB = config.get("QUERYSET_FETCH_MEMO_BUDGET_MB")
+
 FOO = config.get("bar", "baz")
 
 # =Compatibility==========================================
@@ -19,6 +19,8 @@ DEFAULT_SETTINGS = {
         "MODEL_OBJECT_KEY_DB_HOSTNAME":     "janus",
         "MODEL_OBJECT_KEY_DB_DBNAME":       "pred3_certs",
         "QUERYSET_MAX_RETRIES":             500,
+        "QUERYSET_DEFINITION_CACHE_TTL":    300,
+        "QUERYSET_FETCH_MEMO_BUDGET_MB":    0,
         "QUERYSET_REMOTE_PATH":             "querysets",
         "REMOTE_URL":                       "http://0.0.0.0:4000",
         "MODEL_METADATA_DATABASE_HOSTNAME": "hermes",